@@ -1,11 +1,19 @@
 import argparse
+import collections
+import functools
+import json
 import logging
+import os
 import re
+import sys
+import threading
+import time
+import tracemalloc
 
 from pathlib import Path
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+
+# NOTE: pandas, bs4 and requests are imported where needed, such that the
+# command line interface starts quickly and cached runs do not load requests.
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
@@ -20,14 +28,58 @@ def read_keywords_from_csv(filename):
         return [rf"{key.strip()}" for key in line.strip().split(",") if key.strip()]
 
 
-def fetch_url(url, timeout=20):
+class FetchStats:
+    """Number, size and duration of the page requests of a run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def summary(self):
+        rate = self.requests / self.seconds if self.seconds > 0 else 0.0
+        return (
+            f"Fetched {self.requests - self.failures} of {self.requests} pages "
+            f"({self.bytes / 2**20:.1f} MB) in {self.seconds:.1f} s: "
+            f"{rate:.2f} pages/s, {self.bytes / 2**20 / max(self.seconds, 1e-9):.2f} MB/s"
+        )
+
+
+def rebase_url(url, base_url):
+    """`url` with scheme and host of `base_url`, e.g. a local stand-in server."""
+    from urllib.parse import urlsplit
+
+    parts, base = urlsplit(url), urlsplit(base_url)
+    return parts._replace(
+        scheme=base.scheme, netloc=base.netloc, path=base.path.rstrip("/") + parts.path
+    ).geturl()
+
+
+def fetch_url(url, timeout=20, stats=None, session=None):
+    """Response of `url`, or None if the request failed.
+
+    A `requests.Session` keeps the connection open for further requests.
+    """
+    import requests
+
+    start = time.perf_counter()
     try:
-        r = requests.get(url, headers=HEADERS, timeout=timeout)
+        r = (session or requests).get(url, headers=HEADERS, timeout=timeout)
         r.raise_for_status()
-        return r
     except Exception as e:
         logging.warning("Request failed for %s: %s", url, e)
-        return None
+        r = None
+    if stats is not None:
+        with stats.lock:
+            stats.requests += 1
+            stats.seconds += time.perf_counter() - start
+            if r is None:
+                stats.failures += 1
+            else:
+                stats.bytes += len(r.content)
+    return r
 
 
 def extract_open_access(soup):
@@ -81,7 +133,10 @@ def read_dc_type(soup):
 
 
 def identify_article_type(soup):
-    type = read_dc_type(soup)
+    return classify_article_type(read_dc_type(soup))
+
+
+def classify_article_type(type):
     for key in ["article", "paper", "report", "letter"]:
         if type and re.search(rf"{key}", type, re.I):
             return "article"
@@ -109,6 +164,17 @@ def count_keywords(text, df):
     return
 
 
+def keyword_counts(text, keywords):
+    """Number of matches in `text` of each of `keywords` (as strings).
+
+    Each keyword is matched once, also if it is in several rule tables.
+    """
+    return {
+        key: len(re.findall(rf"{key}", text, re.I))
+        for key in dict.fromkeys(str(keyword) for keyword in keywords)
+    }
+
+
 def find_largest_counter(df_list, column):
     total_counts = [sum(df[column]) for df in df_list]
     if sum(total_counts) == 0:
@@ -127,29 +193,24 @@ def extract_matching_keywords(df_list, column_key, column_count):
     return ", ".join(keywords)
 
 
-def count_category(df):
+def count_category(df, keyword_counter):
+    """Counters of the rule table `df` by column, as Series aligned with it.
+
+    `keyword_counter` holds the matches of each keyword. The counter of a row
+    in a category column is the sum of the keyword counters of all rows with
+    the same label, 0 for rows without label.
+    """
+    counters = {"keyword": keyword_counter}
     for column in ["category", "subcategory", "subcategory2"]:
-        # Make unique and remove NaN categories
-        categories = df[column].unique()
-        categories = [cat for cat in categories if pd.notna(cat)]
-        counter = {
-            category: sum(
-                [
-                    row["keyword_counter"]
-                    for _, row in df.iterrows()
-                    if row[column] == category
-                ]
-            )
-            for category in categories
-        }
-        category_counter = []
-        for _, row in df.iterrows():
-            if pd.isna(row[column]):
-                category_counter.append(0)
-            else:
-                category_counter.append(counter[row[column]])
-        df[f"{column}_counter"] = category_counter
-    return df
+        counters[column] = (
+            keyword_counter.groupby(df[column]).transform("sum").fillna(0)
+        )
+    return counters
+
+
+def active_rows(df, counters, column):
+    # Rows of the rule table with a label in `column` that is counted
+    return (counters[column] > 0) & df[column].notna()
 
 
 def find_frequent_key(df, column_key, column_count):
@@ -225,91 +286,522 @@ def save_soup_to_file(soup, filename="soup.html"):
         f.write(str(soup))
 
 
-def determine_keywords(df):
+def determine_keywords(df, counters):
     # Extract active keywords
-    active_df = df[df["keyword_counter"] > 0].dropna(subset=["keyword"])
-    return ", ".join(active_df["keyword"].tolist())
+    active = active_rows(df, counters, "keyword")
+    return ", ".join(df["keyword"][active].tolist())
 
 
-def determine_classification(df):
+def determine_classification(df, counters):
     # Extract active classifications
-    classification = []
-    active_df = df[df["category_counter"] > 0].dropna(subset=["category"])
-    classification = [row["category"] for _, row in active_df.iterrows()]
-    active_df = active_df[active_df["subcategory_counter"] > 0].dropna(
-        subset=["subcategory"]
+    active = active_rows(df, counters, "category")
+    classification = df["category"][active].tolist()
+    for column in ["subcategory", "subcategory2"]:
+        active &= active_rows(df, counters, column)
+        classification += df[column][active].tolist()
+    # Unique labels in rule table order, independent of the hash seed
+    return ", ".join(dict.fromkeys(classification))
+
+
+def most_counted(labels):
+    """Label with the largest counter of (label, counter) pairs.
+
+    Ties are broken by the order of the labels in the rule table, such that
+    the result does not depend on the hash seed (see sensitivity.py).
+    """
+    return sorted(dict.fromkeys(labels), key=lambda x: x[1], reverse=True)[0][0]
+
+
+def determine_category(df, counters):
+    # Extract active categories, then the active subcategories of the most
+    # counted category and the active subcategories2 of its most counted
+    # subcategory
+    labels = ()
+    active = True
+    for column in ["category", "subcategory", "subcategory2"]:
+        active = active & active_rows(df, counters, column)
+        if not active.any():
+            break
+        label = most_counted(zip(df[column][active], counters[column][active]))
+        labels += (label,)
+        active &= df[column] == label
+    return labels or ("other",)
+
+
+# Columns added to the input by the analysis, in order
+result_columns = [
+    "category",
+    "subcategory",
+    "subcategory2",
+    "abstract",
+    "keywords",
+    "classification",
+    "article_availability_score",
+    "article_availability_category",
+    "article_availability_section",
+    "data_availability_score",
+    "data_availability_category",
+    "data_availability_section",
+]
+
+# Result columns of each scheme of categories (rule table of keywords)
+scheme_columns = [
+    "category",
+    "subcategory",
+    "subcategory2",
+    "keywords",
+    "classification",
+]
+
+
+def scheme_name(path):
+    """Name of the scheme of a categories CSV file, e.g. "imaging_vs_simulation"."""
+    name = Path(path).stem
+    return name[len("categories_") :] if name.startswith("categories_") else name
+
+
+def scheme_column(name, column):
+    """Result column of a scheme; the unnamed scheme (None) has the plain name."""
+    return column if name is None else f"{name}_{column}"
+
+
+def scheme_result_columns(names):
+    """Result columns of an analysis with the schemes `names`.
+
+    A single unnamed scheme has the `result_columns`. Several schemes have the
+    `scheme_columns` of each scheme, prefixed with its name, followed by the
+    abstract and the availability columns.
+    """
+    names = list(names)
+    if names == [None]:
+        return result_columns
+    return [
+        scheme_column(name, column) for name in names for column in scheme_columns
+    ] + [column for column in result_columns if column not in scheme_columns]
+
+
+def select_scheme(results, name):
+    """Results of several schemes with the columns of scheme `name` under the
+    plain names, e.g. for plotting.py."""
+    return results.rename(
+        columns={scheme_column(name, column): column for column in scheme_columns}
+    )
+
+
+def result_schemes(columns):
+    """Names of the schemes of results with several, empty for a single one."""
+    suffix = "_" + scheme_columns[-1]
+    return [column[: -len(suffix)] for column in columns if column.endswith(suffix)]
+
+
+def scheme_results(results, name=None):
+    """Results with the columns of one scheme under the plain names.
+
+    Results of a single scheme are returned as they are. Of results with
+    several schemes, `name` is required and selected with `select_scheme`.
+    """
+    names = result_schemes(results.columns)
+    if not names:
+        if name is not None:
+            raise ValueError(f"The results have a single scheme, not {name!r}.")
+        return results
+    if name not in names:
+        raise ValueError(
+            f"The results have several schemes, choose one of: {', '.join(names)}"
+        )
+    return select_scheme(results, name)
+
+
+def cached_soup_path(cache_folder, idx):
+    """Location of the cached page of the article in row `idx` of the input."""
+    return Path(cache_folder) / f"soup_{idx}.html"
+
+
+def read_soup(path):
+    from bs4 import BeautifulSoup
+
+    with open(path, "r", encoding="utf-8") as f:
+        return BeautifulSoup(f, "html.parser")
+
+
+class Result:
+    """Result of one article, one slot per entry of `result_columns`.
+
+    Slots instead of a dict per article; the values can also be accessed by
+    column name, e.g. `result["category"]`. `columns` are the columns of the
+    values, see `result_type` for several schemes.
+    """
+
+    __slots__ = tuple(result_columns)
+    columns = result_columns
+
+    def __init__(self, **values):
+        for column in self.columns:
+            setattr(self, column, values[column])
+
+    def __getitem__(self, column):
+        return getattr(self, column)
+
+    def values(self):
+        return tuple(getattr(self, column) for column in self.columns)
+
+
+@functools.lru_cache(maxsize=None)
+def result_type(columns):
+    """`Result` class with a slot for each of the tuple `columns`."""
+    if list(columns) == result_columns:
+        return Result
+    return type(
+        "SchemesResult",
+        (Result,),
+        {
+            "__slots__": tuple(c for c in columns if c not in result_columns),
+            "columns": list(columns),
+        },
     )
-    classification += [row["subcategory"] for _, row in active_df.iterrows()]
-    active_df = active_df[active_df["subcategory2_counter"] > 0].dropna(
-        subset=["subcategory2"]
+
+
+def label(text):
+    """Interned label, such that repeated labels share one string object."""
+    return sys.intern(str(text))
+
+
+def unanalyzed_result(category, names=(None,)):
+    """Result for articles which are not analyzed, e.g., editorials.
+
+    `names` are the schemes of categories, see `scheme_result_columns`.
+    """
+    values = dict(
+        abstract="N/A",
+        article_availability_score=0,
+        article_availability_category="N/A",
+        article_availability_section="N/A",
+        data_availability_score=0,
+        data_availability_category="N/A",
+        data_availability_section="N/A",
     )
-    classification += [row["subcategory2"] for _, row in active_df.iterrows()]
-    return ", ".join(set(classification))
+    for name in names:
+        for column in scheme_columns:
+            values[scheme_column(name, column)] = (
+                label(category) if column == "category" else "N/A"
+            )
+    return result_type(tuple(scheme_result_columns(names)))(**values)
+
+
+# Fields the fast path reads from the <head>, with the meta tags to look at
+metadata_fields = {
+    "article_type": ["dc.type", "citation_article_type"],
+    "abstract": ["dc.description", "citation_abstract"],
+    # dc.rights is often only a copyright line, e.g. "2023 The Author(s)"
+    "rights": ["citation_license", "dc.rights"],
+}
+
+# Rights in the <head> are only used if they name a license or the access,
+# else the rights and permissions section of the body is read
+rights_signal = re.compile(
+    r"licen[cs]e|creative ?commons|\bcc[ -]by|open access|closed access", re.I
+)
+
+
+def json_ld_entities(head):
+    """Dicts of the JSON-LD blocks of a parsed <head>, including main entities."""
+    entities = []
+    for script in head.find_all("script", attrs={"type": "application/ld+json"}):
+        try:
+            data = json.loads(script.string or "")
+        except ValueError:
+            continue
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict):
+                entities += [item] + [
+                    item[key]
+                    for key in ["mainEntity"]
+                    if isinstance(item.get(key), dict)
+                ]
+    return entities
+
+
+def json_ld_rights(entity):
+    """Access and license of a JSON-LD entity as text, or None."""
+    parts = []
+    if "isAccessibleForFree" in entity:
+        free = str(entity["isAccessibleForFree"]).lower() == "true"
+        parts.append("open access" if free else "closed access")
+    if isinstance(entity.get("license"), str):
+        parts.append(entity["license"])
+    return " ".join(parts) or None
+
+
+def head_metadata(html):
+    """Article type, abstract and rights of a page from its <head> only.
+
+    Reads the dc.* and citation_* meta tags and the JSON-LD blocks. Returns a
+    dict with the fields of `metadata_fields` which were found.
+    """
+    from bs4 import BeautifulSoup
+
+    end = re.search(r"</head\s*>", html, re.I)
+    if end is None:
+        return {}
+    head = BeautifulSoup(html[: end.end()], "html.parser")
+    meta = {}
+    for tag in head.find_all("meta", attrs={"name": True, "content": True}):
+        meta.setdefault(tag["name"].lower(), tag["content"].strip())
+
+    entities = json_ld_entities(head)
+    metadata = {}
+    for field, names in metadata_fields.items():
+        values = [meta.get(name) for name in names]
+        if field == "rights":
+            # The license tag, then the access of the JSON-LD, then dc.rights
+            values = values[:1] + [json_ld_rights(e) for e in entities] + values[1:]
+            values = [
+                value for value in values if value and rights_signal.search(value)
+            ]
+        values = [value for value in values if value]
+        if values:
+            metadata[field] = values[0]
+
+    for entity in entities:
+        if "abstract" not in metadata and isinstance(entity.get("description"), str):
+            metadata["abstract"] = entity["description"]
+    return metadata
+
+
+def extract_fields(soup, url, metadata=None, sources=None):
+    """Texts of one article page which are classified and scored.
+
+    Article type, abstract and rights are taken from `metadata` (see
+    `head_metadata`) where available, else they are extracted from the body.
+    `sources` counts which of both supplied each field.
+
+    Returns a dict with the "article_type" and, for articles, the "abstract",
+    the rights and permissions section ("article_availability_section") and
+    the "data_availability_section".
+    """
+    metadata = metadata or {}
+
+    def from_metadata(field, extract):
+        value = metadata.get(field)
+        source = "metadata" if value else "body"
+        if not value:
+            value = extract()
+        if sources is not None:
+            sources[field, source] += 1
+        return value
+
+    # Identify article type - only continue for "article"
+    _article_type = classify_article_type(
+        from_metadata("article_type", lambda: read_dc_type(soup))
+    )
+    if _article_type != "article":
+        return {"article_type": _article_type}
 
+    # Extract abstract - required
+    _abstract = from_metadata("abstract", lambda: extract_abstract(soup))
+    if not _abstract:
+        return {"article_type": "error"}
 
-def determine_category(df):
-    # Extract active categories
-    active_df = df[df["category_counter"] > 0].dropna(subset=["category"])
-    active_categories = set(
-        [(row["category"], row["category_counter"]) for _, row in active_df.iterrows()]
+    # Extract rights and permissions for article - required
+    rights_and_permissions_section = from_metadata(
+        "rights", lambda: extract_section(soup, title=["rights", "permission"])
     )
-    if len(active_categories) == 0:
-        return ("other",)
-    else:
-        category = sorted(active_categories, key=lambda x: x[1], reverse=True)[0][0]
+    if not rights_and_permissions_section:
+        raise ValueError(f"Rights and permissions section not found for {url}")
+
+    # Extract section on data/code availability
+    def none_to_txt(x):
+        return "" if x is None else x
 
-    # Extract active subcategories
-    active_df = active_df.groupby("category").get_group(category)
-    active_df = active_df[active_df["subcategory_counter"] > 0].dropna(
-        subset=["subcategory"]
+    _data_availability_section = ""
+    _data_availability_section += none_to_txt(
+        extract_section(soup, title=["data", "avail"])
     )
-    active_subcategories = [
-        (row["subcategory"], row["subcategory_counter"])
-        for _, row in active_df.iterrows()
-    ]
-    if len(active_subcategories) == 0:
-        return (category,)
+    _data_availability_section += none_to_txt(
+        extract_section(soup, title=["code", "avail"])
+    )
+    # Some articles use "Notes" or the "Acknowledgements" section - only add if nothing else found
+    _data_availability_section += none_to_txt(extract_section(soup, title=["notes"]))
+    _data_availability_section += none_to_txt(
+        extract_section(soup, title=["acknowledgements"])
+    )
+    # some articles use the Ethics section
+    _data_availability_section += none_to_txt(extract_section(soup, title=["ethics"]))
+    # some articles use the additional information
+    _data_availability_section += none_to_txt(
+        extract_section(soup, title=["additional", "information"])
+    )
+    return {
+        "article_type": _article_type,
+        "abstract": _abstract,
+        "article_availability_section": rights_and_permissions_section,
+        "data_availability_section": _data_availability_section,
+    }
+
+
+def categorize(categories_df, counts):
+    """Category columns (see `scheme_columns`) of an article by the keyword
+    rules `categories_df`, from the `keyword_counts` of its abstract."""
+    import pandas as pd
+
+    # Counters aligned with the rule table, which is shared by all articles
+    keyword_counter = pd.Series(
+        [counts[str(key)] for key in categories_df["keyword"]],
+        index=categories_df.index,
+    )
+    counters = count_category(categories_df, keyword_counter)
+    result = {"keywords": determine_keywords(categories_df, counters)}
+
+    # Find category
+    _category = determine_category(categories_df, counters)
+    while len(_category) < 3:
+        _category = _category + ("N/A",)
+    result["category"] = label(_category[0])
+    result["subcategory"] = label(_category[1])
+    result["subcategory2"] = label(_category[2])
+
+    # Find classification
+    result["classification"] = determine_classification(categories_df, counters)
+    return result
+
+
+def classify_fields(
+    fields, categories_df, open_access_scores_df, data_availability_scores_df
+):
+    """Classify an article by its texts (see `extract_fields`) and score them.
+
+    `categories_df` is a rule table of keywords, or a dict of several by
+    scheme name. Returns a `Result` with an entry for each of
+    `result_columns`, or of `scheme_result_columns` for several schemes.
+    """
+    if isinstance(categories_df, dict):
+        schemes = categories_df
     else:
-        subcategory = sorted(
-            set(active_subcategories), key=lambda x: x[1], reverse=True
-        )[0][0]
-
-    # Extract active subcategories2
-    active_df = active_df[active_df["subcategory"] == subcategory].dropna(
-        subset=["subcategory2"]
-    )
-    active_df = active_df[active_df["subcategory2_counter"] > 0]
-    active_subcategories2 = [
-        (row["subcategory2"], row["subcategory2_counter"])
-        for _, row in active_df.iterrows()
+        schemes = {None: categories_df}
+    if fields["article_type"] != "article":
+        return unanalyzed_result(fields["article_type"], schemes)
+    result = {
+        column: fields[column]
+        for column in [
+            "abstract",
+            "article_availability_section",
+            "data_availability_section",
+        ]
+    }
+
+    # Score rights and permission
+    (
+        result["article_availability_score"],
+        result["article_availability_category"],
+    ) = score(
+        result["article_availability_section"],
+        open_access_scores_df,
+        empty_category="closed access",
+    )
+
+    # Find keywords of all schemes in one pass, then category and
+    # classification of each scheme
+    counts = keyword_counts(
+        result["abstract"],
+        [keyword for _df in schemes.values() for keyword in _df["keyword"]],
+    )
+    for name, _df in schemes.items():
+        for column, value in categorize(_df, counts).items():
+            result[scheme_column(name, column)] = value
+
+    # Score data availability
+    result["data_availability_score"], result["data_availability_category"] = score(
+        result["data_availability_section"],
+        data_availability_scores_df,
+        empty_category="closed access",
+    )
+
+    # Make sure the data availability section is not empty if the category is 'computational' or 'experimental'
+    # if np.isclose(_data_availability_score, 1) and category[-1] == "other":
+    #    if re.search("code", data_availability_section[-1], re.I):
+    #        category[-1] = "computational"
+    #        subcategory[-1] = "N/A"
+    #        subcategory2[-1] = "N/A"
+    #        num_redefined += 1
+    # if np.isclose(_data_availability_score, 1) and category[-1] == "other":
+    #    raise ValueError(
+    #        f"Data availability section: {_data_availability_section}.\nCategory: '{category[-1]}' for {url}"
+    #    )
+    # if np.isclose(_data_availability_score, 1.0) and category[-1] == "theoretical":
+    # if _data_availability_score > 0.1 and category[-1] == "theoretical":
+    #    # Identify the work as computational
+    #    category[-1] = "computational"
+    #    subcategory[-1] = "N/A"
+    #    subcategory2[-1] = "N/A"
+    #    num_redefined += 1
+
+    for column in ["article_availability_category", "data_availability_category"]:
+        result[column] = label(result[column])
+    return result_type(tuple(scheme_result_columns(schemes)))(**result)
+
+
+def analyze_soup(
+    soup,
+    url,
+    categories_df,
+    open_access_scores_df,
+    data_availability_scores_df,
+    metadata=None,
+    sources=None,
+):
+    """Classify one article page and score its paper and data availability.
+
+    See `extract_fields` and `classify_fields`. Returns a `Result` with an
+    entry for each of `result_columns`.
+    """
+    return classify_fields(
+        extract_fields(soup, url, metadata=metadata, sources=sources),
+        categories_df,
+        open_access_scores_df,
+        data_availability_scores_df,
+    )
+
+
+def score_dtype(scores_df):
+    """Type of a score column in the results, as inferred by pandas for a full run.
+
+    Scores are taken from the score table, empty sections score an int 0.
+    """
+    import pandas as pd
+
+    if pd.api.types.is_float_dtype(scores_df["score"]):
+        return "float64"
+    return "int64"
+
+
+def results_frame(df, records, dtypes, columns=result_columns):
+    """Input rows `df` together with their result records, as in the output.
+
+    `columns` are the result columns of the records (see `Rules.columns`).
+    """
+    chunk = df.copy()
+    values = list(zip(*[record.values() for record in records])) or [
+        [] for _ in columns
     ]
-    if len(active_subcategories2) == 0:
-        return (category, subcategory)
-    else:
-        subcategory2 = sorted(
-            set(active_subcategories2), key=lambda x: x[1], reverse=True
-        )[0][0]
+    for column, column_values in zip(columns, values):
+        chunk[column] = list(column_values)
+    return chunk.astype(dtypes)
 
-    return (category, subcategory, subcategory2)
 
+def write_results(f, df, records, dtypes, header=False, columns=result_columns):
+    """Append the input rows `df` together with their result records to `f`."""
+    chunk = results_frame(df, records, dtypes, columns=columns)
+    # "\n" as shards.py, instead of the os.linesep of pandas on any platform
+    chunk.to_csv(f, index=False, header=header, lineterminator="\n")
+    return chunk
 
-def main(
-    input_csv,
-    output_csv,
-    categories_csv,
-    open_access_availablity_csv,
-    data_availability_csv,
-):
-    # Read keywords from CSV files as DataFrames
-    df = pd.read_csv(input_csv, dtype=str)
-    data_availability_scores_df = pd.read_csv(data_availability_csv)
-    open_access_scores_df = pd.read_csv(open_access_availablity_csv)
-    categories_df = pd.read_csv(categories_csv)
 
-    # Count articles
-    num_redefined = 0
-    logging.info("Read %d rows from %s", len(df), input_csv)
+def normalize_export(df):
+    """Springer export `df` with the generic column names of the results.
 
+    Raises a ValueError for content types the analysis does not support.
+    """
+    df = df.copy()
     # Unify the categories from TiPM style to generic style
     df["year"] = df["Publication Year"]
     df["title"] = df["Item Title"]
@@ -336,7 +828,7 @@ def main(
     )
     df["url"] = df["URL"]
     df["journal"] = df["Publication Title"]
-    df.drop(
+    df = df.drop(
         columns=[
             "Publication Year",  # -> "year"
             "Item Title",  # -> "title"
@@ -350,196 +842,379 @@ def main(
             "Content Type",  # -> type
         ],
         errors="ignore",
-        inplace=True,
     )
 
     # Stop if type is "other"
     if (df["type"] == "other").any():
         raise ValueError("Unsupported article type found")
+    return df
 
-    # Containers for results
-    rights_and_permission_score = []
-    rights_and_permission_category = []
-    rights_and_permission_section = []
-    category = []
-    subcategory = []
-    subcategory2 = []
-    keywords = []
-    classification = []
-    data_availability_score = []
-    data_availability_category = []
-    abstract = []
-    data_availability_section = []
-
-    for idx in range(len(df)):
-        url = df["url"].iloc[idx]
-        path = Path(f"soups_{input_csv.stem}/soup_{idx}.html")
-        logging.info("[%d] Fetching %s", idx, url)
-        if Path(path).exists():
-            with open(path, "r", encoding="utf-8") as f:
-                soup = BeautifulSoup(f, "html.parser")
-        else:
-            # Fetch url
-            r = fetch_url(url)
-            if r is None:
-                raise ValueError("Failed to fetch URL: %s", url)
-
-            # Convert to soup
-            soup = BeautifulSoup(r.text, "html.parser")
-            save_soup_to_file(soup, filename=path)
-
-        # Identify article type - only continue for "article"
-        _article_type = identify_article_type(soup)
-        if _article_type != "article":
-            category.append(_article_type)
-            subcategory.append("N/A")
-            subcategory2.append("N/A")
-            abstract.append("N/A")
-            keywords.append("N/A")
-            classification.append("N/A")
-            rights_and_permission_section.append("N/A")
-            rights_and_permission_score.append(0)
-            rights_and_permission_category.append("N/A")
-            data_availability_section.append("N/A")
-            data_availability_score.append(0)
-            data_availability_category.append("N/A")
-            continue
 
-        # Extract abstract - required
-        _abstract = extract_abstract(soup)
-        if not _abstract:
-            category.append("error")
-            subcategory.append("N/A")
-            subcategory2.append("N/A")
-            abstract.append("N/A")
-            keywords.append("N/A")
-            classification.append("N/A")
-            rights_and_permission_section.append("N/A")
-            rights_and_permission_score.append(0)
-            rights_and_permission_category.append("N/A")
-            data_availability_section.append("N/A")
-            data_availability_score.append(0)
-            data_availability_category.append("N/A")
-            continue
-        abstract.append(_abstract)
+class Rules:
+    """Rule tables of the analysis: keyword categories and availability scores.
 
-        # Extract rights and permissions for article - required
-        rights_and_permissions_section = extract_section(
-            soup, title=["rights", "permission"]
-        )
-        if not rights_and_permissions_section:
-            raise ValueError(f"Rights and permissions section not found for {url}")
-        rights_and_permission_section.append(rights_and_permissions_section)
-
-        # Score rights and permission
-        _rights_and_permission_score, _rights_and_permission_category = score(
-            rights_and_permissions_section,
-            open_access_scores_df,
-            empty_category="closed access",
+    Load them once (e.g. with `Rules.from_csv`) and pass them to `analyze`,
+    `iter_analyze` or `analyze_article` for any number of articles.
+
+    `categories` is a rule table of keywords, or a dict of several by scheme
+    name: all schemes are classified from one parse and one keyword pass,
+    with the columns of each prefixed by its name (see `scheme_result_columns`).
+    """
+
+    def __init__(self, categories, open_access_scores, data_availability_scores):
+        self.categories = categories
+        self.open_access_scores = open_access_scores
+        self.data_availability_scores = data_availability_scores
+        # Result columns in the order of the results file
+        self.columns = scheme_result_columns(
+            categories if isinstance(categories, dict) else [None]
         )
-        rights_and_permission_score.append(_rights_and_permission_score)
-        rights_and_permission_category.append(_rights_and_permission_category)
-
-        # Initialize article-specific df for keyword counting
-        _df = categories_df.copy()
-
-        # Find keywords
-        count_keywords(_abstract, _df)
-        _keywords = determine_keywords(_df)
-        keywords.append(_keywords)
-
-        # Find category
-        _df = count_category(_df)
-        _category = determine_category(_df)
-        while len(_category) < 3:
-            _category = _category + ("N/A",)
-        category.append(_category[0])
-        subcategory.append(_category[1])
-        subcategory2.append(_category[2])
-
-        # Find classification
-        _classification = determine_classification(_df)
-        classification.append(_classification)
-
-        # Extract section on data/code availability
-        def none_to_txt(x):
-            return "" if x is None else x
-
-        _data_availability_section = ""
-        _data_availability_section += none_to_txt(
-            extract_section(soup, title=["data", "avail"])
+        # Types of the score columns in the results
+        self.dtypes = {
+            "article_availability_score": score_dtype(open_access_scores),
+            "data_availability_score": score_dtype(data_availability_scores),
+        }
+
+    @classmethod
+    def from_csv(cls, categories_csv, open_access_csv, data_availability_csv):
+        """Rules from CSV files; `categories_csv` is one file, or a list of the
+        files of several schemes, named by `scheme_name`."""
+        import pandas as pd
+
+        if isinstance(categories_csv, (list, tuple)) and len(categories_csv) == 1:
+            categories_csv = categories_csv[0]
+        if isinstance(categories_csv, (list, tuple)):
+            categories = {
+                scheme_name(path): pd.read_csv(path) for path in categories_csv
+            }
+            if len(categories) < len(categories_csv):
+                raise ValueError(
+                    f"Categories files with the same scheme name: {categories_csv}"
+                )
+        else:
+            categories = pd.read_csv(categories_csv)
+        return cls(
+            categories,
+            pd.read_csv(open_access_csv),
+            pd.read_csv(data_availability_csv),
         )
-        _data_availability_section += none_to_txt(
-            extract_section(soup, title=["code", "avail"])
+
+    def classify(self, fields):
+        return classify_fields(
+            fields,
+            self.categories,
+            self.open_access_scores,
+            self.data_availability_scores,
         )
-        # Some articles use "Notes" or the "Acknowledgements" section - only add if nothing else found
-        _data_availability_section += none_to_txt(
-            extract_section(soup, title=["notes"])
+
+
+def load_page(key, url, pages=None, base_url=None, stats=None, progress=None):
+    """HTML of an article from the page cache `pages`, else fetched.
+
+    Returns the HTML and whether it was fetched.
+    """
+    logging.info("[%d] Fetching %s", key, url)
+    html = pages.get(key) if pages is not None else None
+    fetched = html is None
+    if fetched:
+        r = fetch_url(
+            url if base_url is None else rebase_url(url, base_url), stats=stats
         )
-        _data_availability_section += none_to_txt(
-            extract_section(soup, title=["acknowledgements"])
+        if r is None:
+            raise ValueError(f"Failed to fetch URL: {url}")
+        html = r.text
+    elif progress is not None:
+        progress.cache_hit()
+    return html, fetched
+
+
+def parse_page(
+    key,
+    url,
+    html,
+    fetched,
+    pages=None,
+    fast_metadata=False,
+    sources=None,
+    progress=None,
+):
+    """Parse an article page and extract its texts, see `extract_fields`.
+
+    Fetched pages are added to the page cache `pages`.
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    parse_start = time.perf_counter()
+    metadata = head_metadata(html) if fast_metadata else None
+    if metadata and set(metadata) == set(metadata_fields) and not fetched:
+        # Only the sections are needed, skip the rest of the body; the data
+        # availability is always read from the sections
+        sections_only = SoupStrainer("section", attrs={"data-title": True})
+        soup = BeautifulSoup(html, "html.parser", parse_only=sections_only)
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+    del html
+    if fetched and pages is not None:
+        pages.put(key, str(soup))
+
+    fields = extract_fields(
+        soup, url, metadata=metadata, sources=sources if fast_metadata else None
+    )
+    # The extracted sections are plain strings, the tree is not needed
+    soup.decompose()
+    if progress is not None:
+        progress.parsed(time.perf_counter() - parse_start)
+    return fields
+
+
+def classify_page(fields, rules, progress=None):
+    """`Result` of the texts of an article page, see `classify_fields`."""
+    classify_start = time.perf_counter()
+    result = rules.classify(fields)
+    if progress is not None:
+        progress.classified(time.perf_counter() - classify_start)
+    return result
+
+
+def analyze_article(
+    key,
+    url,
+    rules,
+    pages=None,
+    base_url=None,
+    fast_metadata=False,
+    stats=None,
+    progress=None,
+    sources=None,
+):
+    """Fetch (or read from the page cache) and analyze one article.
+
+    `key` identifies the article in the page cache `pages` (see
+    `article_archive.open_cache`); fetched pages are added to it. `stats`
+    (`FetchStats`), `progress` (`telemetry.Progress`) and `sources` (see
+    `extract_fields`) are updated if given. Returns the `Result`.
+    """
+    html, fetched = load_page(
+        key, url, pages=pages, base_url=base_url, stats=stats, progress=progress
+    )
+    fields = parse_page(
+        key,
+        url,
+        html,
+        fetched,
+        pages=pages,
+        fast_metadata=fast_metadata,
+        sources=sources,
+        progress=progress,
+    )
+    return classify_page(fields, rules, progress=progress)
+
+
+def iter_analyze(articles, rules, **options):
+    """Analyze articles one at a time, e.g. to stream them into a notebook.
+
+    `articles` is a data frame of articles with a "url" column (e.g. from
+    `normalize_export`) or an iterable of dicts with a "url" each. Their keys
+    in a page cache are the index of the data frame or the position in the
+    iterable. Yields a dict per article with its input fields and its
+    results; `options` are passed to `analyze_article`.
+    """
+    rows = articles.iterrows() if hasattr(articles, "iterrows") else enumerate(articles)
+    for key, row in rows:
+        result = analyze_article(key, row["url"], rules, **options)
+        yield {**dict(row), **dict(zip(result.columns, result.values()))}
+
+
+def analyze(articles, rules, **options):
+    """Analyze articles (see `iter_analyze`) into a data frame like the output."""
+    import pandas as pd
+
+    if not hasattr(articles, "iterrows"):
+        articles = pd.DataFrame(list(articles))
+    records = [
+        analyze_article(key, url, rules, **options)
+        for key, url in zip(articles.index, articles["url"])
+    ]
+    return results_frame(articles, records, rules.dtypes, columns=rules.columns)
+
+
+class MemoryTracer:
+    """Peak of the traced memory per window of articles (see tracemalloc)."""
+
+    def __init__(self, budget=None, window=1000):
+        self.budget = budget
+        self.window = window
+        self.peaks = []
+        tracemalloc.start()
+
+    def step(self, count):
+        if count % self.window == 0:
+            self.record(count)
+
+    def record(self, count):
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        peak_mb = peak / 2**20
+        self.peaks.append(peak_mb)
+        logging.info("Peak memory up to article %d: %.1f MB", count, peak_mb)
+        if self.budget is not None and peak_mb > self.budget:
+            logging.warning(
+                "Peak memory of %.1f MB exceeds the budget of %.1f MB per %d articles",
+                peak_mb,
+                self.budget,
+                self.window,
+            )
+
+    def finish(self, count):
+        if count % self.window != 0 or not self.peaks:
+            self.record(count)
+        tracemalloc.stop()
+        logging.info(
+            "Largest peak memory per %d articles: %.1f MB", self.window, max(self.peaks)
         )
-        # some articles use the Ethics section
-        _data_availability_section += none_to_txt(
-            extract_section(soup, title=["ethics"])
+
+
+def main(
+    input_csv,
+    output_csv,
+    categories_csv,
+    open_access_availablity_csv,
+    data_availability_csv,
+    chunk_size=100,
+    trace_memory=False,
+    memory_budget=None,
+    index=None,
+    index_scheme=None,
+    base_url=None,
+    cache=None,
+    shard=None,
+    metrics=None,
+    progress_interval=10.0,
+    fast_metadata=False,
+    fetch_workers=1,
+    parse_workers=1,
+    classify_workers=1,
+    queue_size=16,
+):
+    import pandas as pd
+
+    from article_archive import open_cache
+    from pipeline import Pipeline, Stage
+    from telemetry import Progress
+
+    # Read keywords from CSV files as DataFrames
+    df = pd.read_csv(input_csv, dtype=str)
+    rules = Rules.from_csv(
+        categories_csv, open_access_availablity_csv, data_availability_csv
+    )
+
+    # Count articles
+    num_redefined = 0
+    logging.info("Read %d rows from %s", len(df), input_csv)
+
+    df = normalize_export(df)
+
+    # Restrict to the articles of one shard, see shards.py
+    if shard is not None:
+        from shards import parse_shard, select_shard
+
+        total = len(df)
+        df = select_shard(df, *parse_shard(shard))
+        logging.info("Shard %s: %d of %d articles", shard, len(df), total)
+
+    # Results are written in chunks to a temporary file, which replaces the
+    # output at the end, such that only the records of one chunk are kept
+    output_csv.parent.mkdir(parents=True, exist_ok=True)
+    partial_csv = output_csv.with_name(output_csv.name + ".part")
+    dtypes = rules.dtypes
+    tracer = MemoryTracer(memory_budget) if trace_memory else None
+    if index is not None:
+        import search_index
+
+        # Articles are indexed by the category of one scheme, the first by default
+        schemes = result_schemes(rules.columns)
+        if schemes and index_scheme is None:
+            index_scheme = schemes[0]
+        elif index_scheme is not None and index_scheme not in schemes:
+            raise ValueError(
+                f"No scheme {index_scheme!r} to index, the schemes are: "
+                f"{', '.join(schemes) or 'a single unnamed one'}"
+            )
+        index_connection = search_index.connect(index)
+    records = []
+    stats = FetchStats()
+    pages = open_cache(f"soups_{input_csv.stem}" if cache is None else cache)
+    progress = Progress(
+        len(df), stats, metrics_path=metrics, interval=progress_interval
+    )
+    # Field sources of the fast path: (field, "metadata" or "body") -> count
+    sources = collections.Counter()
+    sources_lock = threading.Lock()
+
+    # Stages of the analysis of each article, each with its own workers
+    def fetch(article):
+        key, url = article
+        html, fetched = load_page(
+            key, url, pages=pages, base_url=base_url, stats=stats, progress=progress
         )
-        # some articles use the additional information
-        _data_availability_section += none_to_txt(
-            extract_section(soup, title=["additional", "information"])
+        return key, url, html, fetched
+
+    def parse(page):
+        counts = collections.Counter()
+        fields = parse_page(
+            *page,
+            pages=pages,
+            fast_metadata=fast_metadata,
+            sources=counts,
+            progress=progress,
         )
-        data_availability_section.append(_data_availability_section)
+        with sources_lock:
+            sources.update(counts)
+        return fields
+
+    def classify(fields):
+        return classify_page(fields, rules, progress=progress)
+
+    pipeline = Pipeline(
+        [
+            Stage("fetch", fetch, fetch_workers),
+            Stage("parse", parse, parse_workers),
+            Stage("classify", classify, classify_workers),
+        ],
+        queue_size=queue_size,
+    )
+    progress.pipeline = pipeline
 
-        # Score data availability
-        _data_availability_score, _data_availability_category = score(
-            _data_availability_section,
-            data_availability_scores_df,
-            empty_category="closed access",
-        )
-        data_availability_score.append(_data_availability_score)
-        data_availability_category.append(_data_availability_category)
-
-        # Make sure the data availability section is not empty if the category is 'computational' or 'experimental'
-        # if np.isclose(_data_availability_score, 1) and category[-1] == "other":
-        #    if re.search("code", data_availability_section[-1], re.I):
-        #        category[-1] = "computational"
-        #        subcategory[-1] = "N/A"
-        #        subcategory2[-1] = "N/A"
-        #        num_redefined += 1
-        # if np.isclose(_data_availability_score, 1) and category[-1] == "other":
-        #    raise ValueError(
-        #        f"Data availability section: {_data_availability_section}.\nCategory: '{category[-1]}' for {url}"
-        #    )
-        # if np.isclose(_data_availability_score, 1.0) and category[-1] == "theoretical":
-        # if _data_availability_score > 0.1 and category[-1] == "theoretical":
-        #    # Identify the work as computational
-        #    category[-1] = "computational"
-        #    subcategory[-1] = "N/A"
-        #    subcategory2[-1] = "N/A"
-        #    num_redefined += 1
-
-        # Debugging
-        if False:
-            print()
-            print("Debugging")
-            print(
-                "Access:",
-                rights_and_permission_score[-1],
-                rights_and_permission_category[-1],
-            )
-            print("Category", category[-1])
-            print("Subcategory", subcategory[-1])
-            print("Subcategory2", subcategory2[-1])
-            print("Keywords:", keywords[-1])
-            print("Classification:", classification[-1])
-            print("Availability score:", data_availability_score[-1])
-            print("Availability category:", data_availability_category[-1])
-
-            print(
-                "rights_and_permissions_section:",
+    try:
+        with open(partial_csv, "w", newline="", encoding="utf-8") as f:
+            write_results(
+                f, df.iloc[:0], [], dtypes, header=True, columns=rules.columns
             )
-            print("Rights and permissions section:", rights_and_permission_section[-1])
-            print("Abstract", abstract[-1])
-            print("Availability section:", data_availability_section[-1])
+            # The page cache is keyed by the row in the input, also for a shard
+            for position, record in enumerate(pipeline.run(zip(df.index, df["url"]))):
+                records.append(record)
+
+                if len(records) == chunk_size or position == len(df) - 1:
+                    start = position + 1 - len(records)
+                    chunk = write_results(
+                        f,
+                        df.iloc[start : position + 1],
+                        records,
+                        dtypes,
+                        columns=rules.columns,
+                    )
+                    if index is not None:
+                        search_index.add_articles(
+                            index_connection, scheme_results(chunk, index_scheme)
+                        )
+                    records = []
+                if tracer is not None:
+                    tracer.step(position + 1)
+                progress.article_done()
+    except BaseException:
+        progress.close(finished=False)
+        raise
+    progress.close()
 
     # Inform on redefinitions
     if num_redefined > 0:
@@ -548,24 +1223,27 @@ def main(
             num_redefined,
         )
 
-    # Update data frame
-    df["category"] = category
-    df["subcategory"] = subcategory
-    df["subcategory2"] = subcategory2
-    df["abstract"] = abstract
-    df["keywords"] = keywords
-    df["classification"] = classification
-    df["article_availability_score"] = rights_and_permission_score
-    df["article_availability_category"] = rights_and_permission_category
-    df["article_availability_section"] = rights_and_permission_section
-    df["data_availability_score"] = data_availability_score
-    df["data_availability_category"] = data_availability_category
-    df["data_availability_section"] = data_availability_section
+    pages.close()
+    if stats.requests > 0:
+        logging.info(stats.summary())
+    if fast_metadata:
+        for field in metadata_fields:
+            found = sources[field, "metadata"]
+            logging.info(
+                "%s: %d/%d from metadata",
+                field,
+                found,
+                found + sources[field, "body"],
+            )
 
     # Store data frame to file
-    output_csv.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(output_csv, index=False)
+    os.replace(partial_csv, output_csv)
     logging.info("Wrote results to %s", output_csv)
+    if index is not None:
+        index_connection.close()
+        logging.info("Updated search index %s", index)
+    if tracer is not None:
+        tracer.finish(len(df))
 
 
 if __name__ == "__main__":
@@ -574,18 +1252,124 @@ if __name__ == "__main__":
     )
     p.add_argument("--input", "-i", required=True, help="input CSV file")
     p.add_argument("--output", "-o", required=True, help="output CSV file")
-    p.add_argument("--categories", "-c", required=True, help="categories CSV file")
+    p.add_argument(
+        "--categories",
+        "-c",
+        required=True,
+        nargs="+",
+        help="categories CSV file, or several: one set of category columns per "
+        "file, prefixed with its name without 'categories_'",
+    )
     p.add_argument(
         "--open_access", "-oa", required=True, help="open access availability CSV file"
     )
     p.add_argument(
         "--data_availability", "-da", required=True, help="data availability CSV file"
     )
+    p.add_argument(
+        "--chunk-size",
+        type=int,
+        default=100,
+        help="Number of articles written to the output at once",
+    )
+    p.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Log the peak memory per 1000 articles (slower)",
+    )
+    p.add_argument(
+        "--memory-budget",
+        type=float,
+        help="Warn if the peak memory per 1000 articles exceeds this many MB "
+        "(implies --trace-memory)",
+    )
+    p.add_argument(
+        "--index",
+        help="Full-text index (SQLite) to add the analyzed articles to, "
+        "see search_index.py",
+    )
+    p.add_argument(
+        "--index-scheme",
+        help="Scheme of several --categories files whose category is indexed "
+        "(default: the first)",
+    )
+    p.add_argument(
+        "--base-url",
+        help="Fetch from this scheme and host instead of the URLs' ones, e.g. "
+        "http://127.0.0.1:8000 for springer_stub.py",
+    )
+    p.add_argument(
+        "--cache",
+        help="Page cache: a folder (default: soups_<input stem>) or an archive "
+        "ending in .pack, see article_archive.py",
+    )
+    p.add_argument(
+        "--shard",
+        help="Only analyze shard i of N (given as i/N) of the articles, "
+        "partitioned by DOI; see shards.py to run and merge all shards",
+    )
+    p.add_argument(
+        "--metrics",
+        help="File replaced with the progress metrics every --progress-interval "
+        "seconds: JSON, or Prometheus text format if it ends with .prom",
+    )
+    p.add_argument(
+        "--progress-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between progress lines on the console",
+    )
+    p.add_argument(
+        "--fast-metadata",
+        action="store_true",
+        help="Take article type, abstract and rights from the dc.*/citation_* "
+        "meta tags and JSON-LD of the page head where available, and only "
+        "parse the sections of cached pages whose head has all three",
+    )
+    p.add_argument(
+        "--fetch-workers",
+        type=int,
+        default=1,
+        help="Number of pages fetched (or read from the cache) at the same time",
+    )
+    p.add_argument(
+        "--parse-workers",
+        type=int,
+        default=1,
+        help="Number of threads parsing pages and extracting their sections",
+    )
+    p.add_argument(
+        "--classify-workers",
+        type=int,
+        default=1,
+        help="Number of threads classifying and scoring the extracted sections",
+    )
+    p.add_argument(
+        "--queue-size",
+        type=int,
+        default=16,
+        help="Capacity of the queues between the stages",
+    )
     args = p.parse_args()
     main(
         Path(args.input),
         Path(args.output),
-        Path(args.categories),
+        [Path(path) for path in args.categories],
         Path(args.open_access),
         Path(args.data_availability),
+        chunk_size=args.chunk_size,
+        trace_memory=args.trace_memory or args.memory_budget is not None,
+        memory_budget=args.memory_budget,
+        index=args.index,
+        index_scheme=args.index_scheme,
+        base_url=args.base_url,
+        cache=args.cache,
+        shard=args.shard,
+        metrics=args.metrics,
+        progress_interval=args.progress_interval,
+        fast_metadata=args.fast_metadata,
+        fetch_workers=args.fetch_workers,
+        parse_workers=args.parse_workers,
+        classify_workers=args.classify_workers,
+        queue_size=args.queue_size,
     )
@@ -0,0 +1,453 @@
+"""Packed archive of the cached article pages.
+
+The page cache of analysis.py is one HTML file per article (soups_<stem>/).
+On network filesystems, opening thousands of small files dominates a warm
+rerun, and copying the cache between machines is slow. An archive stores all
+pages in one append-only pack file:
+
+    <name>.pack        Concatenated (compressed) pages
+    <name>.pack.idx    One line per page: key, offset, length, compression
+    <name>.pack.zdict  Optional zlib dictionary trained on sample pages
+
+The pack is read through mmap. A page which is stored again is appended and
+the index line added last wins; `compact` drops the stale and (with a size
+limit) the oldest pages. Article pages share most of their markup, such that a
+trained dictionary reduces the size of each compressed page considerably.
+
+    pack     Convert a folder cache into an archive.
+    unpack   Convert an archive into a folder cache.
+    compact  Drop stale pages, evict the oldest pages beyond a size limit and
+             optionally train a dictionary and recompress all pages.
+    export   Write an archive into a single bundle file to copy to other hosts.
+    import   Add the pages of a bundle to an archive.
+    stats    Number of pages, sizes and compression ratio.
+
+analysis.py uses an archive instead of the folder cache if its --cache path
+ends with ".pack" (see `open_cache`).
+"""
+
+import argparse
+import collections
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import zlib
+from pathlib import Path
+
+from analysis import cached_soup_path, save_soup_to_file
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Compression of a stored page
+RAW, ZLIB, ZDICT = 0, 1, 2
+
+# Maximum useful size of a zlib dictionary (the size of the window)
+zdict_size = 32 * 1024
+
+bundle_magic = b"ARTICLE-ARCHIVE-1\n"
+
+
+def train_zdict(samples, size=zdict_size, min_share=0.5):
+    """zlib dictionary of the markup shared by the sample pages.
+
+    Tags and text runs which occur in at least `min_share` of the samples are
+    concatenated, the most common ones last (closest to the compressed data).
+    """
+    share = collections.Counter()
+    for sample in samples:
+        share.update(set(re.findall(rb"<[^<>]{1,2000}>|[^<>]{8,2000}", sample)))
+    common = [
+        piece
+        for piece, count in share.most_common()
+        if count >= min_share * len(samples)
+    ]
+    zdict, total = [], 0
+    for piece in common:
+        if total + len(piece) > size:
+            continue
+        zdict.append(piece)
+        total += len(piece)
+    return b"".join(reversed(zdict))
+
+
+def decompress(data, compression, zdict=None):
+    """Page of stored `data` (see RAW, ZLIB and ZDICT)."""
+    if compression == RAW:
+        return bytes(data)
+    if compression == ZDICT:
+        decompressor = zlib.decompressobj(zdict=zdict)
+        return decompressor.decompress(data) + decompressor.flush()
+    return zlib.decompress(data)
+
+
+class Archive:
+    """Append-only pack file of pages (bytes) by key, read through mmap."""
+
+    def __init__(self, path, compression=ZLIB):
+        self.path = Path(path)
+        self.index_path = Path(f"{path}.idx")
+        self.zdict_path = Path(f"{path}.zdict")
+        self.compression = compression
+        self.zdict = self.zdict_path.read_bytes() if self.zdict_path.exists() else None
+        self.index = self.read_index()
+        self._pack = None
+        self._map = None
+
+    def read_index(self):
+        """Entries (offset, length, compression) by key, the last line wins."""
+        index = {}
+        if not self.index_path.exists():
+            return index
+        size = self.path.stat().st_size if self.path.exists() else 0
+        with open(self.index_path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 4:
+                    # Interrupted write
+                    continue
+                key, offset, length, compression = fields
+                entry = (int(offset), int(length), int(compression))
+                if entry[0] + entry[1] <= size:
+                    index.pop(key, None)
+                    index[key] = entry
+        return index
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return list(self.index)
+
+    def _view(self, end):
+        # Map the pack again if it grew since the last mapping
+        if self._map is None or len(self._map) < end:
+            if self._pack is not None:
+                self._pack.flush()
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def get_stored(self, key):
+        """Stored (compressed) bytes and compression of `key`."""
+        offset, length, compression = self.index[key]
+        return self._view(offset + length)[offset : offset + length], compression
+
+    def get(self, key):
+        """Page of `key` as bytes, None if not stored."""
+        if key not in self.index:
+            return None
+        return decompress(*self.get_stored(key), zdict=self.zdict)
+
+    def compress(self, data):
+        """Compressed data and compression of a page to store."""
+        if self.compression == RAW:
+            return data, RAW
+        if self.zdict is not None:
+            compressor = zlib.compressobj(level=9, zdict=self.zdict)
+            return compressor.compress(data) + compressor.flush(), ZDICT
+        return zlib.compress(data, level=9), ZLIB
+
+    def put(self, key, data):
+        """Store the page `key` (bytes)."""
+        self.put_stored(key, *self.compress(data))
+
+    def put_stored(self, key, data, compression):
+        if self._pack is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._pack = open(self.path, "ab")
+        offset = self._pack.seek(0, os.SEEK_END)
+        self._pack.write(data)
+        self._pack.flush()
+        # The index line is written after the data, such that an interrupted
+        # write leaves unreferenced bytes only
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(f"{key}\t{offset}\t{len(data)}\t{compression}\n")
+        self.index.pop(key, None)
+        self.index[key] = (offset, len(data), compression)
+
+    def stored_size(self):
+        return sum(length for _, length, _ in self.index.values())
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._pack is not None:
+            self._pack.close()
+            self._pack = None
+
+    def compact(self, max_size=None, zdict=None):
+        """Rewrite the pack without stale pages.
+
+        With `max_size` (bytes), the oldest pages are evicted until the stored
+        pages fit. With `zdict`, all pages are recompressed with it.
+        """
+        keys = self.keys()
+        sizes = [self.index[key][1] for key in keys]
+        total = sum(sizes)
+        evicted = 0
+        while max_size is not None and total > max_size and evicted < len(keys):
+            total -= sizes[evicted]
+            evicted += 1
+        pages = [(key, *self.get_stored(key)) for key in keys[evicted:]]
+
+        for suffix in ["", ".idx", ".zdict"]:
+            # Leftovers of an interrupted compaction
+            Path(f"{self.path}.new{suffix}").unlink(missing_ok=True)
+        new = Archive(f"{self.path}.new", compression=self.compression)
+        new.zdict = zdict if zdict is not None else self.zdict
+        for key, data, compression in pages:
+            if zdict is not None:
+                new.put(key, decompress(data, compression, zdict=self.zdict))
+            else:
+                new.put_stored(key, bytes(data), compression)
+        new.close()
+        self.close()
+        if new.zdict is not None:
+            Path(f"{new.path}.zdict").write_bytes(new.zdict)
+        for suffix in ["", ".idx", ".zdict"]:
+            source = Path(f"{new.path}{suffix}")
+            if source.exists():
+                os.replace(source, f"{self.path}{suffix}")
+        self.__init__(self.path, compression=self.compression)
+        return evicted
+
+
+class FolderCache:
+    """Page cache as one HTML file per article, e.g. soups_<stem>/soup_{idx}.html."""
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+
+    def get(self, idx):
+        path = cached_soup_path(self.folder, idx)
+        if not path.exists():
+            return None
+        return path.read_text(encoding="utf-8")
+
+    def put(self, idx, html):
+        save_soup_to_file(html, filename=cached_soup_path(self.folder, idx))
+
+    def keys(self):
+        return sorted(
+            int(path.stem.split("_", 1)[1]) for path in self.folder.glob("soup_*.html")
+        )
+
+    def close(self):
+        pass
+
+
+class ArchiveCache:
+    """Page cache in an `Archive`, with the same keys as the folder cache.
+
+    Pages can be read and stored from several threads; the archive itself is
+    accessed by one thread at a time.
+    """
+
+    def __init__(self, path):
+        self.archive = Archive(path)
+        self.lock = threading.Lock()
+
+    def get(self, idx):
+        with self.lock:
+            page = self.archive.get(f"soup_{idx}")
+        return None if page is None else page.decode("utf-8")
+
+    def put(self, idx, html):
+        data = html.encode("utf-8")
+        with self.lock:
+            self.archive.put(f"soup_{idx}", data)
+
+    def keys(self):
+        return sorted(int(key.split("_", 1)[1]) for key in self.archive.keys())
+
+    def close(self):
+        self.archive.close()
+
+
+def open_cache(path):
+    """Page cache at `path`: an archive if it ends with ".pack", else a folder."""
+    if str(path).endswith(".pack"):
+        return ArchiveCache(path)
+    return FolderCache(path)
+
+
+def write_bundle(archive, path):
+    """Write all current pages of `archive` with its dictionary into one file."""
+    keys = archive.keys()
+    entries, offset = [], 0
+    for key in keys:
+        _, length, compression = archive.index[key]
+        entries.append([key, offset, length, compression])
+        offset += length
+    header = json.dumps(
+        {"zdict": len(archive.zdict or b""), "entries": entries}
+    ).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(bundle_magic)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        f.write(archive.zdict or b"")
+        for key in keys:
+            f.write(archive.get_stored(key)[0])
+    return len(keys)
+
+
+def read_bundle(path, archive):
+    """Add the pages of a bundle to `archive`, recompressing if needed."""
+    with open(path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        if data[: len(bundle_magic)] != bundle_magic:
+            raise ValueError(f"Not an article archive bundle: {path}")
+        start = len(bundle_magic)
+        length = int.from_bytes(data[start : start + 8], "little")
+        header = json.loads(data[start + 8 : start + 8 + length])
+        zdict_start = start + 8 + length
+        zdict = bytes(data[zdict_start : zdict_start + header["zdict"]]) or None
+        blob = zdict_start + header["zdict"]
+
+        if len(archive) == 0 and archive.zdict is None and zdict is not None:
+            # Adopt the dictionary of the bundle for a new archive
+            archive.zdict = zdict
+            archive.zdict_path.parent.mkdir(parents=True, exist_ok=True)
+            archive.zdict_path.write_bytes(zdict)
+        for key, offset, length, compression in header["entries"]:
+            stored = bytes(data[blob + offset : blob + offset + length])
+            if compression == ZDICT and zdict != archive.zdict:
+                archive.put(key, decompress(stored, compression, zdict=zdict))
+            else:
+                archive.put_stored(key, stored, compression)
+    return len(header["entries"])
+
+
+def pack_command(args):
+    folder = FolderCache(args.folder)
+    archive = Archive(args.archive)
+    keys = folder.keys()
+    if args.train and archive.zdict is None and len(archive) == 0:
+        samples = [folder.get(idx).encode("utf-8") for idx in keys[: args.train]]
+        archive.zdict = train_zdict(samples)
+        archive.zdict_path.parent.mkdir(parents=True, exist_ok=True)
+        archive.zdict_path.write_bytes(archive.zdict)
+        logging.info("Trained a dictionary of %d bytes", len(archive.zdict))
+    for idx in keys:
+        archive.put(f"soup_{idx}", folder.get(idx).encode("utf-8"))
+    archive.close()
+    logging.info("Packed %d pages into %s", len(keys), args.archive)
+
+
+def unpack_command(args):
+    cache = ArchiveCache(args.archive)
+    folder = FolderCache(args.folder)
+    keys = cache.keys()
+    for idx in keys:
+        folder.put(idx, cache.get(idx))
+    cache.close()
+    logging.info("Unpacked %d pages into %s", len(keys), args.folder)
+
+
+def compact_command(args):
+    archive = Archive(args.archive)
+    zdict = None
+    if args.train:
+        keys = archive.keys()[-args.train :]
+        zdict = train_zdict([archive.get(key) for key in keys])
+        logging.info("Trained a dictionary of %d bytes", len(zdict))
+    max_size = None if args.max_size is None else int(args.max_size * 2**20)
+    evicted = archive.compact(max_size=max_size, zdict=zdict)
+    logging.info(
+        "Evicted %d pages, %d pages (%.1f MB) left",
+        evicted,
+        len(archive),
+        archive.stored_size() / 2**20,
+    )
+    archive.close()
+
+
+def export_command(args):
+    archive = Archive(args.archive)
+    count = write_bundle(archive, args.bundle)
+    archive.close()
+    logging.info("Exported %d pages to %s", count, args.bundle)
+
+
+def import_command(args):
+    archive = Archive(args.archive)
+    count = read_bundle(args.bundle, archive)
+    archive.close()
+    logging.info("Imported %d pages into %s", count, args.archive)
+
+
+def stats_command(args):
+    archive = Archive(args.archive)
+    stored = archive.stored_size()
+    size = sum(len(archive.get(key)) for key in archive.keys())
+    pack = archive.path.stat().st_size if archive.path.exists() else 0
+    print(f"pages:       {len(archive)}")
+    print(f"page size:   {size / 2**20:.2f} MB")
+    print(f"stored size: {stored / 2**20:.2f} MB ({stored / max(size, 1):.1%})")
+    print(f"pack size:   {pack / 2**20:.2f} MB ({pack - stored} bytes stale)")
+    print(f"dictionary:  {len(archive.zdict or b'')} bytes")
+    archive.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packed archive of article pages")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack_parser = subparsers.add_parser("pack", help="Folder cache to archive")
+    pack_parser.add_argument("folder", type=str, help="folder cache (soups_<stem>)")
+    pack_parser.add_argument("archive", type=str, help="archive (<name>.pack)")
+    pack_parser.add_argument(
+        "--train",
+        type=int,
+        default=100,
+        help="Number of pages to train the dictionary on (0: no dictionary)",
+    )
+    pack_parser.set_defaults(func=pack_command)
+
+    unpack_parser = subparsers.add_parser("unpack", help="Archive to folder cache")
+    unpack_parser.add_argument("archive", type=str, help="archive (<name>.pack)")
+    unpack_parser.add_argument("folder", type=str, help="folder cache (soups_<stem>)")
+    unpack_parser.set_defaults(func=unpack_command)
+
+    compact_parser = subparsers.add_parser(
+        "compact", help="Drop stale pages and evict the oldest ones"
+    )
+    compact_parser.add_argument("archive", type=str, help="archive (<name>.pack)")
+    compact_parser.add_argument(
+        "--max-size", type=float, help="Maximum size of the stored pages in MB"
+    )
+    compact_parser.add_argument(
+        "--train",
+        type=int,
+        default=0,
+        help="Train a dictionary on this many recent pages and recompress all",
+    )
+    compact_parser.set_defaults(func=compact_command)
+
+    export_parser = subparsers.add_parser("export", help="Archive to bundle file")
+    export_parser.add_argument("archive", type=str, help="archive (<name>.pack)")
+    export_parser.add_argument("bundle", type=str, help="bundle file")
+    export_parser.set_defaults(func=export_command)
+
+    import_parser = subparsers.add_parser("import", help="Add a bundle to an archive")
+    import_parser.add_argument("bundle", type=str, help="bundle file")
+    import_parser.add_argument("archive", type=str, help="archive (<name>.pack)")
+    import_parser.set_defaults(func=import_command)
+
+    stats_parser = subparsers.add_parser("stats", help="Sizes of an archive")
+    stats_parser.add_argument("archive", type=str, help="archive (<name>.pack)")
+    stats_parser.set_defaults(func=stats_command)
+
+    args = parser.parse_args()
+    args.func(args)
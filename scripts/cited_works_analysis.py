@@ -5,93 +5,18 @@ Created on Thu Sep 18 17:25:55 2025
 @author: nli022
 """
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
-import warnings
+from statistics import NormalDist
+import argparse
+import logging
 
-# Suppress pandas SettingWithCopyWarning and UserWarning for chained indexing
-warnings.simplefilter(action="ignore", category=UserWarning)
-warnings.simplefilter(action="ignore", category=pd.errors.SettingWithCopyWarning)
+from plotting import finish, pie_grid, save_figures, use_batch_backend
+from snapshot import read_excel_cached
 
-path = Path("../database") / "cited_works.xlsx"
-save_folder = Path("../results")
-save_folder.mkdir(parents=True, exist_ok=True)
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
-# 0. Load data
-data = pd.read_excel(path, sheet_name="Sheet2")
-data = data[data["Year"] > 1995]
-
-# ---- 1. Ensure numeric columns ----
-data["Year"] = pd.to_numeric(data["Year"], errors="coerce")
-data["citation"] = pd.to_numeric(data["citation"], errors="coerce")
-
-# -------------------------
-# 2. Create 5-year bins 2021-2025, 2016-2020, etc.
-# -------------------------
-bin_size = 5
-start = 1996
-end = 2026
-bins = list(range(start, end + 1, bin_size))
-labels = [f"{bins[i]}-{bins[i + 1] - 1}" for i in range(len(bins) - 1)]
-data["Period"] = pd.cut(data["Year"], bins=bins, labels=labels, right=False)
-
-# -------------------------
-# 3. Standardize categorical columns
 # -------------------------
-# Paper
-data["paper_availability_final"] = (
-    data["paper availability"]
-    .str.strip()
-    .str.lower()
-    .map({"open access": "Open access", "not open": "Not open"})
-)
-# Code
-data["code_availability_final"] = (
-    data["code availability"]
-    .str.strip()
-    .str.lower()
-    .map({"yes": "Open access", "no": "Not open", "on request": "On request"})
-)
-# Data
-data["data_availability_final"] = (
-    data["Data availability"]
-    .str.strip()
-    .str.lower()
-    .map({"yes": "Open access", "no": "Not open", "on request": "On request"})
-)
-# AI
-data["AI_included_final"] = (
-    data["AI included"].str.strip().str.lower().map({"yes": "Yes", "no": "No"})
-)
-
-
-# -------------------------
-# 4. Group categorical trends and ensure all categories present
-# -------------------------
-def group_trend(col, categories):
-    trend = data.groupby(["Period", col], observed=False).size().unstack(fill_value=0)
-    trend = trend.reindex(columns=categories, fill_value=0)
-    return trend.loc[trend.sum(axis=1) > 0]
-
-
-def return_total_number_per_period(col):
-    trend = data.groupby(["Period", col], observed=False).size().unstack(fill_value=0)
-    return trend.loc[trend.sum(axis=1) > 0].sum(axis=1)
-
-
-trend_paper = group_trend("paper_availability_final", ["Open access", "Not open"])
-trend_code = group_trend(
-    "code_availability_final", ["Open access", "On request", "Not open"]
-)
-trend_data = group_trend(
-    "data_availability_final", ["Open access", "On request", "Not open"]
-)
-trend_ai = group_trend("AI_included_final", ["Yes", "No"])
-
-# -------------------------
-# 5. Define fixed colors for consistent legend
+# Define fixed colors for consistent legend
 # -------------------------
 paper_colors = {
     "Not open": "tab:red",
@@ -113,325 +38,464 @@ ai_colors = {
 }
 
 
+def load_cited_works(path, sheet_name="Sheet2", cache=True, cache_folder=None):
+    """Read the manually curated reference database.
+
+    The sheet is read through a cached snapshot (see snapshot.py), such that
+    only the first run pays for parsing the Excel file.
+    """
+    data = read_excel_cached(path, sheet_name, cache_folder=cache_folder, cache=cache)
+    return data[data["Year"] > 1995]
+
+
+def prepare(data):
+    """Add numeric columns, 5-year periods and standardized categories."""
+    import pandas as pd
+
+    data = data.copy()
+
+    # ---- 1. Ensure numeric columns ----
+    data["Year"] = pd.to_numeric(data["Year"], errors="coerce")
+    data["citation"] = pd.to_numeric(data["citation"], errors="coerce")
+
+    # -------------------------
+    # 2. Create 5-year bins 2021-2025, 2016-2020, etc.
+    # -------------------------
+    bin_size = 5
+    start = 1996
+    end = 2026
+    bins = list(range(start, end + 1, bin_size))
+    labels = [f"{bins[i]}-{bins[i + 1] - 1}" for i in range(len(bins) - 1)]
+    data["Period"] = pd.cut(data["Year"], bins=bins, labels=labels, right=False)
+
+    # -------------------------
+    # 3. Standardize categorical columns
+    # -------------------------
+    # Paper
+    data["paper_availability_final"] = (
+        data["paper availability"]
+        .str.strip()
+        .str.lower()
+        .map({"open access": "Open access", "not open": "Not open"})
+    )
+    # Code
+    data["code_availability_final"] = (
+        data["code availability"]
+        .str.strip()
+        .str.lower()
+        .map({"yes": "Open access", "no": "Not open", "on request": "On request"})
+    )
+    # Data
+    data["data_availability_final"] = (
+        data["Data availability"]
+        .str.strip()
+        .str.lower()
+        .map({"yes": "Open access", "no": "Not open", "on request": "On request"})
+    )
+    # AI
+    data["AI_included_final"] = (
+        data["AI included"].str.strip().str.lower().map({"yes": "Yes", "no": "No"})
+    )
+    return data
+
+
 # -------------------------
-# 6. Create figure with subplots
+# 4. Group categorical trends and ensure all categories present
 # -------------------------
-# Set global font size for all plots
-plt.rcParams.update({"font.size": 20})
-dpi = 1000
+def group_trend(data, col, categories):
+    trend = data.groupby(["Period", col], observed=False).size().unstack(fill_value=0)
+    trend = trend.reindex(columns=categories, fill_value=0)
+    return trend.loc[trend.sum(axis=1) > 0]
+
+
+def return_total_number_per_period(data, col):
+    trend = data.groupby(["Period", col], observed=False).size().unstack(fill_value=0)
+    return trend.loc[trend.sum(axis=1) > 0].sum(axis=1)
+
+
+def trends(data):
+    """Counts per period for paper, code, data availability and AI usage."""
+    return {
+        "paper": group_trend(
+            data, "paper_availability_final", ["Open access", "Not open"]
+        ),
+        "code": group_trend(
+            data, "code_availability_final", ["Open access", "On request", "Not open"]
+        ),
+        "data": group_trend(
+            data, "data_availability_final", ["Open access", "On request", "Not open"]
+        ),
+        "ai": group_trend(data, "AI_included_final", ["Yes", "No"]),
+    }
 
 
 # --- Grouped Pie Charts: Paper, Code, Data Availability ---
-def autopct_func(pct):
-    return f"{pct:.1f}%" if pct > 0 else ""
-
-
-fig_paper, axes_paper = plt.subplots(
-    1, len(trend_paper.index), figsize=(4 * len(trend_paper.index), 4)
-)
-if len(trend_paper.index) == 1:
-    axes_paper = [axes_paper]
-for i, period in enumerate(trend_paper.index):
-    values = trend_paper.loc[period]
-    wedges, texts, autotexts = axes_paper[i].pie(
-        values,
-        labels=None,  # No labels on the pie
-        autopct=autopct_func,  # Show percent only if > 0
-        colors=[paper_colors[c] for c in values.index],
-        startangle=90,
-        counterclock=False,
-        textprops={"color": "white", "fontsize": 16},
-        wedgeprops={"edgecolor": "white", "linewidth": 1},
+# Title and colors of the availability pie grids
+pie_grids = {
+    "paper": ("Paper Availability", paper_colors),
+    "code": ("Code Availability", code_colors),
+    "data": ("Data Availability", data_colors),
+}
+
+
+def availability_pie_grid(trend, availability, label="cited works | imaging"):
+    """Grouped pie chart by period for one of the entries of `pie_grids`."""
+    title, colors = pie_grids[availability]
+    return pie_grid(
+        trend,
+        colors,
+        title,
+        f"{title}\n{label}",
+        horizontal_shift=0.012,
+        pct_fontsize=16,
+        period_fontsize=16,
+        total_fontsize=14,
+        period_offset=0.0,
+        total_offset=-0.10,
     )
-    for autotext in autotexts:
-        autotext.set_color("white")
-        autotext.set_fontweight("bold")
-    # Place period label below the pie (line split for PEP8)
-    axes_paper[i].text(
-        0.5,
-        -0.00,
-        f"{period}",
-        ha="center",
-        va="center",
-        transform=axes_paper[i].transAxes,
-        fontsize=16,
+
+
+def ai_included(trend_ai):
+    """Relative share of works including AI per period."""
+    import matplotlib.pyplot as plt
+
+    ax = (trend_ai.div(trend_ai.sum(axis=1), axis=0) * 100).plot(
+        kind="bar",
+        stacked=True,
+        color=[ai_colors[c] for c in trend_ai.columns],
     )
-    # Add total count just below the period label
-    total = int(values.sum())
-    axes_paper[i].text(
-        0.5,
-        -0.10,
-        f"#total: {total}",
-        ha="center",
-        va="center",
-        transform=axes_paper[i].transAxes,
-        fontsize=14,
+    plt.title("AI Included over time (%)")
+    plt.ylabel("Percentage")
+    plt.legend(title="AI Included")
+    plt.xticks(rotation=0)
+    plt.tight_layout()
+    return ax.figure
+
+
+def regression_lines(
+    data,
+    groups,
+    x="Year",
+    y="citation",
+    by="Period",
+    method="bootstrap",
+    confidence=0.95,
+    n_boot=1000,
+    n_points=100,
+    seed=0,
+):
+    """Linear fits of `y` over `x` with confidence bands, for all groups at once.
+
+    `groups` maps a group name to a boolean mask of the rows of `data`; each
+    group is fitted separately per category of `by`. The bands are bootstrap
+    percentiles of the fitted lines (as drawn by seaborn's regplot), computed
+    for all groups in one batch, or closed-form normal intervals of the mean
+    with `method="closed"`. Fits need at least two distinct `x`.
+
+    Returns a long data frame with the columns `by`, group, `x`, fit, lower
+    and upper, with `n_points` points per fit over the range of its `x`.
+    """
+    import numpy as np
+    import pandas as pd
+
+    valid = data[x].notna() & data[y].notna()
+    fits = [
+        (period, name, data.loc[mask & valid & (data[by] == period), [x, y]])
+        for period in data[by].cat.categories
+        for name, mask in groups.items()
+    ]
+    fits = [fit for fit in fits if fit[2][x].nunique() >= 2]
+    if not fits:
+        return pd.DataFrame(columns=[by, "group", x, "fit", "lower", "upper"])
+
+    # Groups padded to a common length, with a mask of the valid entries
+    sizes = np.array([len(rows) for _, _, rows in fits])
+    xs = np.zeros((len(fits), sizes.max()))
+    ys = np.zeros_like(xs)
+    for g, (_, _, rows) in enumerate(fits):
+        xs[g, : sizes[g]] = rows[x].to_numpy(dtype=float)
+        ys[g, : sizes[g]] = rows[y].to_numpy(dtype=float)
+    valid = np.arange(xs.shape[1]) < sizes[:, None]
+    grid = np.linspace(
+        np.where(valid, xs, np.inf).min(axis=1),
+        np.where(valid, xs, -np.inf).max(axis=1),
+        n_points,
+        axis=1,
     )
-# Add a single legend to the last pie only, using the last values and wedges
-axes_paper[-1].legend(
-    wedges,
-    values.index,
-    title="Paper Availability",
-    loc="center left",
-    bbox_to_anchor=(1, 0.5),
-)
-fig_paper.text(
-    0.012,
-    0.5,
-    "Paper Availability\ncited works | imaging",
-    va="center",
-    ha="center",
-    rotation=90,
-    fontsize=16,
-    transform=fig_paper.transFigure,
-)
-plt.tight_layout()
-fig_paper.savefig(save_folder / "cited_works_paper_availability_pies.png", dpi=dpi)
-plt.show()
-
-fig_code, axes_code = plt.subplots(
-    1, len(trend_code.index), figsize=(4 * len(trend_code.index), 4)
-)
-if len(trend_code.index) == 1:
-    axes_code = [axes_code]
-for i, period in enumerate(trend_code.index):
-    values = trend_code.loc[period]
-    wedges, texts, autotexts = axes_code[i].pie(
-        values,
-        labels=None,
-        autopct=autopct_func,
-        colors=[code_colors[c] for c in values.index],
-        startangle=90,
-        counterclock=False,
-        textprops={"color": "white", "fontsize": 16},
-        wedgeprops={"edgecolor": "white", "linewidth": 1},
+
+    def least_squares(xs, ys, weights):
+        # Weighted least squares over the last axis: means and slope
+        n = weights.sum(axis=-1, keepdims=True)
+        mean_x = (weights * xs).sum(axis=-1, keepdims=True) / n
+        mean_y = (weights * ys).sum(axis=-1, keepdims=True) / n
+        dx = xs - mean_x
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = (weights * dx * (ys - mean_y)).sum(axis=-1, keepdims=True) / (
+                weights * dx**2
+            ).sum(axis=-1, keepdims=True)
+        return mean_x, mean_y, slope
+
+    def fit_lines(xs, ys, weights):
+        mean_x, mean_y, slope = least_squares(xs, ys, weights)
+        return mean_y + slope * (grid - mean_x)
+
+    fit = fit_lines(xs, ys, valid.astype(float))
+    if method == "bootstrap":
+        # Resample each group with replacement: draw positions below its size
+        rng = np.random.default_rng(seed)
+        positions = (rng.random((n_boot,) + xs.shape) * sizes[:, None]).astype(int)
+        boot = fit_lines(
+            np.take_along_axis(xs[None], positions, axis=-1),
+            np.take_along_axis(ys[None], positions, axis=-1),
+            np.broadcast_to(valid, positions.shape).astype(float),
+        )
+        tail = 100 * (1 - confidence) / 2
+        lower, upper = np.nanpercentile(boot, [tail, 100 - tail], axis=0)
+    elif method == "closed":
+        n = sizes[:, None]
+        mean_x, mean_y, slope = least_squares(xs, ys, valid.astype(float))
+        residuals = ys - (mean_y + slope * (xs - mean_x))
+        s2 = (valid * residuals**2).sum(axis=1, keepdims=True) / np.maximum(n - 2, 1)
+        sxx = (valid * (xs - mean_x) ** 2).sum(axis=1, keepdims=True)
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        half = z * np.sqrt(s2 * (1 / n + (grid - mean_x) ** 2 / sxx))
+        lower, upper = fit - half, fit + half
+    else:
+        raise ValueError(f"Unknown method: {method}")
+
+    return pd.DataFrame(
+        {
+            by: np.repeat([period for period, _, _ in fits], n_points),
+            "group": np.repeat([name for _, name, _ in fits], n_points),
+            x: grid.ravel(),
+            "fit": fit.ravel(),
+            "lower": lower.ravel(),
+            "upper": upper.ravel(),
+        }
     )
-    for autotext in autotexts:
-        autotext.set_color("white")
-        autotext.set_fontweight("bold")
-    axes_code[i].text(
-        0.5,
-        -0.0,
-        f"{period}",
-        ha="center",
-        va="center",
-        transform=axes_code[i].transAxes,
-        fontsize=16,
+
+
+def citation_fits(data, **kwargs):
+    """Period-wise fits of the citations over the years by availability.
+
+    Returns a dict of the fitted lines (see `regression_lines`) for "paper"
+    and "data" availability. For data, "Open access" includes the works with
+    data on request.
+    """
+    paper = data["paper_availability_final"]
+    data_availability = data["data_availability_final"]
+    return {
+        "paper": regression_lines(
+            data,
+            {"Open access": paper == "Open access", "Not open": paper == "Not open"},
+            **kwargs,
+        ),
+        "data": regression_lines(
+            data,
+            {
+                "Open access": data_availability.isin(["Open access", "On request"]),
+                "Not open": data_availability == "Not open",
+            },
+            **kwargs,
+        ),
+    }
+
+
+def plot_regression_lines(ax, lines, colors, x="Year", by="Period"):
+    """Draw fitted lines with their bands, colored by group."""
+    for (_, group), line in lines.groupby([by, "group"], observed=True, sort=False):
+        ax.plot(line[x], line["fit"], color=colors[group])
+        ax.fill_between(
+            line[x], line["lower"], line["upper"], color=colors[group], alpha=0.15
+        )
+
+
+def citation_vs_availability(data, lines, column, colors, label):
+    """Citations per year colored by availability, with period-wise fits."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    sns.scatterplot(
+        data=data,
+        x="Year",
+        y="citation",
+        hue=column,
+        s=50,
+        palette=colors,
+        ax=ax,
     )
-    # Add total count just below the period label
-    total = int(values.sum())
-    axes_code[i].text(
-        0.5,
-        -0.10,
-        f"#total: {total}",
-        ha="center",
-        va="center",
-        transform=axes_code[i].transAxes,
-        fontsize=14,
+    plot_regression_lines(ax, lines, colors)
+    ax.set_title(f"Citation vs Year by {label}")
+    ax.set_ylabel("Citations")
+    ax.set_xlabel("Year")
+    ax.set_yscale("log")
+    ax.legend(title=label)
+    plt.tight_layout()
+    return fig
+
+
+def citation_vs_paper_availability(data, lines=None):
+    """Citations per year colored by paper availability, with period-wise fits."""
+    if lines is None:
+        lines = citation_fits(data)["paper"]
+    return citation_vs_availability(
+        data, lines, "paper_availability_final", paper_colors, "Paper Availability"
     )
-axes_code[-1].legend(
-    wedges,
-    values.index,
-    title="Code Availability",
-    loc="center left",
-    bbox_to_anchor=(1, 0.5),
-)
-fig_code.text(
-    0.012,
-    0.5,
-    "Code Availability\ncited works | imaging",
-    va="center",
-    ha="center",
-    rotation=90,
-    fontsize=16,
-    transform=fig_code.transFigure,
-)
-plt.tight_layout()
-fig_code.savefig(save_folder / "cited_works_code_availability_pies.png", dpi=dpi)
-plt.show()
-
-fig_data, axes_data = plt.subplots(
-    1, len(trend_data.index), figsize=(4 * len(trend_data.index), 4)
-)
-if len(trend_data.index) == 1:
-    axes_data = [axes_data]
-for i, period in enumerate(trend_data.index):
-    values = trend_data.loc[period]
-    wedges, texts, autotexts = axes_data[i].pie(
-        values,
-        labels=None,
-        autopct=autopct_func,
-        colors=[data_colors[c] for c in values.index],
-        startangle=90,
-        counterclock=False,
-        textprops={"color": "white", "fontsize": 16},
-        wedgeprops={"edgecolor": "white", "linewidth": 1},
+
+
+def citation_vs_data_availability(data, lines=None):
+    """Citations per year colored by data availability, with period-wise fits."""
+    if lines is None:
+        lines = citation_fits(data)["data"]
+    return citation_vs_availability(
+        data, lines, "data_availability_final", data_colors, "Data Availability"
     )
-    for autotext in autotexts:
-        autotext.set_color("white")
-        autotext.set_fontweight("bold")
-    axes_data[i].text(
-        0.5,
-        -0.0,
-        f"{period}",
-        ha="center",
-        va="center",
-        transform=axes_data[i].transAxes,
-        fontsize=16,
+
+
+def data_availability_per_year(data):
+    """Bar plot of relative data availability over time (per year)."""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    trend_data_yearly = (
+        data.groupby(["Year", "data_availability_final"]).size().unstack(fill_value=0)
     )
-    # Add total count just below the period label
-    total = int(values.sum())
-    axes_data[i].text(
-        0.5,
-        -0.10,
-        f"#total: {total}",
-        ha="center",
-        va="center",
-        transform=axes_data[i].transAxes,
-        fontsize=14,
+    trend_data_yearly = trend_data_yearly.reindex(
+        columns=["Open access", "On request", "Not open"], fill_value=0
     )
-axes_data[-1].legend(
-    wedges,
-    values.index,
-    title="Data Availability",
-    loc="center left",
-    bbox_to_anchor=(1, 0.5),
-)
-fig_data.text(
-    0.012,
-    0.5,
-    "Data Availability\ncited works | imaging",
-    va="center",
-    ha="center",
-    rotation=90,
-    fontsize=16,
-    transform=fig_data.transFigure,
-)
-plt.tight_layout()
-fig_data.savefig(save_folder / "cited_works_data_availability_pies.png", dpi=dpi)
-plt.show()
-
-# --- AI Included Bar Plot ---
-(trend_ai.div(trend_ai.sum(axis=1), axis=0) * 100).plot(
-    kind="bar",
-    stacked=True,
-    color=[ai_colors[c] for c in trend_ai.columns],
-)
-plt.title("AI Included over time (%)")
-plt.ylabel("Percentage")
-plt.legend(title="AI Included")
-plt.xticks(rotation=0)
-plt.tight_layout()
-plt.show()
-
-# --- Citation vs Paper Availability ---
-fig, ax = plt.subplots(figsize=(8, 5))
-sns.scatterplot(
-    data=data,
-    x="Year",
-    y="citation",
-    hue="paper_availability_final",
-    s=50,
-    palette=paper_colors,
-    ax=ax,
-)
-for period in labels:
-    period_data = data[data["Period"] == period][
-        data["paper_availability_final"] == "Open access"
-    ]
-    if not period_data.empty:
-        sns.regplot(
-            data=period_data,
-            x="Year",
-            y="citation",
-            scatter=False,
-            ax=ax,
-            color="tab:green",
-        )
-    period_data = data[data["Period"] == period][
-        data["paper_availability_final"] == "Not open"
-    ]
-    if not period_data.empty:
-        sns.regplot(
-            data=period_data,
-            x="Year",
-            y="citation",
-            scatter=False,
-            ax=ax,
-            color="tab:red",
-        )
-ax.set_title("Citation vs Year by Paper Availability")
-ax.set_ylabel("Citations")
-ax.set_xlabel("Year")
-ax.set_yscale("log")
-ax.legend(title="Paper Availability")
-plt.tight_layout()
-plt.show()
-
-# --- Citation vs Data Availability ---
-fig, ax = plt.subplots(figsize=(8, 5))
-sns.scatterplot(
-    data=data,
-    x="Year",
-    y="citation",
-    hue="data_availability_final",
-    s=50,
-    palette=data_colors,
-    ax=ax,
-)
-for period in labels:
-    period_data = data[data["Period"] == period][
-        (data["data_availability_final"] == "Open access")
-        | (data["data_availability_final"] == "On request")
-    ]
-    if not period_data.empty:
-        sns.regplot(
-            data=period_data,
-            x="Year",
-            y="citation",
-            scatter=False,
-            ax=ax,
-            color="tab:green",
-        )
-    period_data = data[data["Period"] == period][
-        data["data_availability_final"] == "No"
-    ]
-    if not period_data.empty:
-        sns.regplot(
-            data=period_data,
-            x="Year",
-            y="citation",
-            scatter=False,
-            ax=ax,
-            color="tab:red",
+    trend_data_yearly = trend_data_yearly.div(trend_data_yearly.sum(axis=1), axis=0)
+    trend_data_yearly.plot(
+        kind="bar",
+        stacked=True,
+        color=[data_colors[c] for c in trend_data_yearly.columns],
+        ax=ax,
+    )
+    ax.set_title("Data Availability | cited works")
+    ax.set_ylabel("Proportion")
+    ax.set_xlabel("Year")
+    ax.legend(title="Data Availability", bbox_to_anchor=(1, 1))
+    plt.tight_layout()
+    return fig
+
+
+def all_figures(data, fits=None):
+    """Draw all figures for the prepared cited works (see `prepare`).
+
+    `fits` are the fitted citation lines (see `citation_fits`), computed if
+    not given. Returns a dict mapping the figure name to the figure.
+    """
+    _trends = trends(data)
+    fits = citation_fits(data) if fits is None else fits
+    figures = {
+        f"cited_works_{availability}_availability_pies": availability_pie_grid(
+            _trends[availability], availability
         )
-ax.set_title("Citation vs Year by Data Availability")
-ax.set_ylabel("Citations")
-ax.set_xlabel("Year")
-ax.set_yscale("log")
-ax.legend(title="Data Availability")
-plt.tight_layout()
-plt.show()
-
-# Bar plot of relative data availability over time (per year)
-fig, ax = plt.subplots(figsize=(10, 6))
-trend_data_yearly = (
-    data.groupby(["Year", "data_availability_final"]).size().unstack(fill_value=0)
-)
-trend_data_yearly = trend_data_yearly.reindex(
-    columns=["Open access", "On request", "Not open"], fill_value=0
-)
-trend_data_yearly = trend_data_yearly.div(trend_data_yearly.sum(axis=1), axis=0)
-trend_data_yearly.plot(
-    kind="bar",
-    stacked=True,
-    color=[data_colors[c] for c in trend_data_yearly.columns],
-    ax=ax,
-)
-ax.set_title("Data Availability | cited works")
-ax.set_ylabel("Proportion")
-ax.set_xlabel("Year")
-ax.legend(title="Data Availability", bbox_to_anchor=(1, 1))
-plt.tight_layout()
-plt.savefig(save_folder / "cited_works_data_availability.png", dpi=dpi)
-plt.show()
+        for availability in pie_grids
+    }
+    return {
+        **figures,
+        "cited_works_ai_included": ai_included(_trends["ai"]),
+        "cited_works_citation_vs_paper_availability": citation_vs_paper_availability(
+            data, fits["paper"]
+        ),
+        "cited_works_citation_vs_data_availability": citation_vs_data_availability(
+            data, fits["data"]
+        ),
+        "cited_works_data_availability": data_availability_per_year(data),
+    }
+
+
+# Figures stored to file, the remaining ones are only displayed (all are stored
+# in batch mode)
+saved_figures = [
+    "cited_works_paper_availability_pies",
+    "cited_works_code_availability_pies",
+    "cited_works_data_availability_pies",
+    "cited_works_data_availability",
+]
+
+
+def main(args):
+    import pandas as pd
+
+    if args.batch:
+        use_batch_backend()
+    import matplotlib.pyplot as plt
+
+    save_folder = Path(args.output_folder)
+    save_folder.mkdir(parents=True, exist_ok=True)
+
+    # Set global font size for all plots
+    plt.rcParams.update({"font.size": 20})
+
+    data = prepare(
+        load_cited_works(args.input, sheet_name=args.sheet, cache=not args.no_cache)
+    )
+    fits = citation_fits(data, method=args.bands, n_boot=args.n_boot)
+    fits_path = save_folder / "cited_works_citation_fits.csv"
+    pd.concat(
+        [lines.assign(availability=name) for name, lines in fits.items()],
+        ignore_index=True,
+    ).round(4).to_csv(fits_path, index=False)
+    logging.info("Wrote the fitted citation lines to %s", fits_path)
+    figures = all_figures(data, fits=fits)
+    if not args.batch:
+        figures = {name: figures[name] for name in saved_figures}
+    # The figure names already carry the "cited_works" prefix
+    paths = save_figures(
+        {name[len("cited_works_") :]: fig for name, fig in figures.items()},
+        save_folder,
+        "cited_works",
+        close=args.batch,
+    )
+    finish(paths, save_folder / "cited_works_manifest.json", args.batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze the cited works database")
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=str,
+        default=str(Path("../database") / "cited_works.xlsx"),
+        help="Path to the Excel file with the cited works",
+    )
+    parser.add_argument(
+        "--sheet",
+        type=str,
+        default="Sheet2",
+        help="Sheet of the Excel file to analyze",
+    )
+    parser.add_argument(
+        "--output-folder",
+        "-o",
+        type=str,
+        default="../results",
+        help="Folder for the figures",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse the Excel file instead of using the cached snapshot",
+    )
+    parser.add_argument(
+        "--bands",
+        type=str,
+        default="bootstrap",
+        choices=["bootstrap", "closed"],
+        help="Confidence bands of the citation fits: bootstrap percentiles or "
+        "closed-form normal intervals",
+    )
+    parser.add_argument(
+        "--n-boot",
+        type=int,
+        default=1000,
+        help="Bootstrap resamples of the citation fits",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Only render all figures to files (no GUI) and print a manifest",
+    )
+    main(parser.parse_args())
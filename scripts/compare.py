@@ -0,0 +1,241 @@
+"""Cross-journal comparison of paper and data availability.
+
+Each results file is aggregated once into a cube (see cube.py), which is
+cached next to it. All figures and tables are drawn from the combined cubes,
+such that adding a journal only costs its own aggregation.
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+from cube import add_period, load_cube, marginal
+from plotting import (
+    data_colors,
+    data_order,
+    dpi,
+    paper_colors,
+    paper_order,
+    pyplot,
+    save_figures,
+)
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Availability dimensions of the cube: (title, column, class order, colors)
+availabilities = {
+    "paper": ("Paper Availability", "article_availability", paper_order, paper_colors),
+    "data": ("Data Availability", "data_availability", data_order, data_colors),
+}
+
+
+def combine(cubes, categories=None):
+    """Stack the cubes of several journals with aligned periods.
+
+    `cubes` maps the journal name to its cube. Restricts to `categories` unless
+    None or ["All"].
+    """
+    import pandas as pd
+
+    combined = pd.concat(
+        [cube.assign(journal=journal) for journal, cube in cubes.items()],
+        ignore_index=True,
+    )
+    if categories is not None and list(categories) != ["All"]:
+        combined = combined[combined["category"].isin(categories)]
+    combined["journal"] = pd.Categorical(combined["journal"], categories=list(cubes))
+    return add_period(combined)
+
+
+def trend_table(combined, availability, index="year"):
+    """Counts and percentages per journal and year (or period) for all classes."""
+    _, column, order, _ = availabilities[availability]
+    table = marginal(combined, ["journal", index], column, order)
+    table["total"] = table[order].sum(axis=1)
+    for cls in order:
+        table[f"{cls} [%]"] = (
+            100 * table[cls] / table["total"].where(table["total"] > 0)
+        )
+    return table
+
+
+def trend_figure(table, availability):
+    """Share of each class per year, one line per journal on a common axis."""
+    plt = pyplot()
+
+    title, _, order, colors = availabilities[availability]
+    journals = table.index.get_level_values("journal").unique()
+    styles = ["-", "--", ":", "-."]
+    fig, axes = plt.subplots(
+        1, len(order), figsize=(6 * len(order), 5), sharey=True, squeeze=False
+    )
+    for ax, cls in zip(axes[0], order):
+        for i, journal in enumerate(journals):
+            rows = table.xs(journal, level="journal")
+            rows = rows[rows["total"] > 0]
+            ax.plot(
+                rows.index,
+                rows[f"{cls} [%]"],
+                linestyle=styles[i % len(styles)],
+                marker="o",
+                color=colors[cls],
+                label=journal,
+            )
+        ax.set_title(cls)
+        ax.set_xlabel("Year")
+        ax.set_ylim(0, 100)
+    axes[0][0].set_ylabel("Percent of articles [%]")
+    axes[0][-1].legend(title="Journal", bbox_to_anchor=(1.05, 1), loc="upper left")
+    fig.suptitle(title)
+    fig.tight_layout()
+    return fig
+
+
+def availability_figure(table, availability):
+    """Stacked bars of the classes per period, one bar per journal."""
+    import numpy as np
+
+    plt = pyplot()
+
+    title, _, order, colors = availabilities[availability]
+    journals = list(table.index.get_level_values("journal").unique())
+    periods = list(table.index.get_level_values("Period").unique())
+    width = 0.8 / len(journals)
+    x = np.arange(len(periods))
+    fig, ax = plt.subplots(figsize=(4 * len(periods), 6))
+    for i, journal in enumerate(journals):
+        rows = table.xs(journal, level="journal").reindex(periods)
+        offset = x - 0.4 + (i + 0.5) * width
+        bottom = np.zeros(len(periods))
+        for cls in order:
+            values = rows[f"{cls} [%]"].fillna(0).values
+            ax.bar(
+                offset,
+                values,
+                width=0.95 * width,
+                bottom=bottom,
+                color=colors[cls],
+                label=cls if i == 0 else None,
+            )
+            bottom += values
+        for xi, total in zip(offset, rows["total"].fillna(0)):
+            ax.text(
+                xi,
+                -2,
+                f"{journal}\n#{int(total)}",
+                ha="center",
+                va="top",
+                fontsize=10,
+            )
+    ax.set_xticks(x)
+    ax.set_xticklabels(periods)
+    ax.tick_params(axis="x", pad=40)
+    ax.set_ylim(0, 100)
+    ax.set_ylabel("Percent of articles [%]")
+    ax.set_title(title)
+    ax.legend(title=title, bbox_to_anchor=(1.05, 1), loc="upper left")
+    fig.tight_layout()
+    return fig
+
+
+def all_figures(combined):
+    """Trend and period figures for paper and data availability."""
+    figures = {}
+    for availability in availabilities:
+        figures[f"{availability}_availability_per_year"] = trend_figure(
+            trend_table(combined, availability), availability
+        )
+        figures[f"{availability}_availability_per_period"] = availability_figure(
+            trend_table(combined, availability, index="Period"), availability
+        )
+    return figures
+
+
+def all_tables(combined):
+    """Trend tables per year and per period for paper and data availability."""
+    return {
+        f"{availability}_availability_per_{index.lower()}": trend_table(
+            combined, availability, index=index
+        )
+        for availability in availabilities
+        for index in ["year", "Period"]
+    }
+
+
+def main(args):
+    if len(args.input) != len(args.journal):
+        raise ValueError("Provide one journal name per input file.")
+    cubes = {
+        journal: load_cube(path, cache=not args.no_cache, scheme=args.scheme)
+        for path, journal in zip(args.input, args.journal)
+    }
+    combined = combine(cubes, args.categories)
+
+    output_folder = Path(args.output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    for name, table in all_tables(combined).items():
+        path = output_folder / f"{args.stem}_{name}.csv"
+        table.round(2).to_csv(path)
+        logging.info("Wrote table to %s", path)
+    save_figures(all_figures(combined), output_folder, args.stem)
+    logging.info("Wrote figures (dpi %d) to %s", dpi, output_folder)
+    if args.show:
+        pyplot().show()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare paper and data availability across journals"
+    )
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Paths to the analysis results CSV files",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Journal names to print in plots, one per input file",
+    )
+    parser.add_argument(
+        "--categories",
+        "-c",
+        type=str,
+        nargs="+",
+        default=["All"],
+        help="List of categories to include in the comparison",
+    )
+    parser.add_argument(
+        "--scheme",
+        type=str,
+        help="Scheme of the categories, for results of several categories files",
+    )
+    parser.add_argument(
+        "--output-folder",
+        "-o",
+        type=str,
+        default="../results",
+        help="Folder for the figures and tables",
+    )
+    parser.add_argument(
+        "--stem",
+        type=str,
+        default="comparison",
+        help="Prefix of the output file names",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Aggregate all results files again instead of using cached cubes",
+    )
+    parser.add_argument(
+        "--show",
+        action="store_true",
+        help="Display the figures after writing them",
+    )
+    main(parser.parse_args())
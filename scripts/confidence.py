@@ -0,0 +1,215 @@
+"""Confidence intervals for availability shares.
+
+Some category-years only hold a handful of articles, such that the raw shares
+in the trend figures can be misleading. This module computes Wilson score or
+bootstrap intervals for every cell of a count table (e.g. year x category) and
+every availability class at once.
+
+The bootstrap resamples all cells in one vectorized pass: the multinomial
+draw of each cell is decomposed into a sequence of binomial draws over arrays
+of shape (resamples, cells). The resamples can optionally be split over
+several processes.
+"""
+
+import argparse
+import logging
+from statistics import NormalDist
+
+from cube import add_period, load_cube, marginal
+from plotting import data_order, paper_order
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# NOTE: numpy and pandas are imported where needed.
+
+methods = ["wilson", "bootstrap"]
+
+
+def wilson_interval(counts, confidence=0.95):
+    """Wilson score interval of the share of each class per cell.
+
+    `counts` has shape (cells, classes). Returns lower and upper bounds of
+    the same shape, NaN for empty cells.
+    """
+    import numpy as np
+
+    counts = np.asarray(counts, dtype=float)
+    n = counts.sum(axis=-1, keepdims=True)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = counts / n
+        center = (p + z**2 / (2 * n)) / (1 + z**2 / n)
+        half = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / (1 + z**2 / n)
+    return center - half, center + half
+
+
+def _bootstrap_shares(counts, n_boot, seed):
+    """Resampled shares of shape (n_boot, cells, classes)."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    counts = np.asarray(counts)
+    n = counts.sum(axis=-1)
+    safe_n = np.where(n > 0, n, 1)
+    p = counts / safe_n[:, None]
+    draws = np.empty((n_boot,) + counts.shape, dtype=np.int64)
+    remaining = np.broadcast_to(n, (n_boot, len(n))).copy()
+    mass = np.ones(len(n))
+    for j in range(counts.shape[1] - 1):
+        # Conditional share of class j among the classes not drawn yet
+        q = np.clip(p[:, j] / np.where(mass > 0, mass, 1), 0, 1)
+        draws[:, :, j] = rng.binomial(remaining, np.where(mass > 0, q, 0))
+        remaining -= draws[:, :, j]
+        mass = mass - p[:, j]
+    draws[:, :, -1] = remaining
+    return draws / safe_n[None, :, None]
+
+
+def _bootstrap_quantiles(counts, n_boot, confidence, seed):
+    import numpy as np
+
+    shares = np.sort(_bootstrap_shares(counts, n_boot, seed), axis=0)
+    lower = shares[int(np.floor((1 - confidence) / 2 * (n_boot - 1)))]
+    upper = shares[int(np.ceil((1 + confidence) / 2 * (n_boot - 1)))]
+    return lower, upper
+
+
+def bootstrap_interval(counts, n_boot=2000, confidence=0.95, seed=0, workers=1):
+    """Percentile bootstrap interval of the share of each class per cell.
+
+    `counts` has shape (cells, classes). With `workers` > 1, the resamples are
+    split over that many processes; the bounds are then averaged over the
+    workers' percentiles. Returns lower and upper bounds of the same shape
+    as `counts`, NaN for empty cells.
+    """
+    import numpy as np
+
+    counts = np.asarray(counts)
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        chunk = -(-n_boot // workers)
+        with ProcessPoolExecutor(workers) as executor:
+            parts = list(
+                executor.map(
+                    _bootstrap_quantiles,
+                    [counts] * workers,
+                    [chunk] * workers,
+                    [confidence] * workers,
+                    seeds,
+                )
+            )
+        lower = np.mean([part[0] for part in parts], axis=0)
+        upper = np.mean([part[1] for part in parts], axis=0)
+    else:
+        lower, upper = _bootstrap_quantiles(counts, n_boot, confidence, seed)
+    empty = counts.sum(axis=-1) == 0
+    lower[empty] = np.nan
+    upper[empty] = np.nan
+    return lower, upper
+
+
+def intervals(counts, method="wilson", confidence=0.95, **kwargs):
+    """Lower and upper bounds of the class shares using `method`."""
+    if method == "wilson":
+        return wilson_interval(counts, confidence=confidence)
+    if method == "bootstrap":
+        return bootstrap_interval(counts, confidence=confidence, **kwargs)
+    raise ValueError(f"Unknown method: {method}")
+
+
+def proportion_interval(k, n, method="wilson", confidence=0.95, **kwargs):
+    """Bounds of the proportions k / n (arrays of equal shape)."""
+    import numpy as np
+
+    k = np.asarray(k)
+    counts = np.stack([k.ravel(), np.asarray(n).ravel() - k.ravel()], axis=-1)
+    lower, upper = intervals(counts, method=method, confidence=confidence, **kwargs)
+    return lower[:, 0].reshape(k.shape), upper[:, 0].reshape(k.shape)
+
+
+def interval_table(cube, index, column, order, method="wilson", **kwargs):
+    """Long table of counts, shares and bounds per cell of `index` and class.
+
+    `index` is a column name or a list of column names of the cube, `column`
+    the availability column with classes `order`.
+    """
+    import pandas as pd
+
+    table = marginal(cube, index, column, order)
+    counts = table.to_numpy()
+    lower, upper = intervals(counts, method=method, **kwargs)
+    total = counts.sum(axis=1, keepdims=True)
+    share = counts / total.clip(min=1)
+    long = []
+    for j, cls in enumerate(order):
+        part = table.index.to_frame(index=False)
+        part["availability"] = column
+        part["class"] = cls
+        part["count"] = counts[:, j]
+        part["total"] = total[:, 0]
+        part["share"] = share[:, j]
+        part["lower"] = lower[:, j]
+        part["upper"] = upper[:, j]
+        long.append(part)
+    return pd.concat(long, ignore_index=True)
+
+
+def main(args):
+    import pandas as pd
+
+    cube = load_cube(args.input, scheme=args.scheme)
+    if "Period" in args.index:
+        cube = add_period(cube)
+    kwargs = {"confidence": args.confidence}
+    if args.method == "bootstrap":
+        kwargs.update(n_boot=args.n_boot, seed=args.seed, workers=args.workers)
+    table = pd.concat(
+        [
+            interval_table(cube, args.index, column, order, args.method, **kwargs)
+            for column, order in [
+                ("article_availability", paper_order),
+                ("data_availability", data_order),
+            ]
+        ],
+        ignore_index=True,
+    )
+    table.round(4).to_csv(args.output, index=False)
+    logging.info("Wrote %d intervals to %s", len(table), args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Confidence intervals of paper and data availability shares"
+    )
+    parser.add_argument(
+        "--input", "-i", type=str, required=True, help="analysis results CSV"
+    )
+    parser.add_argument(
+        "--output", "-o", type=str, required=True, help="output CSV file"
+    )
+    parser.add_argument(
+        "--index",
+        type=str,
+        nargs="+",
+        default=["year", "category"],
+        choices=["year", "Period", "category"],
+        help="Cells of the table",
+    )
+    parser.add_argument("--method", type=str, default="wilson", choices=methods)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--n-boot", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes for the bootstrap resamples",
+    )
+    parser.add_argument(
+        "--scheme",
+        type=str,
+        help="Scheme of the categories, for results of several categories files",
+    )
+    main(parser.parse_args())
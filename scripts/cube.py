@@ -0,0 +1,136 @@
+"""Pre-aggregated counts of analysis results.
+
+A cube holds the number of articles per year, category, paper availability
+and data availability class. It is a small data frame which is all that is
+needed for trend and pie views, such that figures, reports and comparisons do
+not have to touch the per-article results again.
+"""
+
+import logging
+from pathlib import Path
+
+from analysis import scheme_results
+from plotting import (
+    data_availability_map,
+    data_order,
+    paper_availability_map,
+    paper_order,
+    period_bins,
+)
+
+# NOTE: pandas is imported where needed, such that the command line interfaces
+# using this module start quickly.
+
+dimensions = ["year", "category", "article_availability", "data_availability"]
+
+
+def build_cube(df):
+    """Aggregate a results data frame (as written by analysis.py) into a cube."""
+    import pandas as pd
+
+    data = pd.DataFrame(
+        {
+            "year": df["year"].astype(int),
+            "category": df["category"],
+            "article_availability": df["article_availability_score"].map(
+                paper_availability_map
+            ),
+            "data_availability": df["data_availability_score"].map(
+                data_availability_map
+            ),
+        }
+    )
+    cube = data.groupby(dimensions, observed=True).size().rename("count")
+    return cube.reset_index()
+
+
+def cube_path(results_path, scheme=None):
+    """Location of the cached cube of a results CSV (and scheme)."""
+    results_path = Path(results_path)
+    stem = results_path.stem if scheme is None else f"{results_path.stem}_{scheme}"
+    return results_path.parent / f"{stem}_cube.csv"
+
+
+def load_cube(results_path, cache=True, scheme=None):
+    """Cube of a results CSV, cached next to it as '<stem>_cube.csv'.
+
+    The cached cube is reused as long as it is newer than the results file.
+    `scheme` selects the categories of results of several schemes (see
+    analysis.scheme_results), cached as '<stem>_<scheme>_cube.csv'.
+    """
+    import pandas as pd
+
+    results_path = Path(results_path)
+    path = cube_path(results_path, scheme)
+    if cache and path.exists() and path.stat().st_mtime >= results_path.stat().st_mtime:
+        return pd.read_csv(path)
+    cube = build_cube(scheme_results(pd.read_csv(results_path), scheme))
+    if cache:
+        cube.to_csv(path, index=False)
+        logging.info("Wrote cube to %s", path)
+    return cube
+
+
+def add_period(cube, min_year=None, max_year=None):
+    """Add the 5-year period of each year (see plotting.period_bins).
+
+    Pass common `min_year` and `max_year` to align the periods of several cubes.
+    """
+    import pandas as pd
+
+    min_year = int(cube["year"].min()) if min_year is None else min_year
+    max_year = int(cube["year"].max()) if max_year is None else max_year
+    bins, labels = period_bins(min_year, max_year)
+    cube = cube.copy()
+    cube["Period"] = pd.cut(cube["year"], bins=bins, labels=labels, right=False)
+    return cube
+
+
+def marginal(cube, index, column, order):
+    """Counts with `index` as rows and the classes of `column` as columns.
+
+    `index` is a column name or a list of column names of the cube.
+    """
+    table = cube.pivot_table(
+        index=index, columns=column, values="count", aggfunc="sum", fill_value=0
+    )
+    return table.reindex(columns=order, fill_value=0)
+
+
+def paper_trend(cube, index="year"):
+    return marginal(cube, index, "article_availability", paper_order)
+
+
+def data_trend(cube, index="year"):
+    return marginal(cube, index, "data_availability", data_order)
+
+
+def to_compact(cube):
+    """Compact, JSON serializable form of a cube.
+
+    The dimension values are stored once, each non-empty cell is a list of
+    indices into them followed by the count.
+    """
+    values = {dim: sorted(cube[dim].dropna().unique().tolist()) for dim in dimensions}
+    # Keep the availability classes in the usual order
+    values["article_availability"] = [
+        c for c in paper_order if c in values["article_availability"]
+    ]
+    values["data_availability"] = [
+        c for c in data_order if c in values["data_availability"]
+    ]
+    lookup = {dim: {v: i for i, v in enumerate(values[dim])} for dim in dimensions}
+    cells = [
+        [lookup[dim][row[dim]] for dim in dimensions] + [int(row["count"])]
+        for row in cube.dropna(subset=dimensions).to_dict("records")
+    ]
+    return {
+        "dimensions": dimensions,
+        "values": {dim: [_plain(v) for v in values[dim]] for dim in dimensions},
+        "cells": cells,
+    }
+
+
+def _plain(value):
+    # numpy scalars are not JSON serializable
+    return value.item() if hasattr(value, "item") else value
@@ -0,0 +1,341 @@
+"""Sampled estimate of the availability trends of an export.
+
+Instead of analyzing all articles, a random sample is drawn per year and the
+paper and data availability shares per year and category are estimated with
+confidence intervals (see confidence.py). Starting from --initial articles per
+year, further articles are analyzed in batches from the year whose widest
+interval is the widest of all years, until every interval of the years (with
+--by-category: of every category of each year) is narrower than
+--target-width, the --budget of analyzed articles is used up or all articles
+are analyzed. The estimates of all categories are reported either way.
+
+The intervals are narrowed by the finite population correction, using the
+number of articles of each year in the export (and, for a category, its
+estimated share of the year): a year which is analyzed completely has exact
+shares. With --by-category, a rare category needs many articles of its year to
+reach the target, so a budget bounds the cost.
+
+Fetched pages are stored in the page cache of analysis.py, such that a later
+full run (or a second estimate) reuses them.
+"""
+
+import argparse
+import logging
+import random
+from collections import deque
+from pathlib import Path
+
+from analysis import (
+    FetchStats,
+    Rules,
+    analyze_article,
+    normalize_export,
+    results_frame,
+)
+from confidence import intervals, methods
+from plotting import (
+    data_availability_map,
+    data_order,
+    paper_availability_map,
+    paper_order,
+)
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# NOTE: numpy and pandas are imported where needed.
+
+# Estimated shares: availability column, score column, classes of the scores
+availabilities = [
+    ("article_availability", "article_availability_score", paper_availability_map),
+    ("data_availability", "data_availability_score", data_availability_map),
+]
+class_orders = {"article_availability": paper_order, "data_availability": data_order}
+
+# Category of the estimates over all categories of a year
+all_categories = "all"
+
+
+def finite_population_correction(sampled, population):
+    """Factor narrowing an interval of `sampled` of `population` articles."""
+    import numpy as np
+
+    sampled = np.asarray(sampled, dtype=float)
+    population = np.maximum(np.asarray(population, dtype=float), sampled)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        factor = np.sqrt((population - sampled) / (population - 1))
+    return np.where(population > 1, np.nan_to_num(factor), 0.0)
+
+
+def estimate_table(sample, population, method="wilson", confidence=0.95, **kwargs):
+    """Estimated shares with bounds per year and category of the analyzed `sample`.
+
+    `population` is the number of articles per year in the export. Returns a
+    long table with the columns year, category ("all" for the whole year),
+    availability, class, sampled, articles (estimated number in the export),
+    share, lower and upper.
+    """
+    import pandas as pd
+
+    sample = sample.assign(year=sample["year"].astype(int))
+    sampled_per_year = sample.groupby("year").size()
+    tables = []
+    for availability, score_column, score_map in availabilities:
+        order = class_orders[availability]
+        classes = sample[score_column].astype(float).map(score_map)
+        for cells in [["year", "category"], ["year"]]:
+            counts = (
+                pd.crosstab([sample[cell] for cell in cells], classes)
+                .reindex(columns=order, fill_value=0)
+                .astype(int)
+            )
+            if cells == ["year"]:
+                counts.index = pd.MultiIndex.from_arrays(
+                    [counts.index, [all_categories] * len(counts)],
+                    names=["year", "category"],
+                )
+            values = counts.to_numpy()
+            sampled = values.sum(axis=1)
+            years = counts.index.get_level_values("year")
+            # Ratio estimate of the number of articles of each cell
+            articles = (
+                population.reindex(years).to_numpy()
+                * sampled
+                / sampled_per_year.reindex(years).to_numpy()
+            )
+            lower, upper = intervals(
+                values, method=method, confidence=confidence, **kwargs
+            )
+            share = values / sampled[:, None]
+            factor = finite_population_correction(sampled, articles)[:, None]
+            lower = share - (share - lower) * factor
+            upper = share + (upper - share) * factor
+            for j, cls in enumerate(order):
+                part = counts.index.to_frame(index=False)
+                part["availability"] = availability
+                part["class"] = cls
+                part["sampled"] = sampled
+                part["articles"] = articles.round(1)
+                part["share"] = share[:, j]
+                part["lower"] = lower[:, j]
+                part["upper"] = upper[:, j]
+                tables.append(part)
+    table = pd.concat(tables, ignore_index=True)
+    return table.sort_values(
+        ["availability", "year", "category", "class"], ignore_index=True
+    )
+
+
+def widest_intervals(table, by_category=False):
+    """Width of the widest interval per year, of the year as a whole or of
+    each of its categories."""
+    if not by_category:
+        table = table[table["category"] == all_categories]
+    return (table["upper"] - table["lower"]).groupby(table["year"]).max()
+
+
+class SequentialEstimate:
+    """Sequentially sampled estimate over the articles of a normalized export.
+
+    `options` are passed to `analysis.analyze_article` (page cache, base URL,
+    fetch statistics).
+    """
+
+    def __init__(
+        self,
+        df,
+        rules,
+        seed=0,
+        method="wilson",
+        confidence=0.95,
+        by_category=False,
+        **options,
+    ):
+        import pandas as pd
+
+        self.df = df
+        self.rules = rules
+        self.method = method
+        self.confidence = confidence
+        self.by_category = by_category
+        self.kwargs = {"seed": seed} if method == "bootstrap" else {}
+        self.options = options
+        self.population = df["year"].astype(int).value_counts().sort_index()
+        # Articles of each year in random order
+        rng = random.Random(seed)
+        self.remaining = {}
+        for year, group in df.groupby(df["year"].astype(int)):
+            keys = list(group.index)
+            rng.shuffle(keys)
+            self.remaining[year] = deque(keys)
+        self.results = {}
+        self.table = pd.DataFrame()
+
+    def analyze(self, year, count):
+        """Analyze up to `count` further articles of `year`."""
+        for _ in range(min(count, len(self.remaining[year]))):
+            key = self.remaining[year].popleft()
+            self.results[key] = analyze_article(
+                key, self.df.at[key, "url"], self.rules, **self.options
+            )
+
+    def sample(self):
+        """Analyzed articles with their results, as in the results file."""
+        keys = sorted(self.results)
+        return results_frame(
+            self.df.loc[keys],
+            [self.results[key] for key in keys],
+            self.rules.dtypes,
+            columns=self.rules.columns,
+        )
+
+    def update(self):
+        self.table = estimate_table(
+            self.sample(),
+            self.population,
+            method=self.method,
+            confidence=self.confidence,
+            **self.kwargs,
+        )
+        return widest_intervals(self.table, by_category=self.by_category)
+
+    def run(self, target_width, budget=None, initial=10, batch=5):
+        """Analyze articles until all intervals are narrower than `target_width`.
+
+        Returns the estimate table (see `estimate_table`).
+        """
+        budget = len(self.df) if budget is None else min(budget, len(self.df))
+        for year in self.remaining:
+            self.analyze(year, min(initial, budget - len(self.results)))
+        while True:
+            widths = self.update()
+            # Years which can still be narrowed, widest first
+            open_years = [
+                year
+                for year in widths.sort_values(ascending=False).index
+                if widths[year] > target_width and self.remaining[year]
+            ]
+            logging.info(
+                "%d of %d articles analyzed, widest interval %.3f (%d)",
+                len(self.results),
+                len(self.df),
+                widths.max(),
+                widths.idxmax(),
+            )
+            left = budget - len(self.results)
+            if not open_years or left <= 0:
+                break
+            self.analyze(open_years[0], min(batch, left))
+        return self.table
+
+
+def main(args):
+    import pandas as pd
+
+    from article_archive import open_cache
+
+    input_csv = Path(args.input)
+    df = normalize_export(pd.read_csv(input_csv, dtype=str))
+    rules = Rules.from_csv(args.categories, args.open_access, args.data_availability)
+    if args.years:
+        df = df[df["year"].astype(int).between(min(args.years), max(args.years))]
+    stats = FetchStats()
+    pages = open_cache(f"soups_{input_csv.stem}" if args.cache is None else args.cache)
+    estimate = SequentialEstimate(
+        df,
+        rules,
+        seed=args.seed,
+        method=args.method,
+        confidence=args.confidence,
+        by_category=args.by_category,
+        pages=pages,
+        base_url=args.base_url,
+        stats=stats,
+    )
+    table = estimate.run(
+        args.target_width,
+        budget=args.budget,
+        initial=args.initial,
+        batch=args.batch,
+    )
+    pages.close()
+    if stats.requests > 0:
+        logging.info(stats.summary())
+
+    widths = widest_intervals(table, by_category=args.by_category)
+    logging.info(
+        "Analyzed %d of %d articles (%.0f%%); %d of %d years with an interval "
+        "wider than %.2f",
+        len(estimate.results),
+        len(df),
+        100 * len(estimate.results) / max(len(df), 1),
+        (widths > args.target_width).sum(),
+        len(widths),
+        args.target_width,
+    )
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    table.round(4).to_csv(args.output, index=False)
+    logging.info("Wrote estimates to %s", args.output)
+    if args.sample_output:
+        estimate.sample().to_csv(args.sample_output, index=False)
+        logging.info("Wrote the analyzed articles to %s", args.sample_output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Estimate availability trends from a sequential sample"
+    )
+    parser.add_argument("--input", "-i", required=True, help="input CSV file")
+    parser.add_argument(
+        "--output", "-o", required=True, help="output CSV file of the estimates"
+    )
+    parser.add_argument("--categories", "-c", required=True, help="categories CSV file")
+    parser.add_argument(
+        "--open_access", "-oa", required=True, help="open access availability CSV file"
+    )
+    parser.add_argument(
+        "--data_availability", "-da", required=True, help="data availability CSV file"
+    )
+    parser.add_argument(
+        "--target-width",
+        type=float,
+        default=0.2,
+        help="Stop once all intervals are narrower than this",
+    )
+    parser.add_argument(
+        "--by-category",
+        action="store_true",
+        help="Apply the target width to each category of a year, not only to "
+        "the year as a whole",
+    )
+    parser.add_argument(
+        "--budget", type=int, help="Maximum number of articles analyzed"
+    )
+    parser.add_argument(
+        "--initial", type=int, default=10, help="Articles analyzed per year first"
+    )
+    parser.add_argument(
+        "--batch",
+        type=int,
+        default=5,
+        help="Articles analyzed at once from the year with the widest interval",
+    )
+    parser.add_argument(
+        "--years", type=int, nargs="+", help="Only estimate this range of years"
+    )
+    parser.add_argument("--method", type=str, default="wilson", choices=methods)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--sample-output", help="Results CSV file of the analyzed articles"
+    )
+    parser.add_argument(
+        "--cache",
+        help="Page cache: a folder (default: soups_<input stem>) or an archive "
+        "ending in .pack, see article_archive.py",
+    )
+    parser.add_argument(
+        "--base-url",
+        help="Fetch from this scheme and host instead of the URLs' ones, e.g. "
+        "http://127.0.0.1:8000 for springer_stub.py",
+    )
+    main(parser.parse_args())
@@ -0,0 +1,252 @@
+"""Health of the article links of a results file.
+
+All URLs (or a sample of them) are checked concurrently with a bounded pool of
+threads sharing keep-alive connections. Each URL is requested with HEAD, and
+with GET if the server does not answer HEAD (e.g. 403, 405 or 501). The
+outcome is stored with a timestamp in a cache file, such that later checks only
+request the URLs which are new or older than --max-age, and such that the
+robustness check can skip dead or redirected links without any request (see
+robustness_check.py --link-health).
+
+Each URL is classified as
+
+    ok          answered 200 at the same URL
+    redirected  answered 200 after a redirect to another URL
+    transient   answered 429 (too many requests) or a server error (5xx), or
+                timed out; checked again by the next run
+    dead        any other status, or no answer
+"""
+
+import argparse
+import csv
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from analysis import HEADERS, rebase_url
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# NOTE: pandas and requests are imported where needed.
+
+cache_columns = ["url", "health", "status", "final_url", "checked_at", "error"]
+
+# Statuses of servers which do not support HEAD, answered by a GET instead
+head_unsupported = {403, 405, 501}
+
+healths = ["ok", "redirected", "transient", "dead"]
+
+
+def is_transient(status):
+    """Whether `status` is a temporary failure: rate limited or server error."""
+    return status == 429 or 500 <= status < 600
+
+
+def classify(url, status, final_url, timed_out=False):
+    if status is None:
+        return "transient" if timed_out else "dead"
+    if is_transient(status):
+        return "transient"
+    if status != 200:
+        return "dead"
+    if final_url and urlsplit(final_url)[1:3] != urlsplit(url)[1:3]:
+        return "redirected"
+    return "ok"
+
+
+def read_cache(path):
+    """Cached checks by URL; empty if there is no cache yet."""
+    if not Path(path).exists():
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["url"]: row for row in csv.DictReader(f)}
+
+
+def write_cache(path, checks):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".part")
+    with open(partial, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=cache_columns, lineterminator="\n")
+        writer.writeheader()
+        for url in sorted(checks):
+            writer.writerow(checks[url])
+    partial.replace(path)
+
+
+def is_fresh(check, max_age):
+    """Whether a cached check is still valid; transient failures never are."""
+    if check["health"] == "transient":
+        return False
+    if max_age is None:
+        return True
+    checked_at = datetime.fromisoformat(check["checked_at"])
+    return datetime.now(timezone.utc) - checked_at < max_age
+
+
+class Checker:
+    """Checks URLs from a pool of threads, one requests session per thread.
+
+    `base_url` replaces scheme and host of the requested URLs (e.g. a local
+    springer_stub.py); the results keep the original URL.
+    """
+
+    def __init__(self, timeout=10.0, base_url=None):
+        self.timeout = timeout
+        self.base_url = base_url
+        self.local = threading.local()
+
+    def session(self):
+        import requests
+
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+            self.local.session.headers.update(HEADERS)
+        return self.local.session
+
+    def request(self, url):
+        """Status and final URL of `url`, by HEAD or else GET."""
+        session = self.session()
+        response = session.head(url, allow_redirects=True, timeout=self.timeout)
+        if response.status_code in head_unsupported:
+            # Only the status is needed, the body is not downloaded
+            with session.get(
+                url, allow_redirects=True, timeout=self.timeout, stream=True
+            ) as response:
+                pass
+        return response.status_code, response.url
+
+    def check(self, url):
+        import requests
+
+        requested = url if self.base_url is None else rebase_url(url, self.base_url)
+        status, final_url, error, timed_out = None, "", "", False
+        try:
+            status, final_url = self.request(requested)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            timed_out = isinstance(e, requests.Timeout)
+        if self.base_url is not None and final_url:
+            # Compare with the rebased URL, report the redirect in the original
+            if urlsplit(final_url).path == urlsplit(requested).path:
+                final_url = url
+        return {
+            "url": url,
+            "health": classify(url, status, final_url or url, timed_out),
+            "status": "" if status is None else status,
+            "final_url": final_url,
+            "checked_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "error": error,
+        }
+
+
+def check_urls(urls, cache_path, workers=16, timeout=10.0, max_age=None, base_url=None):
+    """Check the `urls` which are not fresh in the cache; returns all their checks.
+
+    `max_age` is a `timedelta`; without it, cached checks never expire, except
+    for transient failures, which are always checked again.
+    """
+    checks = read_cache(cache_path)
+    pending = [
+        url
+        for url in dict.fromkeys(urls)
+        if url not in checks or not is_fresh(checks[url], max_age)
+    ]
+    logging.info(
+        "Checking %d of %d URLs (%d cached)",
+        len(pending),
+        len(set(urls)),
+        len(set(urls)) - len(pending),
+    )
+    checker = Checker(timeout=timeout, base_url=base_url)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        for count, check in enumerate(executor.map(checker.check, pending), 1):
+            checks[check["url"]] = check
+            if count % 500 == 0:
+                logging.info("Checked %d/%d URLs", count, len(pending))
+                write_cache(cache_path, checks)
+    elapsed = time.perf_counter() - start
+    write_cache(cache_path, checks)
+    if pending:
+        logging.info(
+            "Checked %d URLs in %.1f s (%.1f URLs/s)",
+            len(pending),
+            elapsed,
+            len(pending) / max(elapsed, 1e-9),
+        )
+    return {url: checks[url] for url in urls}
+
+
+def main(args):
+    import pandas as pd
+
+    df = pd.read_csv(args.input, dtype=str)
+    if args.sample is not None and args.sample < len(df):
+        df = df.sample(args.sample, random_state=args.seed)
+    checks = check_urls(
+        list(df["url"]),
+        args.cache,
+        workers=args.workers,
+        timeout=args.timeout,
+        max_age=None if args.max_age is None else timedelta(hours=args.max_age),
+        base_url=args.base_url,
+    )
+    counts = Counter(check["health"] for check in checks.values())
+    logging.info(
+        "%s of %d URLs",
+        ", ".join(f"{counts[health]} {health}" for health in healths),
+        len(checks),
+    )
+    for check in checks.values():
+        if check["health"] != "ok":
+            logging.debug(
+                "%s: %s %s%s",
+                check["health"],
+                check["url"],
+                check["status"] or check["error"],
+                f" -> {check['final_url']}" if check["health"] == "redirected" else "",
+            )
+    logging.info("Link health cached in %s", args.cache)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the article links of a results file concurrently"
+    )
+    parser.add_argument(
+        "--input", "-i", type=str, required=True, help="analysis results CSV file"
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default="link_health.csv",
+        help="CSV file with the timestamped checks, updated in place",
+    )
+    parser.add_argument(
+        "--sample", type=int, help="Only check a random sample of this many articles"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers", type=int, default=16, help="Number of concurrent requests"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=10.0, help="Timeout per request in seconds"
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        help="Check cached URLs again if their check is older than this many "
+        "hours (default: never)",
+    )
+    parser.add_argument(
+        "--base-url",
+        help="Request this scheme and host instead of the URLs' ones, e.g. "
+        "http://127.0.0.1:8000 for springer_stub.py",
+    )
+    main(parser.parse_args())
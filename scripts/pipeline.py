@@ -0,0 +1,231 @@
+"""Streaming pipeline of stages connected by bounded queues.
+
+Each stage runs its function in a number of worker threads, which take items
+from the stage's input queue and put the results into the next stage's input
+queue. The caller consumes the results of the last stage in input order. The
+queues are bounded and the number of items in flight is limited, such that a
+slow stage holds back the ones before it (backpressure) and memory stays flat.
+
+For each stage, the time its workers spend working, waiting for input
+(starved) and waiting for room in the next queue (blocked) is recorded: the
+bottleneck is the stage which is busy while the stages before it are blocked
+and the ones after it are starved.
+"""
+
+import queue
+import threading
+import time
+
+# Marks the end of the items in a queue
+_done = object()
+
+# Timeout of the waits on queues, to notice a stopped pipeline
+_poll_seconds = 0.1
+
+
+class Failure:
+    """Exception raised for an item, passed on to the consumer."""
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class Stage:
+    """Step of a pipeline: `func` applied to each item by `workers` threads."""
+
+    def __init__(self, name, func, workers=1):
+        if workers < 1:
+            raise ValueError(f"Stage {name} needs at least one worker")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.queue_samples = 0
+        self.queue_total = 0
+
+    def record(self, busy=0.0, starved=0.0, blocked=0.0, queued=None):
+        with self.lock:
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+            if queued is not None:
+                self.items += 1
+                self.queue_samples += 1
+                self.queue_total += queued
+
+
+class Pipeline:
+    """Stages run on a stream of items, see `run`."""
+
+    def __init__(self, stages, queue_size=16):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.start = None
+        self.end = None
+
+    def run(self, items):
+        """Results of the last stage for `items`, in the order of `items`.
+
+        An exception raised by a stage for an item is raised here, once all
+        items before it are consumed; the pipeline is then stopped.
+        """
+        stop = threading.Event()
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        # Items between feeder and consumer, including the ones waiting to be
+        # consumed in order
+        window = threading.BoundedSemaphore(self.queue_size * (len(self.stages) + 1))
+        threads = [
+            threading.Thread(target=self._feed, args=(items, queues[0], window, stop))
+        ]
+        for number, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            next_workers = (
+                self.stages[number + 1].workers if number + 1 < len(self.stages) else 1
+            )
+            for _ in range(stage.workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(
+                            stage,
+                            queues[number],
+                            queues[number + 1],
+                            remaining,
+                            next_workers,
+                            stop,
+                        ),
+                    )
+                )
+        self.start, self.end = time.perf_counter(), None
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        pending = {}
+        position = 0
+        finished = False
+        try:
+            while not finished or pending:
+                if position in pending:
+                    result = pending.pop(position)
+                    position += 1
+                    window.release()
+                    if isinstance(result, Failure):
+                        raise result.exception
+                    yield result
+                    continue
+                if finished:
+                    raise RuntimeError(f"Item {position} was lost in the pipeline")
+                item = queues[-1].get()
+                if item is _done:
+                    finished = True
+                else:
+                    pending[item[0]] = item[1]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            self.end = time.perf_counter()
+
+    def _feed(self, items, output, window, stop):
+        items = iter(items)
+        position = 0
+        while True:
+            while not window.acquire(timeout=_poll_seconds):
+                if stop.is_set():
+                    return
+            try:
+                item = next(items)
+            except StopIteration:
+                window.release()
+                break
+            except BaseException as e:
+                # A failing input is passed on as the last item
+                _put(output, (position, Failure(e)), stop)
+                break
+            if not _put(output, (position, item), stop):
+                return
+            position += 1
+        for _ in range(self.stages[0].workers):
+            _put(output, _done, stop)
+
+    def _work(self, stage, source, target, remaining, next_workers, stop):
+        while True:
+            waiting = time.perf_counter()
+            item = _get(source, stop)
+            if item is None:
+                return
+            started = time.perf_counter()
+            if item is _done:
+                with stage.lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    for _ in range(next_workers):
+                        _put(target, _done, stop)
+                return
+            stage.record(starved=started - waiting, queued=source.qsize())
+            position, value = item
+            if not isinstance(value, Failure):
+                try:
+                    value = stage.func(value)
+                except BaseException as e:
+                    value = Failure(e)
+            finished = time.perf_counter()
+            if not _put(target, (position, value), stop):
+                return
+            stage.record(
+                busy=finished - started, blocked=time.perf_counter() - finished
+            )
+
+    def occupancy(self):
+        """Share of the worker time busy, starved and blocked per stage."""
+        if self.start is None:
+            return {}
+        elapsed = (self.end or time.perf_counter()) - self.start
+        shares = {}
+        for stage in self.stages:
+            total = max(stage.workers * elapsed, 1e-9)
+            shares[stage.name] = {
+                "workers": stage.workers,
+                "items": stage.items,
+                "busy": stage.busy / total,
+                "starved": stage.starved / total,
+                "blocked": stage.blocked / total,
+                "queue": stage.queue_total / max(stage.queue_samples, 1),
+            }
+        return shares
+
+    def summary(self):
+        return " | ".join(
+            f"{name} x{share['workers']}: {100 * share['busy']:.0f}% busy, "
+            f"{100 * share['starved']:.0f}% starved, "
+            f"{100 * share['blocked']:.0f}% blocked, "
+            f"queue {share['queue']:.1f}/{self.queue_size}"
+            for name, share in self.occupancy().items()
+        )
+
+
+def _put(target, item, stop):
+    """Put `item` into `target` unless the pipeline stops; True if it was put."""
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=_poll_seconds)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(source, stop):
+    """Next item of `source`, or None if the pipeline stops."""
+    while not stop.is_set():
+        try:
+            return source.get(timeout=_poll_seconds)
+        except queue.Empty:
+            continue
+    return None
@@ -1,100 +1,15 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
 from pathlib import Path
 
 import argparse
+import json
+
+# NOTE: pandas, numpy and matplotlib are imported where needed, such that the
+# command line interface starts quickly.
 
 dpi = 1000
-plt.rcParams.update({"font.size": 20})
-
-parser = argparse.ArgumentParser(description="Visualize article analysis results")
-parser.add_argument(
-    "--input",
-    "-i",
-    type=str,
-    required=True,
-    help="Path to the input CSV file",
-)
-parser.add_argument(
-    "--categories",
-    "-c",
-    type=str,
-    nargs="+",
-    default=["All"],
-    help="List of categories to include in the analysis",
-)
-parser.add_argument(
-    "--journal",
-    type=str,
-    required=True,
-    help="Journal name to print in plots",
-)
-parser.add_argument(
-    "--years",
-    "-y",
-    type=int,
-    nargs="+",
-    default=None,
-)
-parser.add_argument(
-    "--horizontal-shift",
-    type=float,
-    default=0.03,
-    help="Horizontal shift for title of grouped pie charts",
-)
-parser.add_argument(
-    "--pie-size",
-    "-p",
-    type=float,
-    default=1,
-)
-args = parser.parse_args()
-categories = args.categories
-
-# Load the data
-input_path = Path(args.input)
-df = pd.read_csv(input_path)
-
-# Prepare output folder and stem for filenames
-output_folder = input_path.parent
-input_stem = input_path.stem
-
-# Restrict to given categories
-if categories != ["All"]:
-    df = df[df["category"].isin(categories)]
-
-# Restrict to given years
-if args.years is not None:
-    year_span = [i for i in range(min(args.years), max(args.years) + 1)]
-    df = df[df["year"].isin(year_span)]
-
-# Display the categories
-df_by_category = df.groupby("category", observed=False)
-category_counts = df_by_category.size()
-category_fig = plt.figure("Category distribution")
-plt.pie(category_counts, labels=category_counts.index, autopct="%1.1f%%")
-plt.title("Category Distribution")
-category_fig.savefig(output_folder / f"{input_stem}_category_distribution.png", dpi=dpi)
-plt.show()
-
-# Display the subcategories
-df_by_subcategory = df.groupby("subcategory", observed=False)
-subcategory_counts = df_by_subcategory.size()
-subcategory_fig = plt.figure("Subcategory distribution")
-plt.pie(subcategory_counts, labels=subcategory_counts.index, autopct="%1.1f%%")
-plt.title("Subcategory Distribution")
-subcategory_fig.savefig(
-    output_folder / f"{input_stem}_subcategory_distribution.png", dpi=dpi
-)
-plt.show()
-
-# --- Subcategory count per year: line plot ---
-subcategory_palette = plt.get_cmap("tab20")
-subcategory_colors = {
-    subcat: subcategory_palette(i % 20)
-    for i, subcat in enumerate(subcategory_counts.index)
-}
+style = {"font.size": 20}
+
+# Fixed colors and orders for consistent legends
 paper_colors = {
     "Not open": "tab:red",
     "Open access": "tab:green",
@@ -104,331 +19,330 @@ data_colors = {
     "On request": "#FFC300",  # bright dark yellow
     "Open access": "tab:green",
 }
+paper_order = ["Open access", "Not open"]
+data_order = ["Open access", "On request", "Not open"]
 
-subcategory_year_counts = (
-    df.groupby(["year", "subcategory"], observed=False).size().unstack(fill_value=0)
-)
-fig_subcat_line, ax = plt.subplots(figsize=(8, 5))
-for i, subcat in enumerate(subcategory_counts.index):
-    ax.plot(
-        subcategory_year_counts.index,
-        subcategory_year_counts[subcat],
-        label=subcat,
-        color=subcategory_colors[subcat],
-        marker="o",
-    )
-ax.set_xlabel("Year")
-ax.set_ylabel("Number of submissions")
-ax.set_title("Number of Submissions per Subcategory per Year")
-ax.legend(title="Subcategory", bbox_to_anchor=(1.05, 1), loc="upper left")
-fig_subcat_line.tight_layout()
-fig_subcat_line.savefig(
-    output_folder / f"{input_stem}_subcategory_per_year.png", dpi=dpi
-)
-plt.show()
-
-# --- Category count per year: line plot ---
-category_year_counts = (
-    df.groupby(["year", "category"], observed=False).size().unstack(fill_value=0)
-)
-fig_cat_line, ax = plt.subplots(figsize=(8, 5))
-for i, cat in enumerate(category_counts.index):
-    ax.plot(
-        category_year_counts.index,
-        category_year_counts[cat],
-        label=cat,
-        marker="o",
-    )
-ax.set_xlabel("Year")
-ax.set_ylabel("Number of submissions")
-ax.set_title("Number of Submissions per Category per Year")
-ax.legend(title="Category", bbox_to_anchor=(1.05, 1), loc="upper left")
-fig_cat_line.tight_layout()
-fig_cat_line.savefig(output_folder / f"{input_stem}_category_per_year.png", dpi=dpi)
-plt.show()
-
-# --- Grouped Pie Charts by 5-year Periods: Paper and Data Availability ---
-# Create 5-year bins
+# Map scores 0 to "Not open", 0.5 to "On request", 1 to "Open access"
+paper_availability_map = {0: "Not open", 1: "Open access"}
+data_availability_map = {0: "Not open", 0.5: "On request", 1: "Open access"}
+
+# Admissible starts of the 5-year periods (aligned with 2021-2025)
 admissible_starts = set([2021 - 5 * i for i in range(0, 20)])
-if "year" in df.columns:
-    bin_size = 5
-    min_year = int(df["year"].min())
+
+
+def pyplot():
+    """Import matplotlib.pyplot and apply the common style."""
+    import matplotlib.pyplot as plt
+
+    plt.rcParams.update(style)
+    return plt
+
+
+def load_results(path, scheme=None):
+    """Read a results CSV as written by analysis.py.
+
+    `scheme` selects the categories of results of several schemes.
+    """
+    import pandas as pd
+
+    from analysis import scheme_results
+
+    return scheme_results(pd.read_csv(path), scheme)
+
+
+def resolve_categories(df, categories):
+    """Expand ["All"] into the categories present in the data."""
+    import pandas as pd
+
+    if categories is None or list(categories) == ["All"]:
+        return [cat for cat in df["category"].unique() if pd.notna(cat)]
+    return list(categories)
+
+
+def period_bins(min_year, max_year, bin_size=5):
+    """Bins aligned with the admissible starts and their labels.
+
+    The first label starts at `min_year`. Use with `pd.cut(..., right=False)`.
+    """
     start = max([s for s in admissible_starts if s <= min_year])
-    end = int(df["year"].max()) + 1
+    end = max_year + 1
     bins = list(range(start, end + 1, bin_size))
     labels = [f"{bins[i]}-{bins[i + 1] - 1}" for i in range(len(bins) - 1)]
     labels[0] = f"{max(bins[0], min_year)}-{bins[1] - 1}"
+    return bins, labels
+
+
+def prepare(df, categories=None, years=None):
+    """Restrict to categories and years and add period and availability columns.
+
+    Returns a copy, the input data frame is not modified.
+    """
+    import pandas as pd
+
+    df = df.copy()
+
+    # Restrict to given categories
+    if categories is not None and list(categories) != ["All"]:
+        df = df[df["category"].isin(categories)]
+
+    # Restrict to given years
+    if years is not None:
+        year_span = [i for i in range(min(years), max(years) + 1)]
+        df = df[df["year"].isin(year_span)]
+
+    # Create 5-year bins
+    bins, labels = period_bins(int(df["year"].min()), int(df["year"].max()))
     df["Period"] = pd.cut(df["year"], bins=bins, labels=labels, right=False)
 
-    # Standardize paper/data availability columns if present
-    paper_col = "article_availability"
-    data_col = "data_availability"
-
-    # Map scores 0 to "Not open", 0.5 to "On request", 1 to "Open access"
-    paper_availability_map = {0: "Not open", 1: "Open access"}
-    data_availability_map = {0: "Not open", 0.5: "On request", 1: "Open access"}
-    df[paper_col] = df[paper_col + "_score"].map(paper_availability_map)
-    df[data_col] = df[data_col + "_score"].map(data_availability_map)
-
-    # Paper and data availability pie charts by period, per category
-    if paper_col and data_col and "category" in df.columns:
-        for cat in categories:
-            df_cat = df[df["category"] == cat]
-            if df_cat.empty:
-                continue
-            # Paper availability
-            paper_order = ["Open access", "Not open"]
-            trend_paper = (
-                df_cat.groupby(["Period", paper_col], observed=False)
-                .size()
-                .unstack(fill_value=0)
-            )
-            trend_paper = trend_paper.reindex(columns=paper_order, fill_value=0)
-            fig_paper, axes_paper = plt.subplots(
-                1, len(trend_paper.index), figsize=(4 * len(trend_paper.index), 4)
-            )
-            if len(trend_paper.index) == 1:
-                axes_paper = [axes_paper]
-            for i, period in enumerate(trend_paper.index):
-                values = trend_paper.loc[period]
-                # Allow to control the radius using args.pie_size
-                wedges, texts, autotexts = axes_paper[i].pie(
-                    values,
-                    labels=None,
-                    autopct=lambda pct: f"{pct:.1f}%" if pct > 0 else "",
-                    startangle=90,
-                    counterclock=False,
-                    textprops={"color": "white", "fontsize": 14},
-                    wedgeprops={"edgecolor": "white", "linewidth": 1},
-                    colors=[paper_colors[c] for c in values.index],
-                    radius=args.pie_size,
-                )
-                for autotext in autotexts:
-                    autotext.set_color("white")
-                    autotext.set_fontweight("bold")
-                axes_paper[i].text(
-                    0.5,
-                    -0.05,
-                    f"{period}",
-                    ha="center",
-                    va="center",
-                    transform=axes_paper[i].transAxes,
-                    fontsize=14,
-                )
-                total = int(values.sum())
-                axes_paper[i].text(
-                    0.5,
-                    -0.15,
-                    f"#total: {total}",
-                    ha="center",
-                    va="center",
-                    transform=axes_paper[i].transAxes,
-                    fontsize=12,
-                )
-            axes_paper[-1].legend(
-                wedges,
-                values.index,
-                title="Paper Availability",
-                loc="center left",
-                bbox_to_anchor=(1, 0.5),
-            )
-            fig_paper.text(
-                args.horizontal_shift,
-                0.5,
-                f"Paper Availability\n{args.journal} | {cat}",
-                va="center",
-                ha="center",
-                rotation=90,
-                fontsize=16,
-                transform=fig_paper.transFigure,
-            )
-            plt.tight_layout()
-            fig_paper.savefig(
-                output_folder / f"{input_stem}_paper_availability_pies_{cat}.png",
-                dpi=dpi,
-            )
-            plt.show()
-            # Data availability
-            data_order = ["Open access", "On request", "Not open"]
-            trend_data = (
-                df_cat.groupby(["Period", data_col], observed=False)
-                .size()
-                .unstack(fill_value=0)
-            )
-            trend_data = trend_data.reindex(columns=data_order, fill_value=0)
-            fig_data, axes_data = plt.subplots(
-                1, len(trend_data.index), figsize=(4 * len(trend_data.index), 4)
-            )
-            if len(trend_data.index) == 1:
-                axes_data = [axes_data]
-            for i, period in enumerate(trend_data.index):
-                values = trend_data.loc[period]
-                wedges, texts, autotexts = axes_data[i].pie(
-                    values,
-                    labels=None,
-                    # autopct=lambda pct: "", # NOTE: Use for printing custom figures.
-                    autopct=lambda pct: f"{pct:.1f}%" if pct > 0 else "",
-                    startangle=90,
-                    counterclock=False,
-                    textprops={"color": "white", "fontsize": 14},
-                    wedgeprops={"edgecolor": "white", "linewidth": 1},
-                    colors=[data_colors[c] for c in values.index],
-                    radius=args.pie_size,
-                )
-                for autotext in autotexts:
-                    autotext.set_color("white")
-                    autotext.set_fontweight("bold")
-                axes_data[i].text(
-                    0.5,
-                    -0.05,
-                    f"{period}",
-                    ha="center",
-                    va="center",
-                    transform=axes_data[i].transAxes,
-                    fontsize=14,
-                )
-                total = int(values.sum())
-                axes_data[i].text(
-                    0.5,
-                    -0.15,
-                    f"#total: {total}",
-                    ha="center",
-                    va="center",
-                    transform=axes_data[i].transAxes,
-                    fontsize=12,
-                )
-            axes_data[-1].legend(
-                wedges,
-                values.index,
-                title="Data Availability",
-                loc="center left",
-                bbox_to_anchor=(1, 0.5),
-            )
-            fig_data.text(
-                args.horizontal_shift,
-                0.5,
-                f"Data Availability\n{args.journal} | {cat}",
-                va="center",
-                ha="center",
-                rotation=90,
-                fontsize=16,
-                transform=fig_data.transFigure,
-            )
-            plt.tight_layout()
-            fig_data.savefig(
-                output_folder / f"{input_stem}_data_availability_pies_{cat}.png",
-                dpi=dpi,
-            )
-            plt.show()
+    # Standardize paper/data availability columns
+    df["article_availability"] = df["article_availability_score"].map(
+        paper_availability_map
+    )
+    df["data_availability"] = df["data_availability_score"].map(data_availability_map)
+    return df
+
+
+def distribution(df, column, title):
+    """Pie chart of the number of articles per entry of `column`."""
+    plt = pyplot()
+
+    counts = df.groupby(column, observed=False).size()
+    fig = plt.figure()
+    plt.pie(counts, labels=counts.index, autopct="%1.1f%%")
+    plt.title(title)
+    return fig
 
-    # --- Paper availability over time (all categories lumped, relative) ---
-    if paper_col:
-        trend_paper_year = (
-            df.groupby(["year", paper_col], observed=False).size().unstack(fill_value=0)
+
+def counts_per_year(df, column, title, legend_title, colors=None):
+    """Line plot of the number of articles per entry of `column` and year."""
+    plt = pyplot()
+
+    counts = df.groupby(column, observed=False).size()
+    year_counts = (
+        df.groupby(["year", column], observed=False).size().unstack(fill_value=0)
+    )
+    fig, ax = plt.subplots(figsize=(8, 5))
+    for entry in counts.index:
+        ax.plot(
+            year_counts.index,
+            year_counts[entry],
+            label=entry,
+            color=None if colors is None else colors[entry],
+            marker="o",
         )
-        paper_order = ["Open access", "Not open"]
-        trend_paper_year = trend_paper_year.reindex(columns=paper_order, fill_value=0)
-        # Compute relative values (percent)
-        totals = trend_paper_year.sum(axis=1)
-        trend_paper_year_rel = trend_paper_year.divide(totals, axis=0).multiply(100)
-        fig, ax = plt.subplots(figsize=(8, 5))
-        bottom = np.zeros(len(trend_paper_year_rel))
-        for i, label in enumerate(paper_order):
-            ax.bar(
-                trend_paper_year_rel.index,
-                trend_paper_year_rel[label],
-                label=label,
-                color=paper_colors[label],
-                bottom=bottom,
-            )
-            bottom += trend_paper_year_rel[label].values
-        # Add totals on top of bars
-        for i, total in enumerate(totals):
-            ax.text(
-                trend_paper_year_rel.index[i],
-                98,
-                f"{int(total)}",
-                ha="center",
-                va="top",
-                fontsize=10,
-                color="white",
-                rotation=90,
-            )
-        ax.set_xlabel("Year")
-        ax.set_ylabel("Percent of articles [%]")
-        ax.set_title(f"Paper Availability | {args.journal}")
-        ax.legend(
-            title="Paper Availability", bbox_to_anchor=(1.05, 1), loc="upper left"
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Number of submissions")
+    ax.set_title(title)
+    ax.legend(title=legend_title, bbox_to_anchor=(1.05, 1), loc="upper left")
+    fig.tight_layout()
+    return fig
+
+
+def pie_grid(
+    trend,
+    colors,
+    title,
+    label,
+    horizontal_shift=0.03,
+    pie_size=1,
+    pct_fontsize=14,
+    period_fontsize=14,
+    total_fontsize=12,
+    period_offset=-0.05,
+    total_offset=-0.15,
+):
+    """One pie per row (period) of `trend`, with a shared legend.
+
+    `trend` holds counts with periods as index and availability classes as
+    columns, `label` is printed vertically on the left of the figure.
+    """
+    plt = pyplot()
+
+    fig, axes = plt.subplots(1, len(trend.index), figsize=(4 * len(trend.index), 4))
+    if len(trend.index) == 1:
+        axes = [axes]
+    for i, period in enumerate(trend.index):
+        values = trend.loc[period]
+        wedges, texts, autotexts = axes[i].pie(
+            values,
+            labels=None,
+            # autopct=lambda pct: "", # NOTE: Use for printing custom figures.
+            autopct=lambda pct: f"{pct:.1f}%" if pct > 0 else "",
+            startangle=90,
+            counterclock=False,
+            textprops={"color": "white", "fontsize": pct_fontsize},
+            wedgeprops={"edgecolor": "white", "linewidth": 1},
+            colors=[colors[c] for c in values.index],
+            radius=pie_size,
         )
-        # Set x-ticks: first, last, and center year
-        years = trend_paper_year_rel.index.values
-        if len(years) > 2:
-            center_idx = len(years) // 2
-            xticks = [years[0], years[center_idx], years[-1]]
-        else:
-            xticks = years
-        ax.set_xticks(xticks)
-        ax.set_xticklabels([str(int(y)) for y in xticks])
-        fig.tight_layout()
-        fig.savefig(
-            output_folder / f"{input_stem}_paper_availability_per_year.png", dpi=dpi
+        for autotext in autotexts:
+            autotext.set_color("white")
+            autotext.set_fontweight("bold")
+        axes[i].text(
+            0.5,
+            period_offset,
+            f"{period}",
+            ha="center",
+            va="center",
+            transform=axes[i].transAxes,
+            fontsize=period_fontsize,
         )
-        plt.show()
+        total = int(values.sum())
+        axes[i].text(
+            0.5,
+            total_offset,
+            f"#total: {total}",
+            ha="center",
+            va="center",
+            transform=axes[i].transAxes,
+            fontsize=total_fontsize,
+        )
+    axes[-1].legend(
+        wedges,
+        values.index,
+        title=title,
+        loc="center left",
+        bbox_to_anchor=(1, 0.5),
+    )
+    fig.text(
+        horizontal_shift,
+        0.5,
+        label,
+        va="center",
+        ha="center",
+        rotation=90,
+        fontsize=16,
+        transform=fig.transFigure,
+    )
+    fig.tight_layout()
+    return fig
+
+
+def period_trend(df, column, order):
+    """Counts per period and availability class, with all classes present."""
+    trend = df.groupby(["Period", column], observed=False).size().unstack(fill_value=0)
+    return trend.reindex(columns=order, fill_value=0)
+
+
+def availability_pies(df, cat, journal, horizontal_shift=0.03, pie_size=1):
+    """Paper and data availability pie charts by period for one category."""
+    df_cat = df[df["category"] == cat]
+    if df_cat.empty:
+        return None, None
+    fig_paper = pie_grid(
+        period_trend(df_cat, "article_availability", paper_order),
+        paper_colors,
+        "Paper Availability",
+        f"Paper Availability\n{journal} | {cat}",
+        horizontal_shift=horizontal_shift,
+        pie_size=pie_size,
+    )
+    fig_data = pie_grid(
+        period_trend(df_cat, "data_availability", data_order),
+        data_colors,
+        "Data Availability",
+        f"Data Availability\n{journal} | {cat}",
+        horizontal_shift=horizontal_shift,
+        pie_size=pie_size,
+    )
+    return fig_paper, fig_data
+
+
+def open_access_errorbars(ax, x, open_counts, totals, method):
+    """Confidence intervals of the open access share (bottom bar) in percent.
 
-    # --- Data availability over time (all categories lumped, relative) ---
-    if data_col:
-        trend_data_year = (
-            df.groupby(["year", data_col], observed=False).size().unstack(fill_value=0)
+    `method` is one of confidence.methods. Empty cells are skipped.
+    """
+    import numpy as np
+
+    from confidence import proportion_interval
+
+    open_counts, totals = np.asarray(open_counts), np.asarray(totals)
+    lower, upper = proportion_interval(open_counts, totals, method=method)
+    nonempty = totals > 0
+    share = 100 * open_counts[nonempty] / totals[nonempty]
+    ax.errorbar(
+        np.asarray(x)[nonempty],
+        share,
+        yerr=[share - 100 * lower[nonempty], 100 * upper[nonempty] - share],
+        fmt="none",
+        ecolor="black",
+        elinewidth=1,
+        capsize=2,
+    )
+
+
+def availability_per_year(df, column, order, colors, title, journal, intervals=None):
+    """Relative availability per year (all categories lumped) as stacked bars.
+
+    With `intervals` (see confidence.methods), the confidence interval of the
+    open access share is drawn as error bar.
+    """
+    import numpy as np
+
+    plt = pyplot()
+
+    trend_year = (
+        df.groupby(["year", column], observed=False).size().unstack(fill_value=0)
+    )
+    trend_year = trend_year.reindex(columns=order, fill_value=0)
+    # Compute relative values (percent)
+    totals = trend_year.sum(axis=1)
+    trend_year_rel = trend_year.divide(totals, axis=0).multiply(100)
+    fig, ax = plt.subplots(figsize=(8, 5))
+    bottom = np.zeros(len(trend_year_rel))
+    for label in order:
+        ax.bar(
+            trend_year_rel.index,
+            trend_year_rel[label],
+            label=label,
+            color=colors[label],
+            bottom=bottom,
         )
-        data_order = ["Open access", "On request", "Not open"]
-        trend_data_year = trend_data_year.reindex(columns=data_order, fill_value=0)
-        # Compute relative values (percent)
-        totals = trend_data_year.sum(axis=1)
-        trend_data_year_rel = trend_data_year.divide(totals, axis=0).multiply(100)
-        fig, ax = plt.subplots(figsize=(8, 5))
-        bottom = np.zeros(len(trend_data_year_rel))
-        for i, label in enumerate(data_order):
-            ax.bar(
-                trend_data_year_rel.index,
-                trend_data_year_rel[label],
-                label=label,
-                color=data_colors[label],
-                bottom=bottom,
-            )
-            bottom += trend_data_year_rel[label].values
-        # Add totals on top of bars
-        for i, total in enumerate(totals):
-            ax.text(
-                trend_data_year_rel.index[i],
-                98,
-                f"{int(total)}",
-                ha="center",
-                va="top",
-                fontsize=10,
-                color="white",
-                rotation=90,
-            )
-        ax.set_xlabel("Year")
-        ax.set_ylabel("Percent of articles [%]")
-        ax.set_title(f"Data Availability | {args.journal}")
-        ax.legend(title="Data Availability", bbox_to_anchor=(1.05, 1), loc="upper left")
-        # Set x-ticks: first, last, and center year
-        years = trend_data_year_rel.index.values
-        if len(years) > 2:
-            center_idx = len(years) // 2
-            xticks = [years[0], years[center_idx], years[-1]]
-        else:
-            xticks = years
-        ax.set_xticks(xticks)
-        ax.set_xticklabels([str(int(y)) for y in xticks])
-        fig.tight_layout()
-        fig.savefig(
-            output_folder / f"{input_stem}_data_availability_per_year.png", dpi=dpi
+        bottom += trend_year_rel[label].values
+    if intervals is not None:
+        open_access_errorbars(
+            ax, trend_year.index, trend_year["Open access"], totals, intervals
         )
-        plt.show()
+    # Add totals on top of bars
+    for i, total in enumerate(totals):
+        ax.text(
+            trend_year_rel.index[i],
+            98,
+            f"{int(total)}",
+            ha="center",
+            va="top",
+            fontsize=10,
+            color="white",
+            rotation=90,
+        )
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Percent of articles [%]")
+    ax.set_title(f"{title} | {journal}")
+    ax.legend(title=title, bbox_to_anchor=(1.05, 1), loc="upper left")
+    # Set x-ticks: first, last, and center year
+    years = trend_year_rel.index.values
+    if len(years) > 2:
+        center_idx = len(years) // 2
+        xticks = [years[0], years[center_idx], years[-1]]
+    else:
+        xticks = years
+    ax.set_xticks(xticks)
+    ax.set_xticklabels([str(int(y)) for y in xticks])
+    fig.tight_layout()
+    return fig
 
 
-def statistics_over_time(df, column, entries):
+def statistics_over_time(df, column, entries, journal, intervals=None):
+    """Relative paper and data availability per year, one bar per entry.
+
+    With `intervals` (see confidence.methods), the confidence interval of the
+    open access share is drawn as error bar.
+    """
+    import numpy as np
+
+    plt = pyplot()
+
     num_entries = len(entries)
     # Use intuitive colors for open, conditional, closed
     # Open: green, Conditional: orange, Closed: red
@@ -455,6 +369,8 @@ def statistics_over_time(df, column, entries):
         years.append(year_value)
         df_by_column = year_group.groupby(column, observed=False)
         for entry in entries:
+            if entry not in total_counts:
+                continue
             if entry not in df_by_column.groups:
                 # No entries for this category in this year
                 total_counts[entry].append(0)
@@ -484,14 +400,13 @@ def statistics_over_time(df, column, entries):
 
     width = 0.6
     x = np.arange(len(years))
-    num_entries = len(entries)
     displacement = np.linspace(
         -width / num_entries, width / num_entries, num_entries + 1
     )[:-1]
 
     # Only keep relative plots (remove absolute/total count plots)
     # --- Relative Article availability over time (stacked bar, %) ---
-    fig1 = plt.figure("Relative Article availability over time (stacked bar, %)")
+    fig1 = plt.figure()
     for idx, entry in enumerate(entries):
         if entry not in total_counts:
             continue
@@ -519,6 +434,10 @@ def statistics_over_time(df, column, entries):
             label="Not open",
             color=paper_colors["Not open"],
         )
+        if intervals is not None:
+            open_access_errorbars(
+                plt.gca(), x + displacement[idx], article_open, article_total, intervals
+            )
 
     plt.xticks(x, years)
     plt.xlabel("Year")
@@ -527,11 +446,9 @@ def statistics_over_time(df, column, entries):
     plt.title("Article Availability Over Time (Stacked Bar, %)")
     plt.ylim(0, 100)
     plt.tight_layout()
-    fig1.savefig(output_folder / f"{input_stem}_paper_availability.png", dpi=dpi)
-    plt.show()
 
     # --- Relative Data availability over time (stacked bar, %) ---
-    fig2 = plt.figure("Data availability over time (stacked bar, %)")
+    fig2 = plt.figure()
     for idx, entry in enumerate(entries):
         if entry not in total_counts:
             continue
@@ -567,16 +484,224 @@ def statistics_over_time(df, column, entries):
             label="Not open",
             color=data_colors["Not open"],
         )
+        if intervals is not None:
+            open_access_errorbars(
+                plt.gca(), x + displacement[idx], data_open, data_total, intervals
+            )
 
     plt.xticks(x, years)
     plt.xlabel("Year")
     plt.ylabel("Percent of articles [%]")
     plt.legend(loc="upper left", bbox_to_anchor=(1, 1))
-    plt.title(f"Data Availability | {args.journal}")
+    plt.title(f"Data Availability | {journal}")
     plt.ylim(0, 100)
     plt.tight_layout()
-    fig2.savefig(output_folder / f"{input_stem}_data_availability.png", dpi=dpi)
-    plt.show()
+    return fig1, fig2
+
+
+def all_figures(
+    df, journal, categories=None, horizontal_shift=0.03, pie_size=1, intervals=None
+):
+    """Draw all figures for a prepared data frame (see `prepare`).
+
+    With `intervals` (see confidence.methods), the trend figures show the
+    confidence intervals of the open access shares.
+
+    Returns a dict mapping the figure name (used as filename suffix) to the
+    figure.
+    """
+    plt = pyplot()
+
+    categories = resolve_categories(df, categories)
+    figures = {}
+    figures["category_distribution"] = distribution(
+        df, "category", "Category Distribution"
+    )
+    figures["subcategory_distribution"] = distribution(
+        df, "subcategory", "Subcategory Distribution"
+    )
+
+    # --- Subcategory count per year: line plot ---
+    subcategory_palette = plt.get_cmap("tab20")
+    subcategory_counts = df.groupby("subcategory", observed=False).size()
+    subcategory_colors = {
+        subcat: subcategory_palette(i % 20)
+        for i, subcat in enumerate(subcategory_counts.index)
+    }
+    figures["subcategory_per_year"] = counts_per_year(
+        df,
+        "subcategory",
+        "Number of Submissions per Subcategory per Year",
+        "Subcategory",
+        colors=subcategory_colors,
+    )
+
+    # --- Category count per year: line plot ---
+    figures["category_per_year"] = counts_per_year(
+        df, "category", "Number of Submissions per Category per Year", "Category"
+    )
+
+    # --- Grouped Pie Charts by 5-year Periods: Paper and Data Availability ---
+    for cat in categories:
+        fig_paper, fig_data = availability_pies(
+            df, cat, journal, horizontal_shift=horizontal_shift, pie_size=pie_size
+        )
+        if fig_paper is None:
+            continue
+        figures[f"paper_availability_pies_{cat}"] = fig_paper
+        figures[f"data_availability_pies_{cat}"] = fig_data
+
+    # --- Paper and data availability over time (all categories lumped) ---
+    figures["paper_availability_per_year"] = availability_per_year(
+        df,
+        "article_availability",
+        paper_order,
+        paper_colors,
+        "Paper Availability",
+        journal,
+        intervals=intervals,
+    )
+    figures["data_availability_per_year"] = availability_per_year(
+        df,
+        "data_availability",
+        data_order,
+        data_colors,
+        "Data Availability",
+        journal,
+        intervals=intervals,
+    )
+
+    # --- Relative availability over time, per category ---
+    fig1, fig2 = statistics_over_time(
+        df, "category", categories, journal, intervals=intervals
+    )
+    figures["paper_availability"] = fig1
+    figures["data_availability"] = fig2
+    return figures
+
+
+def use_batch_backend():
+    """Select the non-interactive Agg backend to render to files only.
+
+    Call before drawing, such that no GUI event loop is started.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def save_figures(figures, output_folder, stem, close=False):
+    """Save figures as '<stem>_<name>.png' and return the written paths.
+
+    With `close`, each figure is closed after saving to free its memory.
+    """
+    import matplotlib.pyplot as plt
+
+    paths = []
+    for name, fig in figures.items():
+        path = Path(output_folder) / f"{stem}_{name}.png"
+        fig.savefig(path, dpi=dpi)
+        paths.append(path)
+        if close:
+            plt.close(fig)
+    return paths
+
+
+def write_manifest(paths, manifest_path):
+    """Write the list of written files (path and size) as JSON and return it."""
+    manifest = {
+        "outputs": [{"path": str(path), "bytes": path.stat().st_size} for path in paths]
+    }
+    Path(manifest_path).write_text(json.dumps(manifest, indent=2))
+    return manifest
 
 
-statistics_over_time(df, "category", categories)
+def finish(paths, manifest_path, batch):
+    """Display the figures, or in batch mode, write and print the manifest."""
+    if batch:
+        print(json.dumps(write_manifest(paths, manifest_path), indent=2))
+    else:
+        import matplotlib.pyplot as plt
+
+        plt.show()
+
+
+def main(args):
+    if args.batch:
+        use_batch_backend()
+
+    input_path = Path(args.input)
+    df = prepare(load_results(input_path, args.scheme), args.categories, args.years)
+    figures = all_figures(
+        df,
+        args.journal,
+        categories=args.categories,
+        horizontal_shift=args.horizontal_shift,
+        pie_size=args.pie_size,
+        intervals=args.intervals,
+    )
+    # Store next to the input file
+    paths = save_figures(figures, input_path.parent, input_path.stem, args.batch)
+    finish(paths, input_path.parent / f"{input_path.stem}_manifest.json", args.batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Visualize article analysis results")
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=str,
+        required=True,
+        help="Path to the input CSV file",
+    )
+    parser.add_argument(
+        "--categories",
+        "-c",
+        type=str,
+        nargs="+",
+        default=["All"],
+        help="List of categories to include in the analysis",
+    )
+    parser.add_argument(
+        "--scheme",
+        type=str,
+        help="Scheme of the categories, for results of several categories files",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        required=True,
+        help="Journal name to print in plots",
+    )
+    parser.add_argument(
+        "--years",
+        "-y",
+        type=int,
+        nargs="+",
+        default=None,
+    )
+    parser.add_argument(
+        "--horizontal-shift",
+        type=float,
+        default=0.03,
+        help="Horizontal shift for title of grouped pie charts",
+    )
+    parser.add_argument(
+        "--pie-size",
+        "-p",
+        type=float,
+        default=1,
+    )
+    parser.add_argument(
+        "--intervals",
+        type=str,
+        default=None,
+        choices=["wilson", "bootstrap"],
+        help="Draw confidence intervals of the open access shares",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Only render to files (no GUI) and print a manifest of the outputs",
+    )
+    main(parser.parse_args())
@@ -0,0 +1,270 @@
+"""Self-contained HTML report of analysis results.
+
+The results are aggregated into a cube (see cube.py) which is embedded as
+compact JSON into a single static HTML file. Trend and pie views are drawn in
+the browser, such that the report is small and does not need any other file.
+"""
+
+import argparse
+import html
+import json
+import logging
+import re
+from pathlib import Path
+
+from cube import load_cube, to_compact
+from plotting import data_colors, paper_colors
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+template = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+body { font-family: sans-serif; margin: 2em; color: #222; }
+h2 { margin-top: 1.5em; }
+.row { display: flex; flex-wrap: wrap; align-items: flex-start; gap: 1em; }
+.pie { text-align: center; font-size: 13px; }
+.legend span { display: inline-block; margin-right: 1.5em; }
+.legend i { display: inline-block; width: 1em; height: 1em; margin-right: .3em;
+  vertical-align: middle; }
+svg text { font-size: 11px; }
+</style>
+</head>
+<body>
+<h1>__TITLE__</h1>
+<label>Journal <select id="journal"></select></label>
+<label>Category <select id="category"></select></label>
+<div id="views"></div>
+<script>
+const reports = __DATA__;
+const colors = __COLORS__;
+const ns = "http://www.w3.org/2000/svg";
+
+function el(tag, attrs, parent, text) {
+  const e = document.createElementNS(ns, tag);
+  for (const k in attrs) e.setAttribute(k, attrs[k]);
+  if (text !== undefined) e.textContent = text;
+  if (parent) parent.appendChild(e);
+  return e;
+}
+
+// Sum the cube over all dimensions but `keyDim` and `classDim`
+function table(report, category, keyDim, classDim, keyOf) {
+  const dims = report.cube.dimensions, values = report.cube.values;
+  const iKey = dims.indexOf(keyDim), iClass = dims.indexOf(classDim);
+  const iCat = dims.indexOf("category");
+  const out = new Map();
+  for (const cell of report.cube.cells) {
+    if (category !== "All" && values.category[cell[iCat]] !== category) continue;
+    const key = keyOf(values[keyDim][cell[iKey]]);
+    if (!out.has(key)) out.set(key, {});
+    const row = out.get(key), cls = values[classDim][cell[iClass]];
+    row[cls] = (row[cls] || 0) + cell[cell.length - 1];
+  }
+  return new Map([...out.entries()].sort((a, b) => a[0] < b[0] ? -1 : 1));
+}
+
+function legend(parent, classes, palette) {
+  const div = document.createElement("div");
+  div.className = "legend";
+  for (const c of classes) {
+    div.innerHTML += `<span><i style="background:${palette[c]}"></i>${c}</span>`;
+  }
+  parent.appendChild(div);
+}
+
+function stackedBars(parent, rows, classes, palette, title) {
+  const w = 640, h = 260, left = 40, bottom = 30;
+  const svg = el("svg", {width: w, height: h + bottom}, null);
+  const keys = [...rows.keys()], bw = (w - left) / keys.length;
+  el("text", {x: left, y: 12}, svg, title);
+  for (const p of [0, 50, 100]) {
+    const y = 20 + (h - 20) * (1 - p / 100);
+    el("line", {x1: left, x2: w, y1: y, y2: y, stroke: "#ddd"}, svg);
+    el("text", {x: left - 4, y: y + 4, "text-anchor": "end"}, svg, p + "%");
+  }
+  keys.forEach((key, i) => {
+    const row = rows.get(key);
+    const total = classes.reduce((s, c) => s + (row[c] || 0), 0);
+    let y = h;
+    for (const c of classes) {
+      const hh = total ? (h - 20) * (row[c] || 0) / total : 0;
+      y -= hh;
+      const r = el("rect", {x: left + i * bw + 1, y: y, width: bw - 2, height: hh,
+                            fill: palette[c]}, svg);
+      el("title", {}, r, `${key} | ${c}: ${row[c] || 0} of ${total}`);
+    }
+    el("text", {x: left + (i + .5) * bw, y: h + 14, "text-anchor": "middle"}, svg,
+       String(key).slice(-2));
+    el("text", {x: left + (i + .5) * bw, y: h + 26, "text-anchor": "middle",
+                fill: "#888"}, svg, total);
+  });
+  parent.appendChild(svg);
+  legend(parent, classes, palette);
+}
+
+function pies(parent, rows, classes, palette, title) {
+  const h = document.createElement("h3");
+  h.textContent = title;
+  parent.appendChild(h);
+  const row = document.createElement("div");
+  row.className = "row";
+  for (const [key, counts] of rows) {
+    const total = classes.reduce((s, c) => s + (counts[c] || 0), 0);
+    if (!total) continue;
+    const div = document.createElement("div");
+    div.className = "pie";
+    const svg = el("svg", {width: 120, height: 120, viewBox: "-1 -1 2 2"}, div);
+    let angle = -Math.PI / 2;
+    for (const c of classes) {
+      const frac = (counts[c] || 0) / total;
+      if (!frac) continue;
+      const a1 = angle + 2 * Math.PI * frac;
+      const path = frac >= 1 ? "M 0 -1 A 1 1 0 1 1 -0.0001 -1 Z" :
+        `M 0 0 L ${Math.cos(angle)} ${Math.sin(angle)} A 1 1 0 ${frac > .5 ? 1 : 0} 1 ` +
+        `${Math.cos(a1)} ${Math.sin(a1)} Z`;
+      const p = el("path", {d: path, fill: palette[c], stroke: "white",
+                            "stroke-width": 0.02}, svg);
+      el("title", {}, p, `${c}: ${counts[c]} (${(100 * frac).toFixed(1)}%)`);
+      angle = a1;
+    }
+    div.appendChild(document.createElement("br"));
+    div.append(`${key} | #total: ${total}`);
+    row.appendChild(div);
+  }
+  parent.appendChild(row);
+  legend(parent, classes, palette);
+}
+
+// 5-year periods aligned with 2021-2025, the first one starts at the first year
+function periodOf(report) {
+  const years = report.cube.values.year, first = Math.min(...years);
+  return y => {
+    const start = y - (((y - 2021) % 5) + 5) % 5;
+    return `${Math.max(start, first)}-${start + 4}`;
+  };
+}
+
+function render() {
+  const report = reports[document.getElementById("journal").value];
+  const category = document.getElementById("category").value;
+  const views = document.getElementById("views");
+  views.innerHTML = "";
+  const paper = report.cube.values.article_availability;
+  const data = report.cube.values.data_availability;
+  const sections = [["Paper Availability", "article_availability", paper,
+                     colors.paper], ["Data Availability", "data_availability",
+                     data, colors.data]];
+  for (const [title, dim, classes, palette] of sections) {
+    const h = document.createElement("h2");
+    h.textContent = `${title} | ${report.journal} | ${category}`;
+    views.appendChild(h);
+    stackedBars(views, table(report, category, "year", dim, y => y), classes,
+                palette, "Percent of articles per year");
+    pies(views, table(report, category, "year", dim, periodOf(report)), classes,
+         palette, "Per 5-year period");
+  }
+}
+
+function init() {
+  const journal = document.getElementById("journal");
+  reports.forEach((r, i) => journal.add(new Option(r.journal, i)));
+  const update = () => {
+    const category = document.getElementById("category");
+    const report = reports[journal.value];
+    category.innerHTML = "";
+    for (const c of ["All", ...report.cube.values.category]) {
+      category.add(new Option(c, c));
+    }
+    render();
+  };
+  journal.onchange = update;
+  document.getElementById("category").onchange = render;
+  update();
+}
+init();
+</script>
+</body>
+</html>
+"""
+
+
+def report_data(cube, journal):
+    """JSON serializable data of one journal embedded in the report."""
+    return {"journal": journal, "cube": to_compact(cube)}
+
+
+def script_json(value, **kwargs):
+    """JSON of `value` to embed in a <script> element.
+
+    "</" is escaped, such that a string like "</script>" cannot end the element.
+    """
+    return json.dumps(value, **kwargs).replace("</", "<\\/")
+
+
+def render_report(reports, title="Paper and data availability"):
+    """HTML document for a list of `report_data` entries."""
+    values = {
+        "__TITLE__": html.escape(title),
+        "__COLORS__": script_json({"paper": paper_colors, "data": data_colors}),
+        "__DATA__": script_json(reports, separators=(",", ":")),
+    }
+    # All placeholders at once, such that a title cannot insert another one
+    return re.sub("|".join(values), lambda match: values[match[0]], template)
+
+
+def write_report(reports, path, title="Paper and data availability"):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(render_report(reports, title=title), encoding="utf-8")
+    logging.info("Wrote report (%.1f KB) to %s", path.stat().st_size / 1024, path)
+    return path
+
+
+def main(args):
+    if len(args.input) != len(args.journal):
+        raise ValueError("Provide one journal name per input file.")
+    reports = [
+        report_data(load_cube(path, scheme=args.scheme), journal)
+        for path, journal in zip(args.input, args.journal)
+    ]
+    write_report(reports, args.output, title=args.title)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write a self-contained HTML report of article analysis results"
+    )
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Path(s) to the analysis results CSV file(s)",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Journal name(s) to print in the report, one per input file",
+    )
+    parser.add_argument(
+        "--output", "-o", type=str, required=True, help="Path to the HTML report"
+    )
+    parser.add_argument(
+        "--title",
+        type=str,
+        default="Paper and data availability",
+        help="Title of the report",
+    )
+    parser.add_argument(
+        "--scheme",
+        type=str,
+        help="Scheme of the categories, for results of several categories files",
+    )
+    main(parser.parse_args())
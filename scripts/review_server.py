@@ -0,0 +1,505 @@
+"""Local review of the sampled articles in the browser.
+
+Serves the cached pages of the samples of robustness_harness.py next to the
+prediction of the analysis, without any request to the publisher:
+
+    python robustness_harness.py sample -i results.csv
+    python review_server.py -i results.csv --cache soups_export --reviewer ab
+
+The page of each sample is shown with the matched keywords of its category
+marked, and with the scored rights and data availability sections outlined;
+with -oa/-da, the matches of the score rules are marked as well. "Agree"
+records the prediction as the label, "Disagree" the classes selected in the
+form; the labels are appended to the labels file of the harness, such that
+`robustness_harness.py score` evaluates them. The pages of the next
+--prefetch samples are prepared in the background while the current one is
+reviewed. Keys: a = agree, d = disagree, s = skip.
+"""
+
+import argparse
+import html
+import logging
+import re
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from analysis import scheme_results
+from article_archive import open_cache
+from plotting import data_order, paper_order
+from robustness_harness import append_label, fields, now, read_labels
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# NOTE: pandas and bs4 are imported where needed.
+
+# Marks of the highlighted matches, by the rules they come from
+mark_colors = {"keyword": "#ffe066", "paper": "#a5d8ff", "data": "#b2f2bb"}
+
+# Outlines of the scored sections, by result column
+section_colors = {
+    "article_availability_section": "#1c7ed6",
+    "data_availability_section": "#2f9e44",
+}
+
+# Tags removed from the cached pages, such that they render offline
+removed_tags = ["script", "noscript", "iframe"]
+
+# Style added to the cached pages
+page_style = "".join(
+    [
+        f"mark.review-{name} {{ background: {color}; }}\n"
+        for name, color in mark_colors.items()
+    ]
+    + [
+        f"section.review-{column} {{ outline: 3px solid {color}; }}\n"
+        for column, color in section_colors.items()
+    ]
+)
+
+review_style = """
+body { margin: 0; font-family: sans-serif; display: flex; height: 100vh; }
+#verdict { width: 28em; padding: 1em; overflow-y: auto; border-right: 1px solid #ccc; }
+#verdict table { border-collapse: collapse; }
+#verdict td { padding: 0.2em 0.5em 0.2em 0; vertical-align: top; }
+#verdict button { font-size: 1.1em; margin: 0.5em 0.5em 0 0; }
+#article { flex: 1; border: none; height: 100%; }
+.legend span { padding: 0 0.3em; }
+.message { color: #c92a2a; }
+"""
+
+review_script = """
+document.addEventListener("keydown", function (event) {
+    if (event.target.tagName === "SELECT") return;
+    var button = {a: "agree", d: "disagree", s: "skip"}[event.key];
+    if (button) document.getElementById(button).click();
+});
+"""
+
+
+def shown(value):
+    """Value of a cell as shown and labeled; missing results ("N/A") are read
+    as NaN."""
+    import pandas as pd
+
+    return "N/A" if pd.isna(value) else str(value)
+
+
+def rule_pattern(keywords):
+    """One regular expression matching any of `keywords`, or None."""
+    keywords = [str(key) for key in keywords if str(key) not in ["", "nan", "N/A"]]
+    if not keywords:
+        return None
+    return "|".join(f"(?:{key})" for key in dict.fromkeys(keywords))
+
+
+def highlight(page, patterns, sections):
+    """Cached `page` prepared for the review.
+
+    Scripts are removed, the matches of `patterns` (mark name -> regular
+    expression) are marked and the sections whose text is part of one of
+    `sections` (result column -> scored text) are outlined.
+    """
+    from bs4 import BeautifulSoup, NavigableString
+
+    soup = BeautifulSoup(page, "html.parser")
+    for tag in soup.find_all(removed_tags):
+        tag.decompose()
+    for tag in soup.find_all("link", rel="stylesheet"):
+        tag.decompose()
+
+    for section in soup.find_all("section", attrs={"data-title": True}):
+        text = section.text
+        for column, scored in sections.items():
+            if text.strip() and isinstance(scored, str) and text in scored:
+                section["class"] = section.get("class", []) + [f"review-{column}"]
+
+    patterns = {name: pattern for name, pattern in patterns.items() if pattern}
+    if patterns:
+        regex = re.compile(
+            "|".join(f"(?P<{name}>{pattern})" for name, pattern in patterns.items()),
+            re.I,
+        )
+        body = soup.body or soup
+        for text in body.find_all(string=True):
+            if type(text) is not NavigableString or text.parent.name == "style":
+                continue
+            parts, end = [], 0
+            for match in regex.finditer(text):
+                if match.end() == match.start():
+                    continue
+                mark = soup.new_tag(
+                    "mark", attrs={"class": f"review-{match.lastgroup}"}
+                )
+                mark.string = match.group()
+                parts += [text[end : match.start()], mark]
+                end = match.end()
+            if parts:
+                parts.append(text[end:])
+                for part in parts:
+                    text.insert_before(part)
+                text.extract()
+
+    style = soup.new_tag("style")
+    style.string = page_style
+    (soup.head or soup).append(style)
+    return str(soup)
+
+
+class Reviewer:
+    """Samples, results and page cache of a review, shared by all requests.
+
+    `samples` are the samples of robustness_harness.py, `results` the results
+    file they were drawn from. `rules` maps "paper" and "data" to the rule
+    tables of the availability scores, if given.
+    """
+
+    def __init__(
+        self, samples, results, pages, labels_path, reviewer, rules=None, prefetch=3
+    ):
+        self.samples = samples.reset_index(drop=True)
+        self.results = results
+        self.pages = pages
+        self.labels_path = labels_path
+        self.reviewer = reviewer
+        self.prefetch = prefetch
+        self.patterns = {
+            name: rule_pattern(table["keyword"])
+            for name, table in (rules or {}).items()
+        }
+        self.classes = {
+            "category": sorted(
+                set(results["category"].dropna()) | set(samples["category"].dropna())
+            ),
+            "article_availability": paper_order,
+            "data_availability": data_order,
+        }
+        self.labeled = set(read_labels(labels_path)["doi"])
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(1)
+        # Prepared pages by sample position, see `page`
+        self.prepared = {}
+        self.shown_at = {}
+
+    def next_position(self, after=-1):
+        """Position of the next sample without label after `after`, else the
+        first one without label; None if all are labeled."""
+        todo = [
+            position
+            for position, doi in enumerate(self.samples["doi"])
+            if doi not in self.labeled
+        ]
+        later = [position for position in todo if position > after]
+        return (later or todo or [None])[0]
+
+    def row(self, position):
+        return self.results.loc[self.samples.at[position, "row"]]
+
+    def predicted(self, position):
+        """Predicted classes of the sample at `position`, as shown."""
+        return {field: shown(self.samples.at[position, field]) for field in fields}
+
+    def prepare(self, position):
+        """Highlighted cached page of the sample at `position`, or None."""
+        start = time.perf_counter()
+        page = self.pages.get(int(self.samples.at[position, "row"]))
+        if page is None:
+            return None
+        row = self.row(position)
+        patterns = {
+            "keyword": rule_pattern(str(row["keywords"]).split(", ")),
+            **self.patterns,
+        }
+        prepared = highlight(
+            page, patterns, {column: row[column] for column in section_colors}
+        )
+        logging.debug(
+            "Prepared sample %d in %.2f s", position, time.perf_counter() - start
+        )
+        return prepared
+
+    def page(self, position):
+        """Prepared page of `position`; starts preparing the next samples."""
+        with self.lock:
+            if position not in self.prepared:
+                self.prepared[position] = self.executor.submit(self.prepare, position)
+            future = self.prepared[position]
+            upcoming = position
+            for _ in range(self.prefetch):
+                upcoming = self.next_position(upcoming)
+                if upcoming is None or upcoming == position:
+                    break
+                if upcoming not in self.prepared:
+                    self.prepared[upcoming] = self.executor.submit(
+                        self.prepare, upcoming
+                    )
+            # Keep the pages around the current sample only
+            for old in [p for p in self.prepared if p < position - 1]:
+                self.prepared.pop(old).cancel()
+        return future.result()
+
+    def record(self, position, verdict, selected):
+        """Append the label of the sample at `position` to the labels file.
+
+        With the verdict "agree", the predicted classes are recorded, with
+        "disagree" the `selected` classes, of which one must differ.
+        """
+        sample = self.samples.loc[position]
+        predicted = self.predicted(position)
+        if verdict == "agree":
+            values = predicted
+        else:
+            values = {field: selected.get(field, predicted[field]) for field in fields}
+            if values == predicted:
+                raise ValueError("Select the correct classes to disagree")
+        label = {
+            "doi": sample["doi"],
+            **values,
+            "reviewer": self.reviewer,
+            "labeled_at": now(),
+        }
+        with self.lock:
+            append_label(self.labels_path, label)
+            self.labeled.add(sample["doi"])
+            shown = self.shown_at.pop(position, None)
+        logging.info(
+            "%s %s (%d of %d labeled%s)",
+            verdict.capitalize(),
+            sample["doi"],
+            len(self.labeled & set(self.samples["doi"])),
+            len(self.samples),
+            "" if shown is None else f", {time.perf_counter() - shown:.0f} s",
+        )
+
+    def review_page(self, position, message=""):
+        """Verdict form of the sample at `position` next to its article."""
+        with self.lock:
+            self.shown_at[position] = time.perf_counter()
+        sample = self.samples.loc[position]
+        row = self.row(position)
+        following = self.next_position(position)
+        done = len(self.labeled & set(self.samples["doi"]))
+
+        def cell(value):
+            return html.escape(shown(value))
+
+        # The prediction is an option also if it is no class, e.g. "N/A"
+        predicted = self.predicted(position)
+        predictions = "".join(
+            f"<tr><td>{field}</td><td><select name='{field}'>"
+            + "".join(
+                f"<option{' selected' if cls == predicted[field] else ''}>"
+                f"{cell(cls)}</option>"
+                for cls in dict.fromkeys([*self.classes[field], predicted[field]])
+            )
+            + "</select></td></tr>"
+            for field in fields
+        )
+        legend = "".join(
+            f"<span style='background: {color}'>{name}</span>"
+            for name, color in mark_colors.items()
+            if name == "keyword" or self.patterns.get(name)
+        ) + "".join(
+            f"<span style='outline: 2px solid {color}'>{column}</span>"
+            for column, color in section_colors.items()
+        )
+        prefetch = (
+            f"<link rel='prefetch' href='/page/{following}'>"
+            if following not in [None, position]
+            else ""
+        )
+        return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Review {position + 1}</title>
+<style>{review_style}</style>{prefetch}</head>
+<body>
+<div id="verdict">
+<p>Sample {position + 1} of {len(self.samples)}, {done} labeled</p>
+<h3>{cell(row['title'])} ({cell(row['year'])})</h3>
+<p><a href="{cell(sample['url'])}" target="_blank">{cell(sample['url'])}</a></p>
+<p class="message">{cell(message)}</p>
+<form method="post" action="/label/{position}">
+<table>{predictions}
+<tr><td>keywords</td><td>{cell(row['keywords'])}</td></tr>
+<tr><td>paper score</td><td>{cell(row['article_availability_score'])}</td></tr>
+<tr><td>data score</td><td>{cell(row['data_availability_score'])}</td></tr>
+</table>
+<button id="agree" name="verdict" value="agree">Agree</button>
+<button id="disagree" name="verdict" value="disagree">Disagree</button>
+<button id="skip" name="verdict" value="skip">Skip</button>
+</form>
+<p class="legend">{legend}</p>
+</div>
+<iframe id="article" src="/page/{position}"></iframe>
+<script>{review_script}</script>
+</body></html>"""
+
+
+class Handler(BaseHTTPRequestHandler):
+    reviewer = None
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        parts = path.strip("/").split("/")
+        try:
+            if path == "/":
+                self.next_sample(-1)
+            elif parts[0] == "review" and len(parts) == 2:
+                self.respond(200, self.reviewer.review_page(self.position(parts[1])))
+            elif parts[0] == "page" and len(parts) == 2:
+                page = self.reviewer.page(self.position(parts[1]))
+                if page is None:
+                    page = "<p>The page of this article is not in the cache.</p>"
+                self.respond(200, page)
+            else:
+                self.respond(404, f"Unknown path: {html.escape(path)}")
+        except (KeyError, ValueError) as e:
+            self.respond(404, html.escape(str(e)))
+
+    def do_POST(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if parts[0] != "label" or len(parts) != 2:
+            self.respond(404, "Unknown path")
+            return
+        try:
+            position = self.position(parts[1])
+        except (KeyError, ValueError) as e:
+            self.respond(404, html.escape(str(e)))
+            return
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        form = {key: values[0] for key, values in form.items()}
+        verdict = form.pop("verdict", "skip")
+        if verdict != "skip":
+            try:
+                self.reviewer.record(position, verdict, form)
+            except ValueError as e:
+                self.respond(400, self.reviewer.review_page(position, message=str(e)))
+                return
+        self.next_sample(position)
+
+    def position(self, text):
+        position = int(text)
+        if not 0 <= position < len(self.reviewer.samples):
+            raise KeyError(f"No sample {position}")
+        return position
+
+    def next_sample(self, after):
+        position = self.reviewer.next_position(after)
+        if position is None:
+            self.respond(200, "<p>All samples are labeled.</p>")
+            return
+        self.send_response(303)
+        self.send_header("Location", f"/review/{position}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def respond(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(reviewer, host="127.0.0.1", port=8200):
+    """Serve `reviewer` until interrupted (Ctrl+C or SIGTERM)."""
+    signal.signal(signal.SIGTERM, interrupt)
+    handler = type("ReviewHandler", (Handler,), {"reviewer": reviewer})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    logging.info(
+        "Reviewing %d samples (%d labeled) on http://%s:%d",
+        len(reviewer.samples),
+        len(reviewer.labeled & set(reviewer.samples["doi"])),
+        host,
+        server.server_address[1],
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        reviewer.executor.shutdown(cancel_futures=True)
+
+
+def main(args):
+    import pandas as pd
+
+    results = scheme_results(pd.read_csv(args.results), args.scheme)
+    samples = pd.read_csv(args.samples)
+    rules = {}
+    if args.open_access:
+        rules["paper"] = pd.read_csv(args.open_access)
+    if args.data_availability:
+        rules["data"] = pd.read_csv(args.data_availability)
+    pages = open_cache(args.cache)
+    reviewer = Reviewer(
+        samples,
+        results,
+        pages,
+        args.labels,
+        args.reviewer,
+        rules=rules,
+        prefetch=args.prefetch,
+    )
+    try:
+        serve(reviewer, host=args.host, port=args.port)
+    finally:
+        pages.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Review the sampled articles on their cached pages in the browser"
+    )
+    parser.add_argument(
+        "--results", "-i", type=str, required=True, help="analysis results CSV"
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        required=True,
+        help="Page cache of the results: folder (soups_<stem>) or archive (.pack)",
+    )
+    parser.add_argument(
+        "--scheme",
+        type=str,
+        help="Scheme of the categories, for results of several categories files",
+    )
+    parser.add_argument("--reviewer", type=str, required=True)
+    parser.add_argument(
+        "--samples", type=str, default="samples.csv", help="samples CSV"
+    )
+    parser.add_argument(
+        "--labels", type=str, default="labels.csv", help="reviewer labels CSV"
+    )
+    parser.add_argument(
+        "--open_access",
+        "-oa",
+        help="open access availability CSV file, to mark its matches",
+    )
+    parser.add_argument(
+        "--data_availability",
+        "-da",
+        help="data availability CSV file, to mark its matches",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=3,
+        help="Number of following samples prepared in the background",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8200)
+    main(parser.parse_args())
@@ -6,85 +6,28 @@ Potentially adapt to your system and browser of choice, e.g., Chrome, Firefox, B
 # NOTE: Hardcoded path to MS Edge browser executable
 edge_path = r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe"
 
-import pandas as pd
-import webbrowser
-
 from pathlib import Path
-import pandas as pd
-import requests
 import argparse
 import logging
 
+from plotting import load_results
+
+# NOTE: pandas, requests and webbrowser are imported where needed, such that
+# the command line interface starts quickly.
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-parser = argparse.ArgumentParser(description="Robustness check for article access")
-parser.add_argument(
-    "--input", type=str, default="tipm_analysis.csv", help="Path to the input CSV file"
-)
-parser.add_argument(
-    "--sample-years",
-    action="store_true",
-    help="Whether to sample years and open articles in browser",
-)
-parser.add_argument(
-    "--random",
-    action="store_true",
-    help="Whether to randomly sample articles instead of the first N articles",
-)
-parser.add_argument(
-    "--category",
-    type=str,
-    default=None,
-    help="Category to filter articles by before sampling",
-)
-parser.add_argument(
-    "--years",
-    type=int,
-    nargs="+",
-)
-parser.add_argument(
-    "--only-full-data",
-    action="store_true",
-)
-parser.add_argument(
-    "--only-partial-data",
-    action="store_true",
-)
-parser.add_argument(
-    "--only-no-data",
-    action="store_true",
-)
-parser.add_argument(
-    "--sample-size",
-    type=int,
-    default=5,
-    help="Number of articles to sample per year if --sample-years is set",
-)
-args = parser.parse_args()
-
-# Make sure that args.random and args.category are not both set
-if args.random and args.category:
-    raise ValueError("Cannot use --random and --category together. Please choose one.")
-
-# Load the CSV file
-df = pd.read_csv(args.input)
-
-if args.years:
-    year_span = list(range(min(args.years), max(args.years) + 1))
-    df = df[df["year"].isin(year_span)]
-
-if args.only_full_data:
-    print(df["data_availability_score"].value_counts())
-    df = df[df["data_availability_score"] == 1.0]
-if args.only_partial_data:
-    df = df[df["data_availability_score"] == 0.5]
-if args.only_no_data:
-    df = df[df["data_availability_score"] == 0.0]
-
-
-def open_url_in_browser(url):
-    """Open a URL in the default web browser."""
+
+def open_url_in_browser(url, check=True):
+    """Open a URL in the default web browser.
+
+    With `check`, the URL is also requested to report if the article cannot
+    be retrieved; not needed for URLs checked by link_health.py.
+    """
+    import requests
+    import webbrowser
+
     logger.info("Opening URL: %s", url)
     if Path(edge_path).exists():
         webbrowser.register("edge", None, webbrowser.BackgroundBrowser(edge_path))
@@ -92,35 +35,136 @@ def open_url_in_browser(url):
     else:
         # Fallback to default browser if Edge not found
         webbrowser.open(url)
-    # Here you would add the code to open the URL in a browser.
-    response = requests.get(url)
-    if not response.status_code == 200:
+    if not check:
+        return
+    try:
+        ok = requests.get(url, timeout=20).status_code == 200
+    except requests.RequestException:
+        ok = False
+    if not ok:
         print("Failed to retrieve article.")
 
 
-# Robustness check: Assessing open vs closed access of the articles.
-# Check availability of Rights and Permissions section.
-df_by_year = df.groupby("year")
-for year in df_by_year.groups.keys():
-    if not args.sample_years:
-        continue
-    if args.sample_size < len(df_by_year.get_group(year)):
-        random_articles = df_by_year.get_group(year).sample(args.sample_size)
-    else:
-        random_articles = df_by_year.get_group(year)
-    for index, row in random_articles.iterrows():
-        url = row["url"]
-        open_url_in_browser(url)
-        for col in row.keys():
-            print(col, row[col])
-
-# Robustness check: Assessing whether the right category was assigned.
-# Sample N articles from a specific category.
-if args.category:
-    filtered_df = df[df["category"] == args.category]
-    sample_df = filtered_df.sample(min(args.sample_size, len(filtered_df)))
-    for index, row in sample_df.iterrows():
-        url = row["url"]
-        open_url_in_browser(url)
-        for col in row.keys():
-            print(col, row[col])
+def main(args):
+    # Make sure that args.random and args.category are not both set
+    if args.random and args.category:
+        raise ValueError(
+            "Cannot use --random and --category together. Please choose one."
+        )
+
+    # Load the CSV file
+    df = load_results(args.input, args.scheme)
+
+    if args.years:
+        year_span = list(range(min(args.years), max(args.years) + 1))
+        df = df[df["year"].isin(year_span)]
+
+    if args.only_full_data:
+        print(df["data_availability_score"].value_counts())
+        df = df[df["data_availability_score"] == 1.0]
+    if args.only_partial_data:
+        df = df[df["data_availability_score"] == 0.5]
+    if args.only_no_data:
+        df = df[df["data_availability_score"] == 0.0]
+
+    # Skip dead and redirected links, as checked by link_health.py
+    if args.link_health:
+        from link_health import read_cache
+
+        checks = read_cache(args.link_health)
+        health = df["url"].map(lambda url: checks.get(url, {}).get("health"))
+        logger.info(
+            "Skipping %d dead or redirected links, %d links are not checked or "
+            "failed temporarily",
+            health.isin(["dead", "redirected"]).sum(),
+            (health.isna() | health.eq("transient")).sum(),
+        )
+        df = df[health.ne("dead") & health.ne("redirected")]
+
+    # Robustness check: Assessing open vs closed access of the articles.
+    # Check availability of Rights and Permissions section.
+    df_by_year = df.groupby("year")
+    for year in df_by_year.groups.keys():
+        if not args.sample_years:
+            continue
+        if args.sample_size < len(df_by_year.get_group(year)):
+            random_articles = df_by_year.get_group(year).sample(args.sample_size)
+        else:
+            random_articles = df_by_year.get_group(year)
+        for index, row in random_articles.iterrows():
+            url = row["url"]
+            open_url_in_browser(url, check=not args.link_health)
+            for col in row.keys():
+                print(col, row[col])
+
+    # Robustness check: Assessing whether the right category was assigned.
+    # Sample N articles from a specific category.
+    if args.category:
+        filtered_df = df[df["category"] == args.category]
+        sample_df = filtered_df.sample(min(args.sample_size, len(filtered_df)))
+        for index, row in sample_df.iterrows():
+            url = row["url"]
+            open_url_in_browser(url, check=not args.link_health)
+            for col in row.keys():
+                print(col, row[col])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Robustness check for article access")
+    parser.add_argument(
+        "--input",
+        type=str,
+        default="tipm_analysis.csv",
+        help="Path to the input CSV file",
+    )
+    parser.add_argument(
+        "--sample-years",
+        action="store_true",
+        help="Whether to sample years and open articles in browser",
+    )
+    parser.add_argument(
+        "--random",
+        action="store_true",
+        help="Whether to randomly sample articles instead of the first N articles",
+    )
+    parser.add_argument(
+        "--scheme",
+        type=str,
+        help="Scheme of the categories, for results of several categories files",
+    )
+    parser.add_argument(
+        "--category",
+        type=str,
+        default=None,
+        help="Category to filter articles by before sampling",
+    )
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs="+",
+    )
+    parser.add_argument(
+        "--only-full-data",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--only-partial-data",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--only-no-data",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        default=5,
+        help="Number of articles to sample per year if --sample-years is set",
+    )
+    parser.add_argument(
+        "--link-health",
+        type=str,
+        help="Link health cache of link_health.py: skip dead and redirected "
+        "links and do not request the sampled articles",
+    )
+    main(parser.parse_args())
@@ -0,0 +1,359 @@
+"""Offline robustness check of the classification against reviewer labels.
+
+In contrast to robustness_check.py, no browser and no network are needed: the
+harness works on the results file and the cached article pages only.
+
+    sample  Draw a stratified sample (year x category x data availability
+            score) of the results.
+    label   Record reviewer labels for the sampled articles on the console.
+    score   Per-class precision, recall and confusion matrices for category,
+            article availability and data availability against the labels,
+            with bootstrap confidence intervals. With --rescore, the cached
+            pages are classified again with the current rule tables, such that
+            the effect of a rule change is visible in seconds.
+"""
+
+import argparse
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+from analysis import analyze_soup, result_columns, scheme_results
+from article_archive import open_cache
+from plotting import data_availability_map, paper_availability_map
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Evaluated fields
+fields = ["category", "article_availability", "data_availability"]
+
+# Sampling strata
+strata = ["year", "category", "data_availability_score"]
+
+label_columns = ["doi"] + fields + ["reviewer", "labeled_at"]
+
+
+def predictions(df):
+    """Predicted classes of all evaluated fields, keyed by the row in the results."""
+    import pandas as pd
+
+    return pd.DataFrame(
+        {
+            "row": df.index,
+            "doi": df["doi"],
+            "url": df["url"],
+            "year": df["year"],
+            "category": df["category"],
+            "article_availability": df["article_availability_score"].map(
+                paper_availability_map
+            ),
+            "data_availability": df["data_availability_score"].map(
+                data_availability_map
+            ),
+        }
+    )
+
+
+def stratified_sample(df, per_stratum, seed=0, exclude=()):
+    """Up to `per_stratum` random articles per stratum, skipping DOIs in `exclude`."""
+    df = df[~df["doi"].isin(set(exclude))]
+    shuffled = df.sample(frac=1, random_state=seed)
+    sample = shuffled.groupby(strata, dropna=False).head(per_stratum)
+    return sample.sort_index()
+
+
+def read_labels(path):
+    """Reviewer labels, the latest label of each DOI wins."""
+    import pandas as pd
+
+    if not Path(path).exists():
+        return pd.DataFrame(columns=label_columns)
+    labels = pd.read_csv(path, dtype=str)
+    return labels.drop_duplicates(subset="doi", keep="last")
+
+
+def append_label(path, label):
+    """Append one label (dict with `label_columns`) to the labels file."""
+    import csv
+
+    path = Path(path)
+    new = not path.exists()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=label_columns)
+        if new:
+            writer.writeheader()
+        writer.writerow(label)
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def rescore(df, rows, cache_folder, categories_df, open_access_df, data_df):
+    """Classify the cached pages of `rows` again with the given rule tables."""
+    from bs4 import BeautifulSoup
+
+    df = df.astype({column: object for column in result_columns})
+    pages = open_cache(cache_folder)
+    for row in rows:
+        soup = BeautifulSoup(pages.get(row), "html.parser")
+        result = analyze_soup(
+            soup, df.loc[row, "url"], categories_df, open_access_df, data_df
+        )
+        for column in result_columns:
+            df.at[row, column] = result[column]
+    pages.close()
+    return df
+
+
+def confusion_matrix(true, pred, classes):
+    """Counts with true classes as rows and predicted classes as columns."""
+    import pandas as pd
+
+    matrix = pd.crosstab(
+        pd.Categorical(true, categories=classes),
+        pd.Categorical(pred, categories=classes),
+        dropna=False,
+    )
+    matrix.index.name = "true"
+    matrix.columns.name = "predicted"
+    return matrix
+
+
+def bootstrap_precision_recall(
+    true, pred, classes, n_boot=2000, confidence=0.95, seed=0
+):
+    """Per-class precision and recall with percentile bootstrap intervals.
+
+    All resamples are evaluated at once: the confusion matrices of the
+    resamples are obtained from a single bincount over (resample, true,
+    predicted) codes.
+
+    Returns a dict of arrays (one entry per class) with the point estimates
+    and lower/upper bounds of precision and recall, and the support.
+    """
+    import numpy as np
+
+    lookup = {c: i for i, c in enumerate(classes)}
+    t = np.array([lookup[c] for c in true])
+    p = np.array([lookup[c] for c in pred])
+    k, n = len(classes), len(t)
+
+    def metrics(conf):
+        tp = np.diagonal(conf, axis1=-2, axis2=-1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            precision = tp / conf.sum(axis=-2)
+            recall = tp / conf.sum(axis=-1)
+        return precision, recall
+
+    conf = np.bincount(t * k + p, minlength=k * k).reshape(k, k)
+    precision, recall = metrics(conf)
+
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, n, size=(n_boot, n))
+    codes = np.arange(n_boot)[:, None] * k * k + t[idx] * k + p[idx]
+    boot = np.bincount(codes.ravel(), minlength=n_boot * k * k).reshape(n_boot, k, k)
+    boot_precision, boot_recall = metrics(boot)
+    q = [100 * (1 - confidence) / 2, 100 * (1 + confidence) / 2]
+    with np.errstate(invalid="ignore"):
+        precision_ci = np.nanpercentile(boot_precision, q, axis=0)
+        recall_ci = np.nanpercentile(boot_recall, q, axis=0)
+    return {
+        "support": conf.sum(axis=1),
+        "precision": precision,
+        "precision_lower": precision_ci[0],
+        "precision_upper": precision_ci[1],
+        "recall": recall,
+        "recall_lower": recall_ci[0],
+        "recall_upper": recall_ci[1],
+    }
+
+
+def evaluate(labeled, n_boot=2000, confidence=0.95, seed=0):
+    """Metrics table and confusion matrices of all fields.
+
+    `labeled` holds the predictions (columns `fields`) and the labels (columns
+    `fields` with suffix "_label").
+    """
+    import warnings
+
+    import pandas as pd
+
+    tables = []
+    matrices = {}
+    for field in fields:
+        data = labeled.dropna(subset=[field, f"{field}_label"])
+        if data.empty:
+            continue
+        true, pred = data[f"{field}_label"], data[field]
+        classes = sorted(set(true) | set(pred))
+        matrices[field] = confusion_matrix(true, pred, classes)
+        with warnings.catch_warnings():
+            # Classes without any prediction in a resample
+            warnings.simplefilter("ignore", RuntimeWarning)
+            metrics = bootstrap_precision_recall(
+                true, pred, classes, n_boot=n_boot, confidence=confidence, seed=seed
+            )
+        table = pd.DataFrame({"field": field, "class": classes, **metrics})
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True), matrices
+
+
+def sample_command(args):
+    import pandas as pd
+
+    df = scheme_results(pd.read_csv(args.results), args.scheme)
+    exclude = read_labels(args.labels)["doi"] if args.labels else ()
+    sample = predictions(
+        stratified_sample(df, args.per_stratum, seed=args.seed, exclude=exclude)
+    )
+    sample.to_csv(args.samples, index=False)
+    logging.info("Wrote %d samples to %s", len(sample), args.samples)
+
+
+def label_command(args):
+    import pandas as pd
+
+    df = scheme_results(pd.read_csv(args.results), args.scheme)
+    samples = pd.read_csv(args.samples)
+    done = set(read_labels(args.labels)["doi"])
+    todo = samples[~samples["doi"].isin(done)]
+    print(f"{len(todo)} of {len(samples)} samples without label.")
+    print(
+        "Press enter to accept the prediction, type a label, 's' to skip or 'q' to quit."
+    )
+    for _, sample in todo.iterrows():
+        row = df.loc[sample["row"]]
+        print()
+        print(f"[{sample['row']}] {row['title']} ({row['year']})")
+        print(sample["url"])
+        print("Abstract:", str(row["abstract"])[: args.excerpt])
+        print("Rights:", str(row["article_availability_section"])[: args.excerpt])
+        print("Data:", str(row["data_availability_section"])[: args.excerpt])
+        label = {"doi": sample["doi"], "reviewer": args.reviewer, "labeled_at": None}
+        for field in fields:
+            answer = input(f"{field} [{sample[field]}]: ").strip()
+            if answer in ["q", "s"]:
+                break
+            label[field] = answer or sample[field]
+        if answer == "q":
+            break
+        if answer == "s":
+            continue
+        label["labeled_at"] = now()
+        append_label(args.labels, label)
+
+
+def score_command(args):
+    import pandas as pd
+
+    df = scheme_results(pd.read_csv(args.results), args.scheme)
+    labels = read_labels(args.labels)
+    if args.rescore:
+        df = rescore(
+            df,
+            df.index[df["doi"].isin(set(labels["doi"]))],
+            args.cache_folder,
+            pd.read_csv(args.categories),
+            pd.read_csv(args.open_access),
+            pd.read_csv(args.data_availability),
+        )
+    labeled = predictions(df).merge(labels, on="doi", suffixes=("", "_label"))
+    logging.info("Evaluating %d labeled articles", len(labeled))
+    table, matrices = evaluate(
+        labeled, n_boot=args.n_boot, confidence=args.confidence, seed=args.seed
+    )
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    table.to_csv(f"{output}_metrics.csv", index=False)
+    print(table.round(3).to_string(index=False))
+    for field, matrix in matrices.items():
+        matrix.to_csv(f"{output}_confusion_{field}.csv")
+        print()
+        print(f"Confusion matrix | {field}")
+        print(matrix.to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline robustness check against reviewer labels"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sample_parser = subparsers.add_parser("sample", help="Draw a stratified sample")
+    sample_parser.add_argument(
+        "--per-stratum",
+        type=int,
+        default=2,
+        help="Number of articles per year x category x data availability score",
+    )
+    sample_parser.add_argument("--seed", type=int, default=0)
+    sample_parser.set_defaults(func=sample_command)
+
+    label_parser = subparsers.add_parser("label", help="Label samples on the console")
+    label_parser.add_argument("--reviewer", type=str, required=True)
+    label_parser.add_argument(
+        "--excerpt",
+        type=int,
+        default=600,
+        help="Number of characters shown per section",
+    )
+    label_parser.set_defaults(func=label_command)
+
+    score_parser = subparsers.add_parser("score", help="Evaluate against the labels")
+    score_parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        required=True,
+        help="Prefix of the metrics and confusion matrix CSV files",
+    )
+    score_parser.add_argument(
+        "--rescore",
+        action="store_true",
+        help="Classify the cached pages again with the given rule tables",
+    )
+    score_parser.add_argument(
+        "--cache-folder",
+        type=str,
+        help="Page cache: folder (soups_<stem>) or archive (.pack)",
+    )
+    score_parser.add_argument("--categories", "-c", help="categories CSV file")
+    score_parser.add_argument(
+        "--open_access", "-oa", help="open access availability CSV file"
+    )
+    score_parser.add_argument(
+        "--data_availability", "-da", help="data availability CSV file"
+    )
+    score_parser.add_argument("--n-boot", type=int, default=2000)
+    score_parser.add_argument("--confidence", type=float, default=0.95)
+    score_parser.add_argument("--seed", type=int, default=0)
+    score_parser.set_defaults(func=score_command)
+
+    for _parser in [sample_parser, label_parser, score_parser]:
+        _parser.add_argument(
+            "--results", "-i", type=str, required=True, help="analysis results CSV"
+        )
+        _parser.add_argument(
+            "--labels", type=str, default="labels.csv", help="reviewer labels CSV"
+        )
+        _parser.add_argument(
+            "--samples", type=str, default="samples.csv", help="samples CSV"
+        )
+        _parser.add_argument(
+            "--scheme",
+            type=str,
+            help="Scheme of the categories, for results of several categories files",
+        )
+
+    args = parser.parse_args()
+    if getattr(args, "rescore", False) and not all(
+        [args.cache_folder, args.categories, args.open_access, args.data_availability]
+    ):
+        parser.error(
+            "--rescore requires --cache-folder, --categories, --open_access "
+            "and --data_availability"
+        )
+    args.func(args)
@@ -0,0 +1,228 @@
+"""Full-text index of the analyzed articles.
+
+The abstracts, rights and permissions sections and data availability sections
+of the results are stored in a SQLite FTS5 table, keyed by DOI, together with
+year, journal and category of each article. Queries return the number of
+matching articles per year and category without rerunning the analysis, e.g.
+to count the data statements mentioning Zenodo, or to try a keyword before
+adding it to a rule table.
+
+    build   Add one or more results files to the index (analysis.py can also
+            maintain the index itself, see its --index option).
+    query   Count matching articles per year and category.
+
+Queries use the FTS5 syntax: words, "quoted phrases", prefixes (zen*), AND,
+OR, NOT and NEAR(...). Note that FTS5 matches tokens, not regular expressions.
+"""
+
+import argparse
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+from analysis import scheme_results
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# NOTE: pandas is imported where needed.
+
+# Indexed text columns: name in the index -> column of the results
+sections = {
+    "abstract": "abstract",
+    "rights": "article_availability_section",
+    "data": "data_availability_section",
+}
+
+schema = f"""
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    doi TEXT UNIQUE NOT NULL,
+    year INTEGER,
+    journal TEXT,
+    category TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS texts USING fts5({", ".join(sections)});
+"""
+
+
+def connect(path):
+    """Open (and create if needed) the index at `path`."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.executescript(schema)
+    return connection
+
+
+def text_or_none(value):
+    # Missing sections ("N/A" or empty in the results) are not indexed
+    if not isinstance(value, str) or value in ["", "N/A"]:
+        return None
+    return value
+
+
+def add_articles(connection, df):
+    """Insert or replace the articles of a results data frame, keyed by DOI.
+
+    Results of several schemes are indexed by the category of one of them,
+    see analysis.scheme_results.
+    """
+    import pandas as pd
+
+    rows = [
+        (
+            row["doi"],
+            None if pd.isna(row["year"]) else int(row["year"]),
+            row["journal"],
+            row["category"],
+            *[text_or_none(row[column]) for column in sections.values()],
+        )
+        for row in df.to_dict("records")
+    ]
+    with connection:
+        for doi, year, journal, category, *texts in rows:
+            old = connection.execute(
+                "SELECT id FROM articles WHERE doi = ?", (doi,)
+            ).fetchone()
+            if old is not None:
+                connection.execute("DELETE FROM articles WHERE id = ?", old)
+                connection.execute("DELETE FROM texts WHERE rowid = ?", old)
+            cursor = connection.execute(
+                "INSERT INTO articles (doi, year, journal, category) "
+                "VALUES (?, ?, ?, ?)",
+                (doi, year, journal, category),
+            )
+            connection.execute(
+                f"INSERT INTO texts (rowid, {', '.join(sections)}) "
+                f"VALUES (?, {', '.join('?' for _ in sections)})",
+                (cursor.lastrowid, *texts),
+            )
+    return len(rows)
+
+
+def match_expression(query, column=None):
+    """FTS5 match expression of `query`, restricted to one section if given."""
+    if column is None:
+        return query
+    if column not in sections:
+        raise ValueError(f"Unknown section: {column}")
+    return f"{{{column}}} : ({query})"
+
+
+def hit_counts(connection, query, column=None, journal=None):
+    """Number of matching articles per year and category.
+
+    Returns a data frame with the columns year, category, hits and articles
+    (the number of indexed articles in that year and category).
+    """
+    import pandas as pd
+
+    where, params = "", [match_expression(query, column)]
+    if journal is not None:
+        where, params = "AND a.journal = ?", params + [journal]
+    hits = pd.read_sql_query(
+        "SELECT a.year, a.category, count(*) AS hits FROM texts "
+        "JOIN articles a ON a.id = texts.rowid "
+        f"WHERE texts MATCH ? {where} GROUP BY a.year, a.category",
+        connection,
+        params=params,
+    )
+    where, params = (
+        ("WHERE journal = ?", [journal]) if journal is not None else ("", [])
+    )
+    totals = pd.read_sql_query(
+        "SELECT year, category, count(*) AS articles FROM articles "
+        f"{where} GROUP BY year, category",
+        connection,
+        params=params,
+    )
+    counts = totals.merge(hits, on=["year", "category"], how="left")
+    counts["hits"] = counts["hits"].fillna(0).astype(int)
+    return counts[["year", "category", "hits", "articles"]]
+
+
+def build_command(args):
+    import pandas as pd
+
+    connection = connect(args.index)
+    for path in args.input:
+        results = pd.read_csv(path, dtype={"doi": str})
+        count = add_articles(connection, scheme_results(results, args.scheme))
+        logging.info("Indexed %d articles of %s", count, path)
+    (total,) = connection.execute("SELECT count(*) FROM articles").fetchone()
+    logging.info("%d articles in %s", total, args.index)
+
+
+def query_command(args):
+    import pandas  # noqa: F401 - not part of the query time
+
+    if not Path(args.index).exists():
+        raise FileNotFoundError(f"No index at {args.index}, run build first")
+    connection = connect(args.index)
+    start = time.perf_counter()
+    counts = hit_counts(
+        connection, args.query, column=args.column, journal=args.journal
+    )
+    elapsed = time.perf_counter() - start
+    logging.info(
+        "%d of %d articles match in %.1f ms",
+        counts["hits"].sum(),
+        counts["articles"].sum(),
+        1000 * elapsed,
+    )
+    if args.output:
+        counts.to_csv(args.output, index=False)
+        logging.info("Wrote hit counts to %s", args.output)
+    table = counts.pivot_table(
+        index="year", columns="category", values="hits", aggfunc="sum", fill_value=0
+    )
+    table["total"] = table.sum(axis=1)
+    print(table.to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Full-text index of abstracts and availability sections"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Add results to the index")
+    build_parser.add_argument(
+        "--input",
+        "-i",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Path(s) to the analysis results CSV file(s)",
+    )
+    build_parser.add_argument(
+        "--scheme",
+        type=str,
+        help="Scheme whose category is indexed, for results of several "
+        "categories files",
+    )
+    build_parser.set_defaults(func=build_command)
+
+    query_parser = subparsers.add_parser(
+        "query", help="Count matching articles per year and category"
+    )
+    query_parser.add_argument("query", type=str, help="FTS5 query, e.g. zenodo")
+    query_parser.add_argument(
+        "--column",
+        type=str,
+        choices=list(sections),
+        help="Only search this section",
+    )
+    query_parser.add_argument("--journal", type=str, help="Only count this journal")
+    query_parser.add_argument(
+        "--output", "-o", type=str, help="CSV file for the hit counts"
+    )
+    query_parser.set_defaults(func=query_command)
+
+    for _parser in [build_parser, query_parser]:
+        _parser.add_argument(
+            "--index", type=str, default="search_index.sqlite", help="index file"
+        )
+
+    args = parser.parse_args()
+    args.func(args)
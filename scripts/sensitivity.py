@@ -0,0 +1,416 @@
+"""Keyword ablation of the rule tables.
+
+Which rules of the category, open access and data availability tables drive
+the results? Instead of running the analysis once per removed rule, the
+keyword hits of all analyzed articles are computed once from the text columns
+of the results file (abstract, rights and permissions, data availability
+section) and cached per results file (see snapshot.py). The outcomes of
+`determine_category` and `score` are then derived again for all ablations at
+once: each ablation is a mask over the rules, and the label counters of all
+masks and articles are obtained by a single matrix product.
+
+For each removed rule (or group of rules, see --group-by) the tool reports
+how many articles change and how much the percentages of the year trends move.
+"""
+
+import argparse
+import hashlib
+import logging
+import re
+from pathlib import Path
+
+from plotting import data_availability_map, load_results, paper_availability_map
+from snapshot import cached
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# NOTE: numpy and pandas are imported where needed.
+
+# Rule tables: (text column of the results, compared result columns, trend)
+tables = {
+    "categories": ("abstract", ["category", "subcategory", "subcategory2"], None),
+    "open_access": (
+        "article_availability_section",
+        ["article_availability_score", "article_availability_category"],
+        paper_availability_map,
+    ),
+    "data_availability": (
+        "data_availability_section",
+        ["data_availability_score", "data_availability_category"],
+        data_availability_map,
+    ),
+}
+
+# Result of articles which were not analyzed (see analysis.unanalyzed_result)
+unanalyzed = "N/A"
+
+
+def hit_matrix(texts, keywords, count=True):
+    """Number of matches (or 0/1 if not `count`) of each keyword in each text.
+
+    Same matching as analysis.count_keywords and analysis.score: the keywords
+    are regular expressions, matched case-insensitively.
+    """
+    import numpy as np
+
+    patterns = [re.compile(rf"{key}", re.I) for key in keywords]
+    hits = np.zeros((len(texts), len(patterns)), dtype=np.int32)
+    for i, text in enumerate(texts):
+        if not isinstance(text, str) or not text:
+            continue
+        for k, pattern in enumerate(patterns):
+            if count:
+                hits[i, k] = len(pattern.findall(text))
+            else:
+                hits[i, k] = pattern.search(text) is not None
+    return hits
+
+
+def cached_hits(results_path, df, column, keywords, count=True, cache=True):
+    """`hit_matrix` of a text column, cached per results file and keyword list."""
+    import pandas as pd
+
+    def loader(path):
+        return pd.DataFrame(hit_matrix(df[column].tolist(), keywords, count=count))
+
+    if not cache:
+        return loader(results_path).to_numpy()
+    digest = hashlib.sha256("\n".join(keywords).encode("utf-8")).hexdigest()[:12]
+    key = f"hits.{column}.{'count' if count else 'match'}.{digest}"
+    return cached(results_path, loader, key=key).to_numpy()
+
+
+def ablations(table, group_by="keyword"):
+    """Names and keep masks of the ablations of a rule table.
+
+    The first ablation removes nothing (baseline). Each further one removes
+    all rules with the same value in the column `group_by`, or a single rule
+    if the table has no such column. Returns the names and a boolean array of
+    shape (ablations, rules).
+    """
+    import numpy as np
+
+    if group_by in table.columns:
+        groups = table[group_by].fillna(unanalyzed).astype(str)
+    else:
+        groups = table["keyword"].astype(str)
+    names = list(dict.fromkeys(groups))
+    keep = np.ones((len(names) + 1, len(table)), dtype=bool)
+    for v, name in enumerate(names, start=1):
+        keep[v] = (groups != name).to_numpy()
+    return [None] + names, keep
+
+
+def _labels(values):
+    """Unique labels in order of appearance and code of each value (-1 for NaN)."""
+    import numpy as np
+    import pandas as pd
+
+    codes, labels = pd.factorize(pd.Series(values), sort=False)
+    return list(labels), np.asarray(codes)
+
+
+def _onehot(codes, n):
+    import numpy as np
+
+    onehot = np.zeros((len(codes), n))
+    valid = codes >= 0
+    onehot[np.flatnonzero(valid), codes[valid]] = 1
+    return onehot
+
+
+def _pick(counter, candidates):
+    """Index of the largest positive counter among candidates, -1 if none.
+
+    Ties are broken by the order of the labels in the rule table.
+    """
+    import numpy as np
+
+    counter = np.where(candidates, counter, 0)
+    if counter.shape[-1] == 0:
+        # No labels on this level, e.g. no subcategory2 in the rule table
+        return np.full(counter.shape[:-1], -1)
+    best = counter.argmax(axis=-1)
+    found = np.take_along_axis(counter, best[..., None], axis=-1)[..., 0] > 0
+    return np.where(found, best, -1)
+
+
+def derive_categories(hits, categories_df, keep):
+    """`determine_category` for all ablations and articles at once.
+
+    `hits` holds the keyword counts of shape (articles, rules), `keep` the
+    masks of shape (ablations, rules). Returns arrays of shape (ablations,
+    articles) for category, subcategory and subcategory2, where missing
+    levels are "N/A" as in the results.
+    """
+    import numpy as np
+
+    cat_labels, cat = _labels(categories_df["category"])
+    sub_labels, sub = _labels(categories_df["subcategory"])
+    sub2_labels, sub2 = _labels(categories_df["subcategory2"])
+    n_cat, n_sub, n_sub2 = len(cat_labels), len(sub_labels), len(sub2_labels)
+
+    # Counters of each label as in count_category: the keyword counts summed
+    # over all kept rules with that label, shape (ablations, articles, labels)
+    def counter(codes, n):
+        weights = keep[:, :, None] * _onehot(codes, n)[None, :, :]
+        return np.einsum("nk,vkl->vnl", hits, weights, optimize=True)
+
+    cat_counter = counter(cat, n_cat)
+    sub_counter = counter(sub, n_sub)
+    sub2_counter = counter(sub2, n_sub2)
+
+    # Label combinations present in the kept rules of each ablation, shape
+    # (ablations, categories, subcategories[, subcategories2])
+    cat_onehot, sub_onehot = _onehot(cat, n_cat), _onehot(sub, n_sub)
+    sub_of_cat = np.einsum("vk,kc,ks->vcs", keep, cat_onehot, sub_onehot) > 0
+    sub2_of_sub = (
+        np.einsum(
+            "vk,kc,ks,kt->vcst", keep, cat_onehot, sub_onehot, _onehot(sub2, n_sub2)
+        )
+        > 0
+    )
+
+    ablation = np.arange(len(keep))[:, None]
+    best_cat = _pick(cat_counter, True)
+    best_sub = _pick(
+        sub_counter, sub_of_cat[ablation, best_cat] & (best_cat >= 0)[..., None]
+    )
+    best_sub2 = _pick(
+        sub2_counter,
+        sub2_of_sub[ablation, best_cat, best_sub]
+        & ((best_cat >= 0) & (best_sub >= 0))[..., None],
+    )
+
+    def names(best, labels, default):
+        # The default is appended, such that -1 selects it
+        return np.array(labels + [default], dtype=object)[best]
+
+    return (
+        names(best_cat, cat_labels, "other"),
+        names(best_sub, sub_labels, unanalyzed),
+        names(best_sub2, sub2_labels, unanalyzed),
+    )
+
+
+def derive_scores(hits, scores_df, keep, empty_category="closed access"):
+    """`score` for all ablations and articles at once.
+
+    `hits` marks the matching keywords, shape (articles, rules). Returns the
+    scores and score categories of shape (ablations, articles).
+    """
+    import numpy as np
+
+    values = (keep[:, None, :] * (hits[None, :, :] > 0)) * scores_df["score"].to_numpy(
+        dtype=float
+    )
+    best = values.argmax(axis=-1)
+    score = np.take_along_axis(values, best[..., None], axis=-1)[..., 0]
+    categories = scores_df["category"].to_numpy(dtype=object)[best]
+    return score, np.where(score > 0, categories, empty_category)
+
+
+def year_trend_deltas(years, classes):
+    """Percentages of the classes per year and their change to the baseline.
+
+    `classes` has shape (ablations, articles), the first ablation being the
+    baseline. Returns the class labels, the year labels, and the percentages
+    and deltas of shape (ablations, years, classes).
+    """
+    import numpy as np
+
+    year_labels, year = np.unique(years, return_inverse=True)
+    class_labels, cls = np.unique(classes.astype(str), return_inverse=True)
+    cls = cls.reshape(classes.shape)
+    n_var, n_year, n_cls = len(classes), len(year_labels), len(class_labels)
+    codes = (np.arange(n_var)[:, None] * n_year + year[None, :]) * n_cls + cls
+    counts = np.bincount(codes.ravel(), minlength=n_var * n_year * n_cls).reshape(
+        n_var, n_year, n_cls
+    )
+    total = counts.sum(axis=-1, keepdims=True)
+    percent = 100 * counts / np.where(total > 0, total, 1)
+    return list(class_labels), list(year_labels), percent, percent - percent[:1]
+
+
+def ablate(results_path, df, rule_tables, group_by="keyword", cache=True):
+    """Summary and year trend changes of all ablations of all rule tables.
+
+    `rule_tables` maps the names in `tables` to the rule data frames. Articles
+    which were not analyzed (e.g. editorials) keep their results and only
+    enter the denominators of the year trends.
+    """
+    import numpy as np
+    import pandas as pd
+
+    analyzed = (df["abstract"].notna() & (df["abstract"] != unanalyzed)).to_numpy()
+    articles = df[analyzed]
+    logging.info("%d of %d articles were analyzed", analyzed.sum(), len(df))
+
+    summary, trends = [], []
+    for name, rules in rule_tables.items():
+        column, result_columns, availability_map = tables[name]
+        count = name == "categories"
+        hits = cached_hits(
+            results_path,
+            articles,
+            column,
+            rules["keyword"].tolist(),
+            count=count,
+            cache=cache,
+        )
+        removed, keep = ablations(rules, group_by)
+        if count:
+            derived = derive_categories(hits, rules, keep)
+        else:
+            derived = derive_scores(hits, rules, keep)
+
+        # Check that the baseline reproduces the results file
+        for result_column, values in zip(result_columns, derived):
+            stored = articles[result_column].fillna(unanalyzed).to_numpy()
+            baseline = values[0]
+            if result_column.endswith("_score"):
+                mismatch = ~np.isclose(stored.astype(float), baseline.astype(float))
+            else:
+                mismatch = stored.astype(str) != baseline.astype(str)
+            if mismatch.any():
+                logging.warning(
+                    "%d articles differ from the results in %s: the rule table "
+                    "does not match the results",
+                    mismatch.sum(),
+                    result_column,
+                )
+
+        changed = np.zeros((len(keep), len(articles)), dtype=bool)
+        for values in derived:
+            changed |= values != values[:1]
+
+        # Year trend of the full results file
+        classes = df[result_columns[0]]
+        derived_classes = derived[0]
+        if availability_map is not None:
+            classes = classes.map(availability_map)
+            derived_classes = (
+                pd.Series(derived_classes.ravel())
+                .map(availability_map)
+                .to_numpy(dtype=object)
+                .reshape(derived_classes.shape)
+            )
+        classes = np.tile(classes.to_numpy(dtype=object), (len(keep), 1))
+        classes[:, analyzed] = derived_classes
+        class_labels, year_labels, percent, delta = year_trend_deltas(
+            df["year"].to_numpy(), classes
+        )
+
+        # Largest change of a year trend percentage per ablation
+        flat = delta.reshape(len(keep), -1)
+        largest = np.abs(flat).argmax(axis=1)
+        max_delta = flat[np.arange(len(keep)), largest]
+        moved = np.abs(max_delta) > 1e-9
+        year_idx, class_idx = np.unravel_index(largest, delta.shape[1:])
+        summary.append(
+            pd.DataFrame(
+                {
+                    "table": name,
+                    "removed": removed,
+                    "rules": len(rules) - keep.sum(axis=1),
+                    "changed_articles": changed.sum(axis=1),
+                    "max_delta": np.where(moved, max_delta, 0.0),
+                    "max_delta_year": np.where(
+                        moved, np.array(year_labels, dtype=object)[year_idx], None
+                    ),
+                    "max_delta_class": np.where(
+                        moved, np.array(class_labels, dtype=object)[class_idx], None
+                    ),
+                }
+            ).iloc[1:]
+        )
+
+        v, y, c = np.nonzero(np.abs(delta) > 1e-9)
+        trends.append(
+            pd.DataFrame(
+                {
+                    "table": name,
+                    "removed": np.array(removed, dtype=object)[v],
+                    "year": np.array(year_labels)[y],
+                    "class": np.array(class_labels)[c],
+                    "baseline": percent[0, y, c],
+                    "ablated": percent[v, y, c],
+                    "delta": delta[v, y, c],
+                }
+            )
+        )
+    return pd.concat(summary, ignore_index=True), pd.concat(trends, ignore_index=True)
+
+
+def main(args):
+    import pandas as pd
+
+    df = load_results(args.input, args.scheme)
+    rule_tables = {
+        name: pd.read_csv(path)
+        for name, path in [
+            ("categories", args.categories),
+            ("open_access", args.open_access),
+            ("data_availability", args.data_availability),
+        ]
+        if path is not None
+    }
+    summary, trends = ablate(
+        args.input, df, rule_tables, group_by=args.group_by, cache=not args.no_cache
+    )
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    summary.to_csv(f"{output}_summary.csv", index=False)
+    trends.round(4).to_csv(f"{output}_trends.csv", index=False)
+    logging.info("Wrote %d ablations to %s_summary.csv", len(summary), output)
+
+    ranked = summary.sort_values(
+        ["changed_articles", "rules"], ascending=[False, True], kind="stable"
+    )
+    print(ranked.head(args.top).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Keyword ablation of the category and scoring rule tables"
+    )
+    parser.add_argument(
+        "--input", "-i", type=str, required=True, help="analysis results CSV"
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        required=True,
+        help="Prefix of the summary and trend CSV files",
+    )
+    parser.add_argument(
+        "--scheme",
+        type=str,
+        help="Scheme of the categories, for results of several categories files",
+    )
+    parser.add_argument("--categories", "-c", help="categories CSV file")
+    parser.add_argument(
+        "--open_access", "-oa", help="open access availability CSV file"
+    )
+    parser.add_argument("--data_availability", "-da", help="data availability CSV file")
+    parser.add_argument(
+        "--group-by",
+        type=str,
+        default="keyword",
+        help="Remove all rules with the same value in this column at once, e.g. "
+        "subcategory (single rules for tables without this column)",
+    )
+    parser.add_argument(
+        "--top", type=int, default=20, help="Number of ablations printed"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Match the keywords again instead of using the cached hits",
+    )
+    args = parser.parse_args()
+    if not any([args.categories, args.open_access, args.data_availability]):
+        parser.error("Provide at least one rule table")
+    main(args)
@@ -0,0 +1,318 @@
+"""Local classification service.
+
+Keeps the rule tables, HTTP sessions and the article pages in memory, such
+that single articles are classified without starting the analysis again:
+
+    python service.py -c categories.csv -oa oa_scores.csv -da da_scores.csv
+
+    POST /classify/url    {"url": "https://link.springer.com/article/..."}
+    POST /classify/html   {"html": "<html>...</html>", "url": "..." (optional)}
+    POST /classify/batch  {"urls": [...]} and/or {"htmls": [...]}
+    GET  /stats           request latencies per endpoint
+    GET  /health
+
+Each classification returns the URL and the result columns (see
+`analysis.Rules.columns`, one set of category columns per categories file), as
+in a row of the results file, together with the latency of the request.
+Pages are kept in a bounded in-memory cache by URL; with --export and
+--cache, the recorded pages of a previous run are used as well.
+"""
+
+import argparse
+import collections
+import json
+import logging
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from analysis import (
+    Rules,
+    classify_page,
+    fetch_url,
+    parse_page,
+    rebase_url,
+)
+from springer_stub import recorded_pages
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# NOTE: requests is imported where needed.
+
+# Latencies kept per endpoint for the statistics
+latency_window = 1000
+
+
+def percentile(values, q):
+    """Nearest-rank percentile `q` (0 to 1) of sorted `values`."""
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class FetchError(Exception):
+    """An article page could not be fetched."""
+
+
+class Classifier:
+    """Rules and page cache shared by all request threads.
+
+    Each thread has its own HTTP session, as a requests.Session is not
+    thread-safe.
+
+    `pages` and `keys` are a page cache of a previous run and the keys of its
+    pages by URL path (see springer_stub.recorded_pages).
+    """
+
+    def __init__(
+        self,
+        rules,
+        pages=None,
+        keys=None,
+        base_url=None,
+        cache_size=1000,
+        fast_metadata=False,
+    ):
+        self.rules = rules
+        self.pages = pages
+        self.keys = keys or {}
+        self.base_url = base_url
+        self.cache_size = cache_size
+        self.fast_metadata = fast_metadata
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.recent = collections.OrderedDict()
+        self.latencies = collections.defaultdict(
+            lambda: collections.deque(maxlen=latency_window)
+        )
+        self.errors = collections.Counter()
+
+    def session(self):
+        import requests
+
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def page(self, url):
+        """HTML of `url` and whether it was fetched."""
+        path = urlsplit(url).path
+        with self.lock:
+            if url in self.recent:
+                self.recent.move_to_end(url)
+                return self.recent[url], False
+            # A page missing from the cache (e.g. deleted since the start) is
+            # fetched instead
+            html = self.pages.get(self.keys[path]) if path in self.keys else None
+            if html is not None:
+                return html, False
+        r = fetch_url(
+            url if self.base_url is None else rebase_url(url, self.base_url),
+            session=self.session(),
+        )
+        if r is None:
+            raise FetchError(f"Failed to fetch URL: {url}")
+        with self.lock:
+            self.recent[url] = r.text
+            if len(self.recent) > self.cache_size:
+                self.recent.popitem(last=False)
+        return r.text, True
+
+    def classify_html(self, html, url="", fetched=True):
+        fields = parse_page(None, url, html, fetched, fast_metadata=self.fast_metadata)
+        result = classify_page(fields, self.rules)
+        row = {"url": url}
+        for column, value in zip(result.columns, result.values()):
+            if column in self.rules.dtypes:
+                # Score types as in the results file, plain Python for JSON
+                dtype = self.rules.dtypes[column]
+                value = int(value) if dtype == "int64" else float(value)
+            row[column] = value
+        return row
+
+    def classify_url(self, url):
+        html, fetched = self.page(url)
+        return self.classify_html(html, url=url, fetched=fetched)
+
+    def classify_batch(self, urls=(), htmls=()):
+        rows = [self.classify_url(url) for url in urls]
+        return rows + [self.classify_html(html) for html in htmls]
+
+    def record(self, endpoint, seconds, failed=False):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if failed:
+                self.errors[endpoint] += 1
+
+    def stats(self):
+        """Count, failures and latency percentiles [ms] per endpoint."""
+        with self.lock:
+            latencies = {
+                name: sorted(values) for name, values in self.latencies.items()
+            }
+            errors = dict(self.errors)
+        stats = {}
+        for name, values in latencies.items():
+            stats[name] = {
+                "requests": len(values),
+                "errors": errors.get(name, 0),
+                "mean_ms": round(1000 * sum(values) / len(values), 1),
+                "p50_ms": round(1000 * percentile(values, 0.5), 1),
+                "p95_ms": round(1000 * percentile(values, 0.95), 1),
+                "max_ms": round(1000 * values[-1], 1),
+            }
+        return {"endpoints": stats, "cached_pages": len(self.recent)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    classifier = None
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self.respond(200, {"status": "ok"})
+        elif path == "/stats":
+            self.respond(200, self.classifier.stats())
+        else:
+            self.respond(404, {"error": f"Unknown endpoint: {path}"})
+
+    def do_POST(self):
+        endpoint = urlsplit(self.path).path
+        start = time.perf_counter()
+        status, body = 200, None
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if endpoint == "/classify/url":
+                body = self.classifier.classify_url(request["url"])
+            elif endpoint == "/classify/html":
+                body = self.classifier.classify_html(
+                    request["html"], url=request.get("url", "")
+                )
+            elif endpoint == "/classify/batch":
+                body = {
+                    "results": self.classifier.classify_batch(
+                        request.get("urls", []), request.get("htmls", [])
+                    )
+                }
+            else:
+                status, body = 404, {"error": f"Unknown endpoint: {endpoint}"}
+        except (KeyError, TypeError, ValueError) as e:
+            # Malformed requests and pages the analysis cannot classify
+            status, body = 400, {"error": f"{type(e).__name__}: {e}"}
+        except FetchError as e:
+            status, body = 502, {"error": str(e)}
+        except Exception as e:
+            logging.exception("Failed to answer %s", endpoint)
+            status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+        seconds = time.perf_counter() - start
+        if status != 404:
+            self.classifier.record(endpoint, seconds, failed=status != 200)
+        body["latency_ms"] = round(1000 * seconds, 1)
+        self.respond(status, body)
+
+    def respond(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(classifier, host="127.0.0.1", port=8100):
+    """Serve `classifier` until interrupted (Ctrl+C or SIGTERM)."""
+    signal.signal(signal.SIGTERM, interrupt)
+    handler = type("ServiceHandler", (Handler,), {"classifier": classifier})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    logging.info(
+        "Classifying on http://%s:%d (%d recorded pages)",
+        host,
+        server.server_address[1],
+        len(classifier.keys),
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logging.info("Latencies: %s", json.dumps(classifier.stats()["endpoints"]))
+
+
+def main(args):
+    from article_archive import open_cache
+
+    # Load the heavy dependencies before the first request
+    import bs4  # noqa: F401
+
+    rules = Rules.from_csv(args.categories, args.open_access, args.data_availability)
+    pages, keys = None, {}
+    if args.export:
+        pages = open_cache(args.cache or f"soups_{Path(args.export).stem}")
+        keys = recorded_pages(args.export, pages)
+    classifier = Classifier(
+        rules,
+        pages=pages,
+        keys=keys,
+        base_url=args.base_url,
+        cache_size=args.cache_size,
+        fast_metadata=args.fast_metadata,
+    )
+    serve(classifier, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Local service classifying single articles with warm caches"
+    )
+    parser.add_argument(
+        "--categories",
+        "-c",
+        required=True,
+        nargs="+",
+        help="categories CSV file, or several (see analysis.py)",
+    )
+    parser.add_argument(
+        "--open_access", "-oa", required=True, help="open access availability CSV file"
+    )
+    parser.add_argument(
+        "--data_availability", "-da", required=True, help="data availability CSV file"
+    )
+    parser.add_argument(
+        "--export", type=str, help="Springer export CSV of a previous run"
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        help="Page cache of the export: folder (default: soups_<export stem>) or "
+        "archive (.pack)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1000,
+        help="Number of fetched pages kept in memory",
+    )
+    parser.add_argument(
+        "--base-url",
+        help="Fetch from this scheme and host instead of the URLs' ones, e.g. "
+        "http://127.0.0.1:8000 for springer_stub.py",
+    )
+    parser.add_argument(
+        "--fast-metadata",
+        action="store_true",
+        help="Read article type, abstract and rights from the page head where "
+        "available, see analysis.py",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    main(parser.parse_args())
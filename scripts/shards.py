@@ -0,0 +1,180 @@
+"""Sharded execution of the analysis.
+
+The articles of an export are partitioned into N shards by a hash of their DOI
+(see analysis.py --shard i/N). Each shard can run in its own process or on
+another node sharing the filesystem; its output carries the row of each
+article in the export. The shard outputs are merged by row into one results
+file, which is byte-identical to the output of a single process.
+
+    run    Run all shards as local processes and merge their outputs.
+    merge  Merge the outputs of shards run elsewhere.
+
+All shards can share a folder page cache (one file per article), but not an
+archive (see article_archive.py): give each shard its own archive instead.
+"""
+
+import argparse
+import csv
+import hashlib
+import heapq
+import logging
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Column of the shard outputs with the row of the article in the export
+row_column = "row"
+
+
+def parse_shard(text):
+    """Shard index and number of shards of "i/N" (0 <= i < N)."""
+    try:
+        shard, shards = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must be given as i/N, got {text!r}")
+    if not 0 <= shard < shards:
+        raise ValueError(f"Shard index must be in [0, {shards}), got {shard}")
+    return shard, shards
+
+
+def shard_of(doi, shards):
+    """Shard of an article, stable across processes and machines."""
+    digest = hashlib.sha256(str(doi).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def select_shard(df, shard, shards):
+    """Articles of the shard, with their row in the export as first column."""
+    df = df.copy()
+    df.insert(0, row_column, range(len(df)))
+    return df[[shard_of(doi, shards) == shard for doi in df["doi"]]]
+
+
+def shard_path(output, shard, shards):
+    output = Path(output)
+    return output.parent / f"{output.stem}.shards" / f"shard-{shard}-of-{shards}.csv"
+
+
+def read_shard(path):
+    """Header and rows of a shard output, keyed by their row in the export."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        if header[0] != row_column:
+            raise ValueError(f"{path} is not a shard output (no {row_column} column)")
+        yield header[1:]
+        for record in reader:
+            yield int(record[0]), record[1:]
+
+
+def merge(paths, output):
+    """Merge shard outputs by row into `output`, as written by a single process.
+
+    The shards are streamed, such that only one record per shard is in memory.
+    """
+    readers = [read_shard(path) for path in paths]
+    headers = [next(reader) for reader in readers]
+    if any(header != headers[0] for header in headers):
+        raise ValueError("The shard outputs have different columns")
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    partial = output.with_name(output.name + ".part")
+    count = 0
+    with open(partial, "w", newline="", encoding="utf-8") as f:
+        # Same format as pandas.DataFrame.to_csv
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(headers[0])
+        for row, record in heapq.merge(*readers):
+            if row != count:
+                raise ValueError(
+                    f"Row {count} is missing or duplicated in the shard outputs"
+                )
+            writer.writerow(record)
+            count += 1
+    partial.replace(output)
+    logging.info("Merged %d articles of %d shards into %s", count, len(paths), output)
+    return count
+
+
+def run_shard(shard, shards, args, analysis_args):
+    path = shard_path(args.output, shard, shards)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    command = [
+        sys.executable,
+        str(Path(__file__).with_name("analysis.py")),
+        "--input",
+        args.input,
+        "--output",
+        str(path),
+        "--shard",
+        f"{shard}/{shards}",
+        *analysis_args,
+    ]
+    with open(path.with_suffix(".log"), "w", encoding="utf-8") as log:
+        result = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"Shard {shard}/{shards} failed, see {path.with_suffix('.log')}"
+        )
+    logging.info("Finished shard %d/%d", shard, shards)
+    return path
+
+
+def run_command(args, analysis_args):
+    with ThreadPoolExecutor(args.workers or args.shards) as executor:
+        paths = list(
+            executor.map(
+                lambda shard: run_shard(shard, args.shards, args, analysis_args),
+                range(args.shards),
+            )
+        )
+    merge(paths, args.output)
+
+
+def merge_command(args, analysis_args):
+    if analysis_args:
+        raise ValueError(f"Unknown arguments: {' '.join(analysis_args)}")
+    merge(args.shard_outputs, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the analysis in shards and merge the shard outputs",
+        allow_abbrev=False,
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # No short options and abbreviations, such that the arguments of
+    # analysis.py (e.g. -oa) are passed on unchanged
+    run_parser = subparsers.add_parser(
+        "run",
+        help="Run all shards locally; further arguments are passed to analysis.py",
+        allow_abbrev=False,
+    )
+    run_parser.add_argument("--input", required=True, help="input CSV file")
+    run_parser.add_argument("--output", required=True, help="output CSV file")
+    run_parser.add_argument(
+        "--shards", "-n", type=int, required=True, help="Number of shards"
+    )
+    run_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of shards run at the same time (default: all)",
+    )
+    run_parser.set_defaults(func=run_command)
+
+    merge_parser = subparsers.add_parser("merge", help="Merge shard outputs")
+    merge_parser.add_argument(
+        "shard_outputs", type=str, nargs="+", help="shard output CSV files"
+    )
+    merge_parser.add_argument(
+        "--output", "-o", required=True, help="merged output CSV file"
+    )
+    merge_parser.set_defaults(func=merge_command)
+
+    args, analysis_args = parser.parse_known_args()
+    args.func(args, analysis_args)
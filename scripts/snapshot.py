@@ -0,0 +1,88 @@
+"""Cached snapshots of slow-to-read tabular sources.
+
+Reading an Excel sheet through openpyxl is slow compared to loading a pickled
+data frame. A snapshot stores the loaded data frame together with the
+modification time, size and SHA-256 hash of the source. It is reused as long
+as the source is unchanged: if modification time and size match, the hash is
+not even computed; if only the modification time changed (e.g. after a copy),
+a matching hash revalidates the snapshot.
+
+Snapshots are stored outside the source tree, in the user cache folder
+($XDG_CACHE_HOME or ~/.cache), under the name of the source and a hash of its
+absolute path.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+# NOTE: pandas is imported where needed.
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 hash of a file."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def default_cache_folder():
+    """Folder of the snapshots in the user cache folder."""
+    root = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(root) / "paper_data_availability" / "snapshots"
+
+
+def snapshot_paths(path, key, cache_folder=None):
+    """Data and metadata file of the snapshot of `path` for `key`."""
+    path = Path(path)
+    if cache_folder is None:
+        cache_folder = default_cache_folder()
+    source = hashlib.sha256(str(path.resolve()).encode("utf-8")).hexdigest()[:12]
+    stem = f"{path.stem}.{source}.{key}"
+    return Path(cache_folder) / f"{stem}.pkl", Path(cache_folder) / f"{stem}.json"
+
+
+def cached(path, loader, key="default", cache_folder=None):
+    """Return `loader(path)`, using a snapshot if `path` did not change.
+
+    `key` distinguishes several snapshots of the same source, e.g. the sheets
+    of a workbook.
+    """
+    import pandas as pd
+
+    path = Path(path)
+    data_path, meta_path = snapshot_paths(path, key, cache_folder)
+    stat = path.stat()
+    meta = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    if data_path.exists() and meta_path.exists():
+        stored = json.loads(meta_path.read_text())
+        if stored["size"] == meta["size"] and stored["mtime_ns"] == meta["mtime_ns"]:
+            return pd.read_pickle(data_path)
+        if stored["size"] == meta["size"] and stored["sha256"] == file_hash(path):
+            # Touched but unchanged, e.g., after copying between machines
+            meta_path.write_text(json.dumps({**meta, "sha256": stored["sha256"]}))
+            return pd.read_pickle(data_path)
+
+    data = loader(path)
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    data.to_pickle(data_path)
+    meta_path.write_text(json.dumps({**meta, "sha256": file_hash(path)}))
+    logging.info("Wrote snapshot of %s to %s", path, data_path)
+    return data
+
+
+def read_excel_cached(path, sheet_name, cache_folder=None, cache=True):
+    """`pd.read_excel(path, sheet_name=sheet_name)` through a snapshot."""
+    import pandas as pd
+
+    def loader(path):
+        return pd.read_excel(path, sheet_name=sheet_name)
+
+    if not cache:
+        return loader(path)
+    return cached(path, loader, key=sheet_name, cache_folder=cache_folder)
@@ -0,0 +1,311 @@
+"""Local stand-in for link.springer.com.
+
+Serves recorded article pages (the cached pages of a previous run, see
+analysis.py) or synthetic article pages by URL path, such that the analysis can
+be run end-to-end without network access:
+
+    python springer_stub.py --export export.csv --cache-folder soups_export
+    python analysis.py -i export.csv ... --base-url http://127.0.0.1:8000
+
+Latency, error rate, rate limiting (429) and bandwidth are configurable to
+test the fetching behavior and to measure the fetch throughput reproducibly.
+Each request is answered in its own thread; the number of requests served,
+the status codes and the maximum number of concurrent requests are logged on
+shutdown.
+"""
+
+import argparse
+import collections
+import csv
+import hashlib
+import html
+import json
+import logging
+import random
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from article_archive import open_cache
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Building blocks of the synthetic pages
+synthetic_topics = [
+    "micro-CT imaging of sandstone",
+    "X-ray tomography of the pore space",
+    "numerical simulation with a finite element solver",
+    "pore network model",
+    "lattice Boltzmann simulation",
+    "linear stability analysis",
+    "machine learning",
+    "experimental core flooding",
+]
+synthetic_data_statements = [
+    "The data are available on Zenodo at https://zenodo.org/record/1.",
+    "Data are available from the corresponding author on reasonable request.",
+    "The code is available on GitHub.",
+    "Not applicable.",
+    "",
+]
+synthetic_rights = [
+    "This article is licensed under a Creative Commons Attribution 4.0 "
+    "International License, which permits use in any medium (open access).",
+    "Reprints and permissions",
+]
+
+
+def recorded_pages(export_csv, cache):
+    """Map the URL path of each article of an export to its key in `cache`."""
+    keys = set(cache.keys())
+    pages = {}
+    with open(export_csv, newline="", encoding="utf-8") as f:
+        for idx, row in enumerate(csv.DictReader(f)):
+            url = row.get("URL") or row.get("url")
+            if url and idx in keys:
+                pages[urlsplit(url).path] = idx
+    return pages
+
+
+def synthetic_page(path):
+    """Article page with the structure of a Springer page, fixed per URL path."""
+    rng = random.Random(hashlib.sha256(path.encode("utf-8")).digest())
+    article_type = "OriginalPaper" if rng.random() > 0.05 else "Editorial"
+    abstract = " and ".join(rng.sample(synthetic_topics, 2)) + "."
+    sections = [("Abstract", abstract)]
+    statement = rng.choice(synthetic_data_statements)
+    if statement:
+        sections.append(("Data Availability", statement))
+    sections.append(("Rights and permissions", rng.choice(synthetic_rights)))
+    body = "".join(
+        f'<section data-title="{title}"><h2>{title}</h2><p>{text}</p></section>'
+        for title, text in sections
+    )
+    # Head metadata as on Springer pages, see analysis.head_metadata
+    rights = sections[-1][1]
+    json_ld = {
+        "@context": "https://schema.org",
+        "mainEntity": {
+            "@type": "ScholarlyArticle",
+            "description": abstract,
+            "isAccessibleForFree": "open access" in rights,
+        },
+    }
+    return (
+        "<!DOCTYPE html><html><head>"
+        f'<meta name="dc.type" content="{article_type}"/>'
+        f'<meta name="citation_abstract" content="{html.escape(abstract)}"/>'
+        f'<script type="application/ld+json">{json.dumps(json_ld)}</script>'
+        f"<title>{path}</title></head><body>{body}</body></html>"
+    )
+
+
+class Stub:
+    """Pages and failure behavior shared by all request threads."""
+
+    def __init__(
+        self,
+        pages,
+        cache=None,
+        synthetic=False,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        rate_limit=None,
+        bandwidth=None,
+        seed=0,
+    ):
+        self.pages = pages
+        self.cache = cache
+        self.synthetic = synthetic
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.bandwidth = bandwidth
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent = collections.deque()
+        self.statuses = collections.Counter()
+        self.bytes_sent = 0
+        self.active = 0
+        self.max_active = 0
+
+    def page(self, path):
+        """Body of the page at `path`, or None (404)."""
+        if path in self.pages:
+            # The page of a recorded article can be missing from the cache
+            html = self.cache.get(self.pages[path])
+            return None if html is None else html.encode("utf-8")
+        if self.synthetic:
+            return synthetic_page(path).encode("utf-8")
+        return None
+
+    def admit(self):
+        """Status of the next request: 200, 429 (rate limit) or 500 (error)."""
+        with self.lock:
+            now = time.monotonic()
+            if self.rate_limit is not None:
+                while self.recent and now - self.recent[0] > 1:
+                    self.recent.popleft()
+                if len(self.recent) >= self.rate_limit:
+                    return 429
+                self.recent.append(now)
+            if self.rng.random() < self.error_rate:
+                return 500
+            return 200
+
+    def delay(self):
+        with self.lock:
+            jitter = self.rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency + jitter)
+
+    def summary(self):
+        return (
+            f"{sum(self.statuses.values())} requests "
+            f"({', '.join(f'{s}: {n}' for s, n in sorted(self.statuses.items()))}), "
+            f"{self.bytes_sent / 2**20:.1f} MB sent, "
+            f"at most {self.max_active} concurrent"
+        )
+
+
+class Handler(BaseHTTPRequestHandler):
+    stub = None
+
+    def do_GET(self):
+        stub = self.stub
+        with stub.lock:
+            stub.active += 1
+            stub.max_active = max(stub.max_active, stub.active)
+        status = 500
+        try:
+            time.sleep(stub.delay())
+            status = stub.admit()
+            body = stub.page(urlsplit(self.path).path) if status == 200 else None
+            if status == 200 and body is None:
+                status = 404
+            self.respond(status, body)
+        finally:
+            with stub.lock:
+                stub.active -= 1
+                stub.statuses[status] += 1
+
+    def respond(self, status, body):
+        if body is None:
+            body = f"<html><body>{status}</body></html>".encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        if self.stub.bandwidth is None:
+            self.wfile.write(body)
+        else:
+            # Throttle the transfer to the given bytes per second
+            chunk = max(1, int(self.stub.bandwidth) // 20)
+            for start in range(0, len(body), chunk):
+                self.wfile.write(body[start : start + chunk])
+                time.sleep(len(body[start : start + chunk]) / self.stub.bandwidth)
+        with self.stub.lock:
+            self.stub.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(stub, host="127.0.0.1", port=8000):
+    """Serve `stub` until interrupted (Ctrl+C or SIGTERM)."""
+    signal.signal(signal.SIGTERM, interrupt)
+    handler = type("StubHandler", (Handler,), {"stub": stub})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    logging.info(
+        "Serving %d recorded%s pages on http://%s:%d",
+        len(stub.pages),
+        " and synthetic" if stub.synthetic else "",
+        host,
+        server.server_address[1],
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logging.info("Served %s", stub.summary())
+
+
+def main(args):
+    pages, cache = {}, None
+    if args.export:
+        cache = open_cache(args.cache_folder or f"soups_{Path(args.export).stem}")
+        pages = recorded_pages(args.export, cache)
+    if not pages and not args.synthetic:
+        raise ValueError("No recorded pages found, provide --export or --synthetic")
+    stub = Stub(
+        pages,
+        cache=cache,
+        synthetic=args.synthetic,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        bandwidth=args.bandwidth,
+        seed=args.seed,
+    )
+    serve(stub, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Local stand-in server replaying recorded or synthetic articles"
+    )
+    parser.add_argument(
+        "--export", type=str, help="Springer export CSV of the recorded articles"
+    )
+    parser.add_argument(
+        "--cache-folder",
+        type=str,
+        help="Page cache of the recorded pages: folder (default: soups_<export "
+        "stem>) or archive (.pack)",
+    )
+    parser.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="Answer unknown URLs with synthetic article pages instead of 404",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Response delay in seconds"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="Uniform random variation of the delay in seconds",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with 500",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        help="Requests per second, further requests are answered with 429",
+    )
+    parser.add_argument(
+        "--bandwidth", type=float, help="Transfer rate per response in bytes/s"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,183 @@
+"""Measure the cold start of the command line entry points.
+
+Each entry point is started in a fresh interpreter with `-X importtime`. The
+total import time, the wall time and the heavy dependencies imported on the
+way are reported. The script exits with a non-zero status if an entry point
+exceeds the import time budget or imports a heavy dependency it should not
+need on the measured code path.
+
+Runs on prepared input are measured the same way, without import time budget:
+they fail if they import a heavy dependency beyond the ones they need, e.g.
+requests in an analysis run whose pages are all in the page cache.
+"""
+
+import argparse
+import csv
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+scripts_folder = Path(__file__).resolve().parent
+repo_folder = scripts_folder.parent
+
+heavy_modules = ["pandas", "numpy", "matplotlib", "seaborn", "bs4", "requests"]
+
+# Measured code paths: arguments passed to the script
+entry_points = {
+    "analysis": ["analysis.py", "--help"],
+    "plotting": ["plotting.py", "--help"],
+    "visualization": ["visualization.py", "--help"],
+    "robustness_check": ["robustness_check.py", "--help"],
+    "report": ["report.py", "--help"],
+    "compare": ["compare.py", "--help"],
+    "cited_works_analysis": ["cited_works_analysis.py", "--help"],
+    "robustness_harness": ["robustness_harness.py", "--help"],
+    "confidence": ["confidence.py", "--help"],
+    "sensitivity": ["sensitivity.py", "--help"],
+    "search_index": ["search_index.py", "--help"],
+    "springer_stub": ["springer_stub.py", "--help"],
+    "article_archive": ["article_archive.py", "--help"],
+    "shards": ["shards.py", "--help"],
+    "link_health": ["link_health.py", "--help"],
+    "service": ["service.py", "--help"],
+    "estimate": ["estimate.py", "--help"],
+    "review_server": ["review_server.py", "--help"],
+    "work_queue": ["work_queue.py", "--help"],
+}
+
+
+def analysis_warm_cache(folder, articles=20):
+    """Arguments of an analysis of `articles` articles of TiPM whose pages are
+    all in the page cache (synthetic pages, see springer_stub.py)."""
+    from urllib.parse import urlsplit
+
+    from article_archive import open_cache
+    from springer_stub import synthetic_page
+
+    folder = Path(folder)
+    export = folder / "export.csv"
+    with open(repo_folder / "database" / "TiPM.csv", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        rows = [next(reader) for _ in range(articles + 1)]
+    with open(export, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+    pages = open_cache(folder / "soups_export")
+    url_column = rows[0].index("URL")
+    for idx, row in enumerate(rows[1:]):
+        pages.put(idx, synthetic_page(urlsplit(row[url_column]).path))
+    pages.close()
+    categories = repo_folder / "categories"
+    return [
+        "analysis.py",
+        *["-i", str(export), "-o", str(folder / "results.csv")],
+        *["-c", str(categories / "categories_imaging_vs_simulation.csv")],
+        *["-oa", str(categories / "oa_scores.csv")],
+        *["-da", str(categories / "da_scores.csv")],
+        *["--cache", str(folder / "soups_export")],
+    ]
+
+
+# Measured runs: heavy dependencies they need, and a function preparing the
+# input in a folder and returning the arguments passed to the script
+runs = {
+    "analysis_warm_cache": (["pandas", "numpy", "bs4"], analysis_warm_cache),
+}
+
+
+def parse_importtime(stderr):
+    """Total self import time [us] and top-level packages from -X importtime."""
+    total = 0
+    packages = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        total += int(self_us)
+        packages.add(name.strip().split(".")[0])
+    return total, packages
+
+
+def measure(arguments, repeat=3):
+    """Best of `repeat` cold starts of `python -X importtime <arguments>`."""
+    best = None
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime"] + arguments,
+            cwd=scripts_folder,
+            capture_output=True,
+            text=True,
+        )
+        wall = time.perf_counter() - tic
+        import_us, packages = parse_importtime(result.stderr)
+        if best is None or wall < best["wall"]:
+            best = {
+                "wall": wall,
+                "import_us": import_us,
+                "heavy": sorted(set(heavy_modules) & packages),
+                "returncode": result.returncode,
+            }
+    return best
+
+
+def report(label, result, ok):
+    print(
+        f"{'ok  ' if ok else 'FAIL'} {label:35s}"
+        f" wall {1000 * result['wall']:7.1f} ms"
+        f" | imports {result['import_us'] / 1000:7.1f} ms"
+        f" | heavy: {', '.join(result['heavy']) or '-'}"
+    )
+
+
+def main(args):
+    failed = False
+    for name in args.entry_points:
+        result = measure(entry_points[name], repeat=args.repeat)
+        over_budget = result["import_us"] / 1000 > args.budget_ms
+        ok = result["returncode"] == 0 and not over_budget and not result["heavy"]
+        failed |= not ok
+        report(" ".join(entry_points[name]), result, ok)
+    for name in args.runs:
+        needed, prepare = runs[name]
+        with tempfile.TemporaryDirectory() as folder:
+            result = measure(prepare(folder), repeat=args.repeat)
+        ok = result["returncode"] == 0 and set(result["heavy"]) <= set(needed)
+        failed |= not ok
+        report(name, result, ok)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the cold start time of the command line entry points"
+    )
+    parser.add_argument(
+        "--entry-points",
+        "-e",
+        nargs="+",
+        choices=list(entry_points),
+        default=list(entry_points),
+        help="Entry points to measure",
+    )
+    parser.add_argument(
+        "--runs",
+        nargs="*",
+        choices=list(runs),
+        default=list(runs),
+        help="Runs on prepared input to measure",
+    )
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=100,
+        help="Import time budget per entry point in milliseconds",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of cold starts per entry point, the fastest one is reported",
+    )
+    main(parser.parse_args())
@@ -0,0 +1,163 @@
+"""Progress and throughput of long analysis runs.
+
+`Progress` counts the articles, cache hits, fetched bytes, failures and the
+time spent fetching, parsing and classifying. Every few seconds it logs a
+progress line with the rate and the estimated time left and, if a metrics file
+is given, replaces that file with the current values: JSON, or the Prometheus
+text format if the file name ends with ".prom" (e.g. for the textfile
+collector of the node exporter). The file is replaced atomically, such that a
+scraper never reads a partial file.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+# Name, type and help of the metrics in the Prometheus text format
+metrics = {
+    "articles_total": ("gauge", "Articles to analyze"),
+    "articles_done": ("counter", "Articles analyzed"),
+    "cache_hits": ("counter", "Pages read from the page cache"),
+    "cache_misses": ("counter", "Pages fetched"),
+    "fetch_failures": ("counter", "Failed page requests"),
+    "fetched_bytes": ("counter", "Bytes of the fetched pages"),
+    "fetch_seconds": ("counter", "Time spent fetching pages"),
+    "parse_seconds": ("counter", "Time spent parsing pages"),
+    "classify_seconds": ("counter", "Time spent classifying the parsed pages"),
+    "elapsed_seconds": ("gauge", "Time since the start of the run"),
+    "articles_per_second": ("gauge", "Articles analyzed per second"),
+    "eta_seconds": ("gauge", "Estimated time until all articles are analyzed"),
+    "finished": ("gauge", "1 if the run finished, 0 while running or failed"),
+}
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def write_atomic(path, text):
+    """Replace the file at `path` with `text` at once."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f".{path.name}.tmp")
+    partial.write_text(text, encoding="utf-8")
+    os.replace(partial, path)
+
+
+def prometheus_text(values, prefix="analysis"):
+    lines = []
+    for name, (kind, description) in metrics.items():
+        value = values[name]
+        if value is None:
+            continue
+        lines.append(f"# HELP {prefix}_{name} {description}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        lines.append(f"{prefix}_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class Progress:
+    """Progress of a run over `total` articles.
+
+    `fetch` is the `analysis.FetchStats` of the run, which holds the fetch
+    time, bytes and failures. If `pipeline` is set (see pipeline.py), the
+    occupancy of its stages is logged with each progress line.
+    """
+
+    def __init__(self, total, fetch, metrics_path=None, interval=10.0):
+        self.total = total
+        self.fetch = fetch
+        self.metrics_path = metrics_path
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.done = 0
+        self.cache_hits = 0
+        self.parse_seconds = 0.0
+        self.classify_seconds = 0.0
+        self.finished = False
+        self.pipeline = None
+        # Counts are updated from the worker threads of the pipeline
+        self.lock = threading.Lock()
+
+    def cache_hit(self):
+        with self.lock:
+            self.cache_hits += 1
+
+    def parsed(self, seconds):
+        with self.lock:
+            self.parse_seconds += seconds
+
+    def classified(self, seconds):
+        with self.lock:
+            self.classify_seconds += seconds
+
+    def article_done(self):
+        self.done += 1
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def values(self):
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else None
+        return {
+            "articles_total": self.total,
+            "articles_done": self.done,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.fetch.requests,
+            "fetch_failures": self.fetch.failures,
+            "fetched_bytes": self.fetch.bytes,
+            "fetch_seconds": round(self.fetch.seconds, 3),
+            "parse_seconds": round(self.parse_seconds, 3),
+            "classify_seconds": round(self.classify_seconds, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "articles_per_second": round(rate, 3),
+            "eta_seconds": None if eta is None else round(eta, 1),
+            "finished": int(self.finished),
+        }
+
+    def report(self):
+        values = self.values()
+        lookups = values["cache_hits"] + values["cache_misses"]
+        logging.info(
+            "Progress: %d/%d articles (%.1f%%), %.2f articles/s, ETA %s | "
+            "fetch %.1f s, parse %.1f s, classify %.1f s | cache hits %.0f%% | %.1f MB fetched, "
+            "%d failures",
+            values["articles_done"],
+            values["articles_total"],
+            100 * values["articles_done"] / max(values["articles_total"], 1),
+            values["articles_per_second"],
+            format_duration(values["eta_seconds"]),
+            values["fetch_seconds"],
+            values["parse_seconds"],
+            values["classify_seconds"],
+            100 * values["cache_hits"] / max(lookups, 1),
+            values["fetched_bytes"] / 2**20,
+            values["fetch_failures"],
+        )
+        if self.pipeline is not None:
+            logging.info("Pipeline: %s", self.pipeline.summary())
+        if self.metrics_path is not None:
+            self.write_metrics(values)
+
+    def write_metrics(self, values):
+        if str(self.metrics_path).endswith(".prom"):
+            text = prometheus_text(values)
+        else:
+            text = json.dumps({"timestamp": time.time(), **values}, indent=2)
+        write_atomic(self.metrics_path, text)
+
+    def close(self, finished=True):
+        """Report the final values; `finished` is False if the run failed."""
+        self.finished = finished
+        self.report()
@@ -1,39 +1,37 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-
+from pathlib import Path
 import argparse
 
-parser = argparse.ArgumentParser(description="Visualize article analysis results")
-parser.add_argument(
-    "--input",
-    "-i",
-    type=str,
-    default="tipm_analysis.csv",
-    help="Path to the input CSV file",
-)
-args = parser.parse_args()
-
-df = pd.read_csv(args.input)
-
-# Display the categories
-df_by_category = df.groupby("category")
-category_counts = df_by_category.size()
-plt.figure("Category distribution")
-plt.pie(category_counts, labels=category_counts.index, autopct="%1.1f%%")
-plt.title("Category Distribution")
-plt.show()
-
-# Display the subcategories
-df_by_subcategory = df.groupby("subcategory")
-subcategory_counts = df_by_subcategory.size()
-plt.figure("Subcategory distribution")
-plt.pie(subcategory_counts, labels=subcategory_counts.index, autopct="%1.1f%%")
-plt.title("Subcategory Distribution")
-plt.show()
+from plotting import finish, load_results, save_figures, use_batch_backend
+
+# Names of the figures drawn by statistics_over_time, in order
+statistics_names = [
+    "total_counts",
+    "paper_availability_counts",
+    "data_availability_counts",
+    "paper_availability",
+    "data_availability",
+]
+
+
+def distribution(df, column, title):
+    """Pie chart of the number of articles per entry of `column`."""
+    import matplotlib.pyplot as plt
+
+    counts = df.groupby(column).size()
+    fig = plt.figure()
+    plt.pie(counts, labels=counts.index, autopct="%1.1f%%")
+    plt.title(title)
+    return fig
 
 
 def statistics_over_time(df, column, entries):
+    """Absolute and relative availability per year, one bar per entry.
+
+    Returns the list of figures.
+    """
+    import numpy as np
+    import matplotlib.pyplot as plt
+
     num_entries = len(entries)
     # Use intuitive colors for open, conditional, closed
     # Open: green, Conditional: orange, Closed: red
@@ -105,7 +103,7 @@ def statistics_over_time(df, column, entries):
     )[:-1]
 
     # Additional plot: Total article counts over the years (no availability info)
-    plt.figure("Total Article Counts Over Time")
+    fig1 = plt.figure()
     for idx, entry in enumerate(entries):
         plt.bar(
             x + displacement[idx],
@@ -118,9 +116,8 @@ def statistics_over_time(df, column, entries):
     plt.title("Total Article Counts Over Time")
     plt.legend(loc="upper left", bbox_to_anchor=(1, 1))
     plt.tight_layout()
-    plt.show()
 
-    plt.figure("Open vs closed access over time (stacked bar)")
+    fig2 = plt.figure()
 
     for idx, entry in enumerate(entries):
         if entry not in total_counts:
@@ -147,11 +144,10 @@ def statistics_over_time(df, column, entries):
     plt.legend(loc="upper left", bbox_to_anchor=(1, 1))
     plt.title("Open vs Closed Access Over Time (Stacked Bar)")
     plt.tight_layout()
-    plt.show()
 
     # Additional plot: Data availability (open, conditional, closed) over time,
     # split by category
-    plt.figure("Data availability over time (stacked bar)")
+    fig3 = plt.figure()
     width = 0.6
     x = np.arange(len(years))
 
@@ -192,10 +188,9 @@ def statistics_over_time(df, column, entries):
     plt.legend(loc="upper left", bbox_to_anchor=(1, 1))
     plt.title("Data Availability Over Time (Stacked Bar)")
     plt.tight_layout()
-    plt.show()
 
     # Additional plot: Article availability (open, closed) over time, relative to total counts (percent)
-    plt.figure("Relative Article availability over time (stacked bar, %)")
+    fig4 = plt.figure()
     for idx, entry in enumerate(entries):
         if entry not in total_counts:
             continue
@@ -231,11 +226,10 @@ def statistics_over_time(df, column, entries):
     plt.title("Relative Article Availability Over Time (Stacked Bar, %)")
     plt.ylim(0, 100)
     plt.tight_layout()
-    plt.show()
 
     # Additional plot: Data availability (open, conditional, closed) over time,
     # split by category, relative to total counts (percent)
-    plt.figure("Relative Data availability over time (stacked bar, %)")
+    fig5 = plt.figure()
     for idx, entry in enumerate(entries):
         if entry not in total_counts:
             continue
@@ -280,21 +274,78 @@ def statistics_over_time(df, column, entries):
     plt.title("Relative Data Availability Over Time (Stacked Bar, %)")
     plt.ylim(0, 100)
     plt.tight_layout()
-    plt.show()
-
-
-statistics_over_time(
-    df,
-    "category",
-    ["computational", "experimental"],  # , "other", "theoretical"]
-)
-statistics_over_time(
-    df,
-    "subcategory",
-    ["simulation", "imaging"],  # , "computational", "experimental", "ml"]
-)
-# statistics_over_time(
-#    df,
-#    "subcategory2",
-#    ["pde", "simulation"],  # , "computational", "experimental", "ml"]
-# )
+
+    return [fig1, fig2, fig3, fig4, fig5]
+
+
+def all_figures(df):
+    """Draw all figures for an analysis results data frame.
+
+    Returns a dict mapping the figure name (used as filename suffix) to the
+    figure.
+    """
+    figures = {
+        "category_distribution": distribution(df, "category", "Category Distribution"),
+        "subcategory_distribution": distribution(
+            df, "subcategory", "Subcategory Distribution"
+        ),
+    }
+    for column, entries in [
+        ("category", ["computational", "experimental"]),  # , "other", "theoretical"]
+        ("subcategory", ["simulation", "imaging"]),  # , "computational", "ml"]
+    ]:
+        figures.update(
+            zip(
+                [f"{column}_{name}" for name in statistics_names],
+                statistics_over_time(df, column, entries),
+            )
+        )
+    # statistics_over_time(
+    #    df,
+    #    "subcategory2",
+    #    ["pde", "simulation"],  # , "computational", "experimental", "ml"]
+    # )
+    return figures
+
+
+def main(args):
+    if args.batch:
+        use_batch_backend()
+
+    input_path = Path(args.input)
+    output_folder = input_path.parent if args.output is None else Path(args.output)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    df = load_results(input_path, args.scheme)
+    figures = all_figures(df)
+    stem = f"{input_path.stem}_visualization"
+    paths = save_figures(figures, output_folder, stem, close=args.batch)
+    finish(paths, output_folder / f"{stem}_manifest.json", args.batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Visualize article analysis results")
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=str,
+        default="tipm_analysis.csv",
+        help="Path to the input CSV file",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default=None,
+        help="Folder for the figures, defaults to the folder of the input file",
+    )
+    parser.add_argument(
+        "--scheme",
+        type=str,
+        help="Scheme of the categories, for results of several categories files",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Only render to files (no GUI) and print a manifest of the outputs",
+    )
+    main(parser.parse_args())
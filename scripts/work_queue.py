@@ -0,0 +1,697 @@
+"""Separate fetching and analysis of exports through a persistent work queue.
+
+Downloading is bound by the network and the politeness towards the publisher,
+the analysis by the CPU. Both share a work queue in an SQLite file and the page
+caches of the exports, such that they can run at different times, on different
+machines (with the queue and the caches on a shared filesystem) or at the same
+time:
+
+    fetch    Fill the page caches of one or more exports.
+    analyze  Analyze the cached pages, without any network access, and write
+             the results file of each export once all its articles are done.
+    status   Number of articles per state of each export.
+
+Exports are identified by their file stem. Each article of an export is queued
+once, keyed by its row in the export as in the page cache of analysis.py;
+articles whose page is already cached are queued for the analysis right away.
+Workers lease a batch of articles at a time: the state of each article is
+committed as soon as it is done, such that an interrupted command continues
+where it stopped, and the articles leased by a crashed worker are leased again
+once their lease expires. Any number of fetch and analyze commands can run
+concurrently; analyze waits for the articles which are still being fetched.
+Each result is stored with a digest of the rule tables it was classified with;
+analyze refuses to combine results of other rule tables unless --reanalyze is
+given. A folder cache can be shared by several fetch commands, an archive
+(.pack) only by one (see article_archive.py).
+
+analysis.py -i ... -o ... still fetches and analyzes in one run.
+"""
+
+import argparse
+import collections
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from analysis import (
+    FetchStats,
+    Rules,
+    fetch_url,
+    normalize_export,
+    parse_page,
+    rebase_url,
+    result_type,
+    results_frame,
+    unanalyzed_result,
+)
+from article_archive import open_cache
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# NOTE: pandas and bs4 are imported where needed.
+
+# States of an article in the queue
+FETCH = "fetch"
+FETCHING = "fetching"
+FETCHED = "fetched"
+ANALYZING = "analyzing"
+ANALYZED = "analyzed"
+FETCH_FAILED = "fetch_failed"
+ANALYZE_FAILED = "analyze_failed"
+states = [FETCH, FETCHING, FETCHED, ANALYZING, ANALYZED, FETCH_FAILED, ANALYZE_FAILED]
+
+# State of the articles leased by a worker, by the state they are leased from
+leased_states = {FETCH: FETCHING, FETCHED: ANALYZING}
+
+# States of the articles of an export which are not done yet
+open_states = [FETCH, FETCHING, FETCHED, ANALYZING]
+
+schema = """
+CREATE TABLE IF NOT EXISTS exports (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    cache TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS articles (
+    export TEXT NOT NULL,
+    key INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    error TEXT,
+    result TEXT,
+    rules TEXT,
+    PRIMARY KEY (export, key)
+);
+CREATE INDEX IF NOT EXISTS articles_state ON articles (state, export);
+"""
+
+
+def connect(path):
+    """Open (and create if needed) the queue at `path`."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    # Transactions are explicit, see `transaction`
+    connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(schema)
+    return connection
+
+
+@contextlib.contextmanager
+def transaction(connection):
+    """Write transaction, holding the lock of the queue from its start."""
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+def worker_name():
+    """Name of this process in the leases, unique across machines."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def add_export(connection, path, cache=None):
+    """Queue the articles of the export at `path` unless it is queued already.
+
+    The page cache defaults to soups_<export stem>, as in analysis.py. Returns
+    the name of the export (its stem), the path and the page cache as queued.
+    """
+    import pandas as pd
+
+    name = Path(path).stem
+    queued = connection.execute(
+        "SELECT path, cache FROM exports WHERE name = ?", (name,)
+    ).fetchone()
+    if queued is not None:
+        if cache is not None and str(cache) != queued[1]:
+            logging.warning("%s is queued with the page cache %s", name, queued[1])
+        return name, *queued
+
+    cache = str(cache or f"soups_{name}")
+    df = normalize_export(pd.read_csv(path, dtype=str))
+    pages = open_cache(cache)
+    cached = set(pages.keys())
+    pages.close()
+    with transaction(connection):
+        connection.execute(
+            "INSERT OR IGNORE INTO exports (name, path, cache) VALUES (?, ?, ?)",
+            (name, str(path), cache),
+        )
+        connection.executemany(
+            "INSERT OR IGNORE INTO articles (export, key, url, state) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (name, int(key), url, FETCHED if key in cached else FETCH)
+                for key, url in zip(df.index, df["url"])
+            ],
+        )
+    logging.info(
+        "Queued %d articles of %s (%d cached)",
+        len(df),
+        name,
+        len(cached & set(df.index)),
+    )
+    return name, str(path), cache
+
+
+def claim(connection, names, state, worker, count, lease):
+    """Lease up to `count` articles of the exports `names` in `state` to `worker`.
+
+    Articles whose lease of a crashed worker has expired are leased again,
+    articles with failed attempts last. Returns a list of (export, key, url).
+    """
+    leased = leased_states[state]
+    now = time.time()
+    marks = ", ".join("?" for _ in names)
+    with transaction(connection):
+        rows = connection.execute(
+            f"SELECT export, key, url FROM articles WHERE export IN ({marks}) "
+            "AND (state = ? OR (state = ? AND lease_until < ?)) "
+            "ORDER BY attempts, export, key LIMIT ?",
+            (*names, state, leased, now, count),
+        ).fetchall()
+        connection.executemany(
+            "UPDATE articles SET state = ?, worker = ?, lease_until = ? "
+            "WHERE export = ? AND key = ?",
+            [(leased, worker, now + lease, export, key) for export, key, _ in rows],
+        )
+    return rows
+
+
+def finish(connection, export, key, worker, state, error=None, result=None, rules=None):
+    """Set the state of a leased article, unless its lease was taken over.
+
+    A failed attempt (an `error`) is counted. `rules` is the digest of the
+    rule tables of an analysis, see `rules_digest`.
+    """
+    with transaction(connection):
+        connection.execute(
+            "UPDATE articles SET state = ?, worker = NULL, lease_until = NULL, "
+            "error = ?, result = ?, rules = ?, attempts = attempts + ? "
+            "WHERE export = ? AND key = ? AND worker = ?",
+            (state, error, result, rules, error is not None, export, key, worker),
+        )
+
+
+def release(connection, worker):
+    """Return the articles leased by `worker` to the queue, e.g. when stopped."""
+    with transaction(connection):
+        for state, leased in leased_states.items():
+            connection.execute(
+                "UPDATE articles SET state = ?, worker = NULL, lease_until = NULL "
+                "WHERE state = ? AND worker = ?",
+                (state, leased, worker),
+            )
+
+
+def reset(connection, names, from_states, state):
+    """Queue the articles of `names` in `from_states` again in `state`."""
+    marks = ", ".join("?" for _ in names)
+    with transaction(connection):
+        cursor = connection.execute(
+            f"UPDATE articles SET state = ?, attempts = 0, error = NULL, "
+            f"result = NULL, rules = NULL WHERE export IN ({marks}) "
+            f"AND state IN ({', '.join('?' for _ in from_states)})",
+            (state, *names, *from_states),
+        )
+    return cursor.rowcount
+
+
+def state_counts(connection, names=None):
+    """Number of articles per state, by export."""
+    counts = {}
+    for export, state, count in connection.execute(
+        "SELECT export, state, count(*) FROM articles GROUP BY export, state"
+    ):
+        if names is None or export in names:
+            counts.setdefault(export, dict.fromkeys(states, 0))[state] = count
+    return counts
+
+
+class RateLimit:
+    """Spaces the requests of all threads to at most `rate` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next)
+            self.next = start + self.interval
+        time.sleep(start - now)
+
+
+class Fetcher:
+    """Fetches pages from a pool of threads, one requests session per thread.
+
+    Returns the page as stored by analysis.py (parsed and serialized again),
+    or None if the request failed.
+    """
+
+    def __init__(self, base_url=None, timeout=20, rate=None, stats=None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.rate_limit = RateLimit(rate) if rate else None
+        self.stats = stats
+        self.local = threading.local()
+
+    def fetch(self, url):
+        import requests
+        from bs4 import BeautifulSoup
+
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        if self.rate_limit is not None:
+            self.rate_limit.wait()
+        r = fetch_url(
+            url if self.base_url is None else rebase_url(url, self.base_url),
+            timeout=self.timeout,
+            stats=self.stats,
+            session=self.local.session,
+        )
+        if r is None:
+            return None
+        return str(BeautifulSoup(r.text, "html.parser"))
+
+
+def rules_digest(rules):
+    """Digest of the rule tables, stored with the results they classified."""
+    categories = rules.categories
+    if not isinstance(categories, dict):
+        categories = {None: categories}
+    tables = [
+        f"{name}\n{table.to_csv(index=False)}" for name, table in categories.items()
+    ]
+    tables += [
+        rules.open_access_scores.to_csv(index=False),
+        rules.data_availability_scores.to_csv(index=False),
+    ]
+    return hashlib.sha256("\0".join(tables).encode("utf-8")).hexdigest()[:16]
+
+
+def other_rules(connection, names, digest):
+    """Number of analyzed articles of `names` whose rule tables differ."""
+    marks = ", ".join("?" for _ in names)
+    return connection.execute(
+        f"SELECT count(*) FROM articles WHERE export IN ({marks}) "
+        "AND state IN (?, ?) AND rules IS NOT ?",
+        (*names, ANALYZED, ANALYZE_FAILED, digest),
+    ).fetchone()[0]
+
+
+def result_json(result):
+    """Result of an article as stored in the queue: JSON by column."""
+    # Scores of the rule tables are numpy numbers
+    return json.dumps(
+        {
+            column: value.item() if hasattr(value, "item") else value
+            for column, value in zip(result.columns, result.values())
+        }
+    )
+
+
+def write_results(connection, name, path, output, rules):
+    """Write the results file of an export from its analyzed articles.
+
+    The articles are in the order of the export, one row per article, such
+    that the row is the key of the page cache as in the output of analysis.py.
+    Articles which failed get the category of their state (e.g. "fetch_failed")
+    and "N/A" in the other columns, like unanalyzed article types. Raises a
+    ValueError if articles were analyzed with other rule tables. Returns the
+    number of written articles.
+    """
+    import pandas as pd
+
+    stale = other_rules(connection, [name], rules_digest(rules))
+    if stale:
+        raise ValueError(
+            f"{stale} articles of {name} were analyzed with other rule tables; "
+            "analyze them again with --reanalyze"
+        )
+    articles = {
+        key: (state, result)
+        for key, state, result in connection.execute(
+            "SELECT key, state, result FROM articles WHERE export = ?", (name,)
+        )
+    }
+    df = normalize_export(pd.read_csv(path, dtype=str))
+    Result = result_type(tuple(rules.columns))
+    schemes = list(rules.categories) if isinstance(rules.categories, dict) else [None]
+    records = []
+    failed = collections.Counter()
+    for key in df.index:
+        state, result = articles[key]
+        if state == ANALYZED:
+            records.append(Result(**json.loads(result)))
+        else:
+            records.append(unanalyzed_result(state, schemes))
+            failed[state] += 1
+    if failed:
+        logging.warning(
+            "%s: %s, written with category and 'N/A' values of their state",
+            name,
+            ", ".join(f"{count} {state}" for state, count in sorted(failed.items())),
+        )
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    partial = output.with_name(f"{output.name}.{os.getpid()}.part")
+    results_frame(df, records, rules.dtypes, columns=rules.columns).to_csv(
+        partial, index=False, lineterminator="\n"
+    )
+    os.replace(partial, output)
+    return len(records)
+
+
+def add_exports(connection, args):
+    """Queue the exports of the command line; returns (path, cache) by name."""
+    if args.cache is not None and len(args.input) > 1:
+        raise ValueError("--cache can only be given for a single export")
+    exports = {}
+    for path in args.input:
+        name, queued_path, cache = add_export(connection, path, cache=args.cache)
+        exports[name] = (queued_path, cache)
+    return exports
+
+
+def log_counts(connection, names):
+    for name, counts in state_counts(connection, names).items():
+        logging.info(
+            "%s: %s",
+            name,
+            ", ".join(f"{count} {state}" for state, count in counts.items() if count),
+        )
+
+
+def fetch_command(args):
+    connection = connect(args.queue)
+    exports = add_exports(connection, args)
+    names = list(exports)
+    if args.retry_failed:
+        count = reset(connection, names, [FETCH_FAILED], FETCH)
+        logging.info("Fetching %d failed articles again", count)
+    worker = worker_name()
+    stats = FetchStats()
+    fetcher = Fetcher(
+        base_url=args.base_url, timeout=args.timeout, rate=args.rate, stats=stats
+    )
+    pages = {name: open_cache(cache) for name, (_, cache) in exports.items()}
+    fetched = 0
+    last_report = time.monotonic()
+    try:
+        with ThreadPoolExecutor(args.workers) as executor:
+            while True:
+                batch = claim(
+                    connection, names, FETCH, worker, 4 * args.workers, args.lease
+                )
+                if not batch:
+                    break
+                htmls = executor.map(fetcher.fetch, [url for _, _, url in batch])
+                for (export, key, url), html in zip(batch, htmls):
+                    if html is None:
+                        attempts = connection.execute(
+                            "SELECT attempts FROM articles WHERE export = ? AND key = ?",
+                            (export, key),
+                        ).fetchone()[0]
+                        failed = attempts + 1 >= args.max_attempts
+                        finish(
+                            connection,
+                            export,
+                            key,
+                            worker,
+                            FETCH_FAILED if failed else FETCH,
+                            error=f"Failed to fetch URL: {url}",
+                        )
+                        continue
+                    pages[export].put(key, html)
+                    finish(connection, export, key, worker, FETCHED)
+                    fetched += 1
+                if time.monotonic() - last_report > args.progress_interval:
+                    logging.info(stats.summary())
+                    last_report = time.monotonic()
+    except KeyboardInterrupt:
+        logging.info("Interrupted, returning the leased articles to the queue")
+    finally:
+        release(connection, worker)
+        for cache in pages.values():
+            cache.close()
+    logging.info("Fetched %d articles", fetched)
+    if stats.requests > 0:
+        logging.info(stats.summary())
+    log_counts(connection, names)
+    connection.close()
+
+
+def analyze_command(args):
+    connection = connect(args.queue)
+    exports = add_exports(connection, args)
+    names = list(exports)
+    rules = Rules.from_csv(args.categories, args.open_access, args.data_availability)
+    digest = rules_digest(rules)
+    if args.reanalyze:
+        count = reset(connection, names, [ANALYZED, ANALYZE_FAILED], FETCHED)
+        logging.info("Analyzing %d articles again", count)
+    stale = other_rules(connection, names, digest)
+    if stale:
+        raise ValueError(
+            f"{stale} articles were analyzed with other rule tables; analyze "
+            "them again with --reanalyze"
+        )
+    worker = worker_name()
+    pages = {name: open_cache(cache) for name, (_, cache) in exports.items()}
+    output = Path(args.output_dir)
+    written = set()
+    analyzed = 0
+    last_report = time.monotonic()
+    try:
+        while True:
+            batch = claim(connection, names, FETCHED, worker, args.batch, args.lease)
+            for export, key, url in batch:
+                page = pages[export].get(key)
+                if page is None:
+                    # Stored after the cache was opened, e.g. in an archive
+                    pages[export].close()
+                    pages[export] = open_cache(exports[export][1])
+                    page = pages[export].get(key)
+                try:
+                    if page is None:
+                        raise LookupError(f"Page of {url} is not in the cache")
+                    fields = parse_page(
+                        key, url, page, False, fast_metadata=args.fast_metadata
+                    )
+                    result = result_json(rules.classify(fields))
+                except Exception as e:
+                    logging.warning("[%s %d] %s: %s", export, key, type(e).__name__, e)
+                    finish(
+                        connection,
+                        export,
+                        key,
+                        worker,
+                        ANALYZE_FAILED,
+                        error=f"{type(e).__name__}: {e}",
+                        rules=digest,
+                    )
+                    continue
+                finish(
+                    connection,
+                    export,
+                    key,
+                    worker,
+                    ANALYZED,
+                    result=result,
+                    rules=digest,
+                )
+                analyzed += 1
+
+            counts = state_counts(connection, names)
+            for name in names:
+                if name in written or any(counts[name][s] for s in open_states):
+                    continue
+                path = output / f"{name}.csv"
+                count = write_results(connection, name, exports[name][0], path, rules)
+                logging.info("Wrote %d results of %s to %s", count, name, path)
+                written.add(name)
+            if len(written) == len(names):
+                break
+            if time.monotonic() - last_report > args.progress_interval:
+                log_counts(connection, names)
+                last_report = time.monotonic()
+            if not batch:
+                if args.no_wait:
+                    logging.info("No fetched articles left, stopping")
+                    break
+                # Wait for the articles still being fetched
+                time.sleep(args.poll)
+    except KeyboardInterrupt:
+        logging.info("Interrupted, returning the leased articles to the queue")
+    finally:
+        release(connection, worker)
+        for cache in pages.values():
+            cache.close()
+    logging.info("Analyzed %d articles", analyzed)
+    log_counts(connection, names)
+    connection.close()
+
+
+def status_command(args):
+    connection = connect(args.queue)
+    counts = state_counts(connection)
+    connection.close()
+    if not counts:
+        print("The queue is empty.")
+        return
+    print(f"{'export':30s}" + "".join(f"{state:>15s}" for state in states))
+    for name, export_counts in sorted(counts.items()):
+        print(
+            f"{name:30s}" + "".join(f"{export_counts[state]:15d}" for state in states)
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fetch and analyze exports separately through a work queue"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = subparsers.add_parser(
+        "fetch", help="Fill the page caches of exports"
+    )
+    fetch_parser.add_argument(
+        "--workers", type=int, default=4, help="Number of concurrent requests"
+    )
+    fetch_parser.add_argument(
+        "--rate",
+        type=float,
+        help="Maximum number of requests per second over all workers",
+    )
+    fetch_parser.add_argument(
+        "--timeout", type=float, default=20, help="Timeout per request in seconds"
+    )
+    fetch_parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="Give up on an article after this many failed requests",
+    )
+    fetch_parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Fetch the articles again which failed in earlier runs",
+    )
+    fetch_parser.add_argument(
+        "--base-url",
+        help="Fetch from this scheme and host instead of the URLs' ones, e.g. "
+        "http://127.0.0.1:8000 for springer_stub.py",
+    )
+    fetch_parser.set_defaults(func=fetch_command)
+
+    analyze_parser = subparsers.add_parser(
+        "analyze", help="Analyze the cached pages of exports offline"
+    )
+    analyze_parser.add_argument(
+        "--output-dir",
+        "-o",
+        type=str,
+        required=True,
+        help="Folder of the results files, one <export stem>.csv per export",
+    )
+    analyze_parser.add_argument(
+        "--categories",
+        "-c",
+        required=True,
+        nargs="+",
+        help="categories CSV file, or several (see analysis.py)",
+    )
+    analyze_parser.add_argument(
+        "--open_access", "-oa", required=True, help="open access availability CSV file"
+    )
+    analyze_parser.add_argument(
+        "--data_availability", "-da", required=True, help="data availability CSV file"
+    )
+    analyze_parser.add_argument(
+        "--fast-metadata",
+        action="store_true",
+        help="Read article type, abstract and rights from the page head where "
+        "available, see analysis.py",
+    )
+    analyze_parser.add_argument(
+        "--reanalyze",
+        action="store_true",
+        help="Analyze all articles again, e.g. after a change of the rule tables",
+    )
+    analyze_parser.add_argument(
+        "--batch", type=int, default=16, help="Number of articles leased at once"
+    )
+    analyze_parser.add_argument(
+        "--no-wait",
+        action="store_true",
+        help="Stop once no fetched articles are left, instead of waiting for "
+        "the articles still to be fetched",
+    )
+    analyze_parser.add_argument(
+        "--poll",
+        type=float,
+        default=5.0,
+        help="Seconds between looks for newly fetched articles",
+    )
+    analyze_parser.set_defaults(func=analyze_command)
+
+    status_parser = subparsers.add_parser(
+        "status", help="Number of articles per state of each export"
+    )
+    status_parser.set_defaults(func=status_command)
+
+    for _parser in [fetch_parser, analyze_parser]:
+        _parser.add_argument(
+            "--input",
+            "-i",
+            type=str,
+            nargs="+",
+            required=True,
+            help="Springer export CSV file(s)",
+        )
+        _parser.add_argument(
+            "--cache",
+            type=str,
+            help="Page cache of a single export: folder (default: soups_<export "
+            "stem>) or archive (.pack)",
+        )
+        _parser.add_argument(
+            "--lease",
+            type=float,
+            default=600.0,
+            help="Seconds after which the articles leased by a worker which "
+            "stopped are leased again",
+        )
+        _parser.add_argument(
+            "--progress-interval",
+            type=float,
+            default=10.0,
+            help="Seconds between progress lines on the console",
+        )
+    for _parser in [fetch_parser, analyze_parser, status_parser]:
+        _parser.add_argument(
+            "--queue",
+            type=str,
+            default="work_queue.sqlite",
+            help="SQLite file of the work queue, shared by all commands",
+        )
+
+    args = parser.parse_args()
+    args.func(args)
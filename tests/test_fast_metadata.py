@@ -0,0 +1,93 @@
+"""The fast path of analysis.py (--fast-metadata) classifies like a full parse."""
+
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from analysis import Rules, head_metadata, parse_page
+
+categories_folder = Path(__file__).parents[1] / "categories"
+
+open_rights = (
+    "Open Access This article is licensed under a Creative Commons Attribution "
+    "4.0 International License."
+)
+closed_rights = (
+    "Springer Nature or its licensor holds exclusive rights to this article under "
+    "a publishing agreement with the author(s)."
+)
+
+
+def page(rights, head):
+    """Article page as on Springer, with the given extra <head> tags."""
+    sections = [
+        ("Abstract", "Micro-CT imaging of the pore space of a sandstone."),
+        ("Data Availability", "The data are available on Zenodo."),
+        ("Rights and permissions", rights),
+    ]
+    body = "".join(
+        f'<section data-title="{title}"><h2>{title}</h2><p>{text}</p></section>'
+        for title, text in sections
+    )
+    return (
+        '<html><head><meta name="dc.type" content="OriginalPaper"/>'
+        '<meta name="dc.description" content="Micro-CT imaging of the pore space."/>'
+        f"{head}</head><body>{body}</body></html>"
+    )
+
+
+def json_ld(free, license=None):
+    entity = {"@type": "ScholarlyArticle", "isAccessibleForFree": free}
+    if license:
+        entity["license"] = license
+    data = json.dumps({"mainEntity": entity})
+    return f'<script type="application/ld+json">{data}</script>'
+
+
+copyright_line = '<meta name="dc.rights" content="2023 The Author(s)"/>'
+pages = {
+    "copyright line only": page(open_rights, copyright_line),
+    "copyright line and JSON-LD": page(
+        open_rights,
+        copyright_line + json_ld(True, "http://creativecommons.org/licenses/by/4.0/"),
+    ),
+    "license tag": page(
+        open_rights,
+        copyright_line + '<meta name="citation_license" content="CC BY 4.0"/>',
+    ),
+    "closed access": page(
+        closed_rights,
+        '<meta name="dc.rights" content="2021 Springer Nature"/>' + json_ld(False),
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def rules():
+    return Rules(
+        pd.read_csv(categories_folder / "categories_imaging_vs_simulation.csv"),
+        pd.read_csv(categories_folder / "oa_scores.csv"),
+        pd.read_csv(categories_folder / "da_scores.csv"),
+    )
+
+
+@pytest.mark.parametrize("name", pages)
+def test_fast_path_classifies_like_full_parse(rules, name):
+    url = "https://link.springer.com/article/10.1007/test"
+    full, fast = [
+        rules.classify(parse_page(0, url, pages[name], False, fast_metadata=fast))
+        for fast in [False, True]
+    ]
+    for column in [
+        "category",
+        "article_availability_score",
+        "article_availability_category",
+        "data_availability_score",
+    ]:
+        assert fast[column] == full[column], column
+
+
+def test_copyright_line_is_not_used_as_rights():
+    assert "rights" not in head_metadata(pages["copyright line only"])
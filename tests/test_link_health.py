@@ -0,0 +1,62 @@
+"""Transient failures of link_health.py are checked again, dead links are not."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from link_health import check_urls, read_cache
+
+# Status answered by the stub server for each path, "slow" times out
+statuses = {"/ok": 200, "/limited": 429, "/unavailable": 503, "/gone": 404}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.server.requests.append(self.path)
+        if self.path == "/slow":
+            time.sleep(1)
+        self.send_response(statuses.get(self.path, 200))
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_transient_failures_are_checked_again(server, tmp_path):
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    urls = [f"https://example.org{path}" for path in [*statuses, "/slow"]]
+    cache = tmp_path / "link_health.csv"
+
+    checks = check_urls(urls, cache, workers=2, timeout=0.2, base_url=base_url)
+    assert {
+        url.rsplit("/", 1)[1]: check["health"] for url, check in checks.items()
+    } == {
+        "ok": "ok",
+        "limited": "transient",
+        "unavailable": "transient",
+        "gone": "dead",
+        "slow": "transient",
+    }
+    assert {check["health"] for check in read_cache(cache).values()} == {
+        "ok",
+        "transient",
+        "dead",
+    }
+
+    # Only the transient failures are requested again
+    server.requests.clear()
+    check_urls(urls, cache, workers=2, timeout=0.2, base_url=base_url)
+    assert sorted(server.requests) == ["/limited", "/slow", "/unavailable"]
@@ -0,0 +1,54 @@
+"""Verdicts of review_server.py on samples with missing predictions."""
+
+import io
+
+import pandas as pd
+import pytest
+
+from review_server import Reviewer
+
+samples_csv = """row,doi,url,year,category,article_availability,data_availability
+0,10.1/a,https://example.org/a,2020,editorial,N/A,N/A
+1,10.1/b,https://example.org/b,2021,imaging,Open access,Not open
+"""
+results_csv = """doi,title,year,category,keywords,article_availability_score,data_availability_score
+10.1/a,A,2020,editorial,N/A,N/A,N/A
+10.1/b,B,2021,imaging,micro-CT,1,0
+"""
+
+
+@pytest.fixture
+def reviewer(tmp_path):
+    reviewer = Reviewer(
+        pd.read_csv(io.StringIO(samples_csv)),
+        pd.read_csv(io.StringIO(results_csv)),
+        pages=None,
+        labels_path=tmp_path / "labels.csv",
+        reviewer="tester",
+    )
+    yield reviewer
+    reviewer.executor.shutdown()
+
+
+def test_disagree_without_change_is_rejected(reviewer):
+    unchanged = {
+        "category": "editorial",
+        "article_availability": "N/A",
+        "data_availability": "N/A",
+    }
+    with pytest.raises(ValueError, match="Select the correct classes"):
+        reviewer.record(0, "disagree", unchanged)
+    assert not reviewer.labels_path.exists()
+
+    reviewer.record(0, "disagree", {**unchanged, "data_availability": "Not open"})
+    labels = pd.read_csv(reviewer.labels_path, keep_default_na=False)
+    assert labels.loc[0, ["article_availability", "data_availability"]].tolist() == [
+        "N/A",
+        "Not open",
+    ]
+
+
+def test_missing_prediction_is_selected(reviewer):
+    page = reviewer.review_page(0)
+    assert "<option selected>N/A</option>" in page
+    assert "<option selected>Open access</option>" not in page
@@ -0,0 +1,65 @@
+"""Results of several schemes of categories read by the other tools."""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from analysis import classify_fields, scheme_results
+from cube import build_cube
+
+categories_folder = Path(__file__).parents[1] / "categories"
+names = ["imaging_vs_simulation", "experimental_vs_computational"]
+abstracts = [
+    "We acquired microscopy images and ran a molecular dynamics simulation.",
+    "A finite element model of the experiment.",
+    "No keyword at all.",
+]
+
+
+def results(schemes):
+    fields = [
+        {
+            "article_type": "article",
+            "abstract": abstract,
+            "article_availability_section": "",
+            "data_availability_section": "",
+        }
+        for abstract in abstracts
+    ]
+    oa_df = pd.read_csv(categories_folder / "oa_scores.csv")
+    da_df = pd.read_csv(categories_folder / "da_scores.csv")
+    rows = [classify_fields(field, schemes, oa_df, da_df) for field in fields]
+    return pd.DataFrame([row.values() for row in rows], columns=rows[0].columns).assign(
+        year=2020
+    )
+
+
+@pytest.fixture(scope="module")
+def tables():
+    return {
+        name: pd.read_csv(categories_folder / f"categories_{name}.csv")
+        for name in names
+    }
+
+
+@pytest.mark.parametrize("name", names)
+def test_scheme_matches_single_scheme_results(tables, name):
+    selected = scheme_results(results(tables), name)
+    single = results(tables[name])
+    pd.testing.assert_frame_equal(selected[single.columns], single)
+    pd.testing.assert_frame_equal(build_cube(selected), build_cube(single))
+
+
+def test_scheme_required_for_several(tables):
+    with pytest.raises(ValueError, match="imaging_vs_simulation"):
+        scheme_results(results(tables))
+    with pytest.raises(ValueError, match="choose one"):
+        scheme_results(results(tables), "unknown")
+
+
+def test_single_scheme_unchanged(tables):
+    single = results(tables[names[0]])
+    assert scheme_results(single) is single
+    with pytest.raises(ValueError, match="single scheme"):
+        scheme_results(single, names[0])
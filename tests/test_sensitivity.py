@@ -0,0 +1,64 @@
+"""Ablations of sensitivity.py against analysis.py on the reduced rule tables."""
+
+import random
+import re
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from analysis import classify_fields
+from sensitivity import ablations, derive_categories, hit_matrix
+
+categories_folder = Path(__file__).parents[1] / "categories"
+
+
+def abstracts(table, count, seed=0):
+    """Abstracts of repeated plain keywords of `table`, with ties and misses."""
+    keywords = [
+        key for key in table["keyword"].astype(str) if re.fullmatch(r"[\w -]+", key)
+    ]
+    rng = random.Random(seed)
+    return [
+        ". ".join(rng.choice(keywords) for _ in range(rng.randint(1, 8)))
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "categories_imaging_vs_simulation.csv",
+        "categories_experimental_vs_computational.csv",
+    ],
+)
+def test_ablations_match_analysis(name):
+    table = pd.read_csv(categories_folder / name)
+    open_access = pd.read_csv(categories_folder / "oa_scores.csv")
+    data_availability = pd.read_csv(categories_folder / "da_scores.csv")
+    texts = [
+        "lattice boltzmann, lattice boltzmann and lattice boltzmann simulation. "
+        "The solver and the solver.",
+        "No keyword at all.",
+    ] + abstracts(table, 2)
+
+    removed, keep = ablations(table)
+    derived = derive_categories(
+        hit_matrix(texts, table["keyword"].tolist()), table, keep
+    )
+    for v, rule in enumerate(removed):
+        reduced = table[keep[v]].reset_index(drop=True)
+        for i, text in enumerate(texts):
+            result = classify_fields(
+                {
+                    "article_type": "article",
+                    "abstract": text,
+                    "article_availability_section": "",
+                    "data_availability_section": "",
+                },
+                reduced,
+                open_access,
+                data_availability,
+            )
+            expected = (result.category, result.subcategory, result.subcategory2)
+            assert tuple(labels[v, i] for labels in derived) == expected, (rule, text)